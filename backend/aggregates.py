@@ -0,0 +1,144 @@
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from alerts import STATUS_NAMES
+
+FIELDS = ('emission', 'co2_equivalent', 'so2', 'no2', 'co')
+# Incremental sums drift by float rounding; rebuild them from the station arrays this often
+RESYNC_TICKS = 1000
+
+class GroupAggregates:
+    """
+    Per-group emission and gas aggregates (one grouping, e.g. by region) kept current tick by tick.
+
+    Every station's group index is computed once at startup. A tick adds
+    only the changed stations' deltas to the group sums and moves their
+    status counts, using bincount over those stations. Max emission is
+    a single reduceat over stations pre-sorted by group. The response body
+    and a bounded per-tick history of each group's total and mean are built
+    in the same step, so a request only returns a prebuilt string.
+    """
+
+    def __init__(self, station_state, labels, history=1200):
+        self.state = station_state
+        self.names, self.group = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+        n, g = len(self.group), len(self.names)
+        self.order = np.argsort(self.group, kind='stable')
+        self.starts = np.searchsorted(self.group[self.order], np.arange(g))
+        self.size = np.bincount(self.group, minlength=g)
+
+        # Values last folded in per station, to turn the next reading into a delta
+        self.values = {field: np.zeros(n) for field in FIELDS}
+        self.level = np.zeros(n, dtype=np.int64)  # 0 = no reading yet
+        self.reporting = np.zeros(g, dtype=np.int64)
+        self.sums = {field: np.zeros(g) for field in FIELDS}
+        self.status_counts = np.zeros((g, len(STATUS_NAMES)), dtype=np.int64)
+        self.status_counts[:, 0] = self.size
+        self.max_emission = np.full(g, np.nan)
+
+        self.history_size = history
+        self.history_times = []
+        self.history_total = np.zeros((history, g))
+        self.history_mean = np.full((history, g), np.nan)
+        self.history_count = 0
+        self.updates = 0
+        self.lock = threading.Lock()
+        self.body = self._serialize({field: np.full(g, np.nan) for field in FIELDS}, None)
+
+    def update(self, changed, levels):
+        """Fold the latest readings of the changed stations (and their alert levels) into the aggregates"""
+        changed = np.asarray(changed, dtype=np.int64)
+        if not len(changed):
+            return
+        g = len(self.names)
+        with self.lock:
+            groups = self.group[changed]
+            first = self.level[changed] == 0
+            self.reporting += np.bincount(groups[first], minlength=g)
+
+            for field in FIELDS:
+                current = getattr(self.state, field)[changed]
+                self.sums[field] += np.bincount(groups, weights=current - self.values[field][changed], minlength=g)
+                self.values[field][changed] = current
+
+            levels = np.asarray(levels, dtype=np.int64)
+            np.subtract.at(self.status_counts, (groups, self.level[changed]), 1)
+            np.add.at(self.status_counts, (groups, levels), 1)
+            self.level[changed] = levels
+
+            self.updates += 1
+            if self.updates % RESYNC_TICKS == 0:
+                reported = self.level > 0
+                for field in FIELDS:
+                    self.sums[field] = np.bincount(self.group[reported], weights=self.values[field][reported], minlength=g)
+
+            emission = np.where(self.level > 0, self.values['emission'], -np.inf)[self.order]
+            peak = np.maximum.reduceat(emission, self.starts) if len(emission) else np.zeros(0)
+            self.max_emission = np.where(np.isfinite(peak), peak, np.nan)
+
+            means = self._means()
+            slot = self.history_count % self.history_size
+            self.history_total[slot] = self.sums['emission']
+            self.history_mean[slot] = means['emission']
+            timestamp = datetime.fromtimestamp(float(np.nanmax(self.state.timestamp[changed]))).isoformat()
+            if len(self.history_times) < self.history_size:
+                self.history_times.append(timestamp)
+            else:
+                self.history_times[slot] = timestamp
+            self.history_count += 1
+            self.body = self._serialize(means, timestamp)
+
+    def _means(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {field: np.where(self.reporting > 0, self.sums[field] / self.reporting, np.nan) for field in FIELDS}
+
+    def rebuild_body(self):
+        """Re-serialize the response body from the current arrays (after they were restored)"""
+        with self.lock:
+            slot = (self.history_count - 1) % self.history_size
+            timestamp = self.history_times[slot] if self.history_count else None
+            self.body = self._serialize(self._means(), timestamp)
+
+    def _serialize(self, means, timestamp):
+        def number(value, digits):
+            return round(float(value), digits) if np.isfinite(value) else None
+
+        groups = []
+        for k, name in enumerate(self.names.tolist()):
+            groups.append({
+                'name': name,
+                'stations': int(self.size[k]),
+                'reporting': int(self.reporting[k]),
+                'emission': {
+                    'sum': number(self.sums['emission'][k], 3),
+                    'mean': number(means['emission'][k], 3),
+                    'max': number(self.max_emission[k], 3)
+                },
+                'co2_equivalent_mean': number(means['co2_equivalent'][k], 3),
+                'gas_means': {'SO2': number(means['so2'][k], 8), 'NO2': number(means['no2'][k], 8), 'CO': number(means['co'][k], 8)},
+                'status_counts': {(STATUS_NAMES[level] or 'NO_DATA'): int(self.status_counts[k, level])
+                                  for level in range(len(STATUS_NAMES))}
+            })
+        return json.dumps({'timestamp': timestamp, 'tick': self.state.tick, 'groups': groups})
+
+    def history(self, limit=None):
+        """Per-tick total and mean emission of every group, oldest first"""
+        with self.lock:
+            count = min(self.history_count, self.history_size)
+            slots = (self.history_count - count + np.arange(count)) % self.history_size
+            if limit is not None:
+                slots = slots[len(slots) - min(limit, len(slots)):]
+            return {
+                'timestamps': [self.history_times[s] for s in slots.tolist()],
+                'groups': {name: {
+                    'total_emission': np.round(self.history_total[slots, k], 3).tolist(),
+                    'mean_emission': [round(float(v), 3) if np.isfinite(v) else None for v in self.history_mean[slots, k]]
+                } for k, name in enumerate(self.names.tolist())}
+            }
+
+    def sizes(self):
+        """Station count per group"""
+        return dict(zip(self.names.tolist(), self.size.tolist()))
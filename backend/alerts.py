@@ -0,0 +1,323 @@
+import numpy as np
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alert_rules.json')
+
+# Status levels shared by every handler: index 1..3 into STATUS_NAMES
+STATUS_NAMES = (None, 'LOW', 'MEDIUM', 'HIGH')
+DEFAULT_RULE = {
+    'medium': 50.0,           # emission above this is MEDIUM
+    'high': 100.0,            # emission above this is HIGH
+    'hysteresis': 0.1,        # fraction below a threshold needed before stepping back down
+    'min_duration_s': 6.0,    # a new level must hold this long before it is confirmed
+    'dedup_window_s': 300.0   # repeat notifications for the same station and level are suppressed
+}
+
+def status_level(emission, medium=DEFAULT_RULE['medium'], high=DEFAULT_RULE['high']):
+    """1 = LOW, 2 = MEDIUM, 3 = HIGH"""
+    if emission > high:
+        return 3
+    if emission > medium:
+        return 2
+    return 1
+
+def load_alert_config(rules_file=DEFAULT_RULES_FILE):
+    """Read alert rules and sink config; missing file means defaults with a log sink"""
+    if rules_file and os.path.exists(rules_file):
+        try:
+            with open(rules_file, 'r') as f:
+                config = json.load(f)
+            print(f"✓ Loaded alert rules from {rules_file}")
+            return config
+        except Exception as e:
+            print(f"Warning: could not read {rules_file} ({e}), using default alert rules")
+    return {'default': {}, 'sinks': [{'type': 'log'}]}
+
+class AlertEngine:
+    """
+    Threshold alerting evaluated once per tick over the latest-reading arrays.
+    
+    Rules resolve per station (region overrides type overrides default) into
+    threshold arrays at startup. A station only changes level after the new
+    level has held for min_duration_s, only steps down once it has dropped
+    `hysteresis` below the threshold, and the same (station, level)
+    notification is not repeated within dedup_window_s. Every confirmed
+    transition is kept in the history; deduplicated ones are marked
+    'notified': False and not sent to the sinks.
+    """
+    
+    def __init__(self, station_state, config, notifier=None, history_size=1000):
+        self.state = station_state
+        self.notifier = notifier
+        n = len(station_state)
+        
+        rules = [self._resolve_rule(config, station_state.types[i], station_state.regions[i]) for i in range(n)]
+        self.medium = np.array([r['medium'] for r in rules], dtype=np.float64)
+        self.high = np.array([r['high'] for r in rules], dtype=np.float64)
+        self.hysteresis = np.array([r['hysteresis'] for r in rules], dtype=np.float64)
+        self.min_duration = np.array([r['min_duration_s'] for r in rules], dtype=np.float64)
+        self.dedup_window = np.array([r['dedup_window_s'] for r in rules], dtype=np.float64)
+        
+        self.level = np.ones(n, dtype=np.int64)
+        self.pending_level = np.zeros(n, dtype=np.int64)
+        self.pending_since = np.zeros(n, dtype=np.float64)
+        self.since = np.full(n, np.nan)
+        self.last_notified = np.full((n, len(STATUS_NAMES)), -np.inf)
+        
+        self.history = deque(maxlen=history_size)
+        self.sequence = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _resolve_rule(config, location_type, region):
+        rule = dict(DEFAULT_RULE)
+        rule.update(config.get('default', {}))
+        rule.update(config.get('by_type', {}).get(location_type, {}))
+        rule.update(config.get('by_region', {}).get(region, {}))
+        return rule
+    
+    def status_levels(self, indices, emissions):
+        """Vectorized instantaneous status (no hysteresis) with each station's thresholds"""
+        return np.where(emissions > self.high[indices], 3, np.where(emissions > self.medium[indices], 2, 1))
+    
+    def status_level(self, i, emission):
+        return status_level(emission, self.medium[i], self.high[i])
+    
+    def evaluate(self, indices):
+        """Advance the alert state of the given stations from their latest readings"""
+        if len(indices) == 0:
+            return []
+        
+        with self.lock:
+            emission = self.state.emission[indices]
+            now = self.state.timestamp[indices]
+            current = self.level[indices]
+            
+            # Rising uses the plain thresholds, falling needs to clear them by the hysteresis margin
+            up_level = self.status_levels(indices, emission)
+            relaxed = 1.0 - self.hysteresis[indices]
+            down_level = np.where(emission >= self.high[indices] * relaxed, 3,
+                                  np.where(emission >= self.medium[indices] * relaxed, 2, 1))
+            target = np.maximum(up_level, np.minimum(current, down_level))
+            
+            moving = target != current
+            restart = moving & (self.pending_level[indices] != target)
+            self.pending_level[indices] = np.where(moving, target, 0)
+            self.pending_since[indices] = np.where(restart, now, self.pending_since[indices])
+            
+            confirmed = moving & (now - self.pending_since[indices] >= self.min_duration[indices])
+            events, notify = [], []
+            for j in np.flatnonzero(confirmed):
+                i = int(indices[j])
+                previous, level = int(current[j]), int(target[j])
+                self.level[i] = level
+                self.pending_level[i] = 0
+                self.since[i] = now[j]
+                
+                notified = bool(now[j] - self.last_notified[i, level] >= self.dedup_window[i])
+                if notified:
+                    self.last_notified[i, level] = now[j]
+                
+                self.sequence += 1
+                event = {
+                    'alert_id': self.sequence,
+                    'kind': 'resolved' if level == 1 else ('raised' if previous == 1 else
+                                                           'escalated' if level > previous else 'deescalated'),
+                    'location_name': self.state.names[i],
+                    'region': self.state.regions[i],
+                    'location_type': self.state.types[i],
+                    'status': STATUS_NAMES[level],
+                    'previous_status': STATUS_NAMES[previous],
+                    'emission': round(float(emission[j]), 2),
+                    'threshold': float(self.high[i] if level == 3 else self.medium[i]),
+                    'timestamp': datetime.fromtimestamp(now[j]).isoformat(),
+                    'notified': notified
+                }
+                events.append(event)
+                self.history.append(event)
+                if notified:
+                    notify.append(event)
+        
+        if self.notifier:
+            for event in notify:
+                self.notifier.submit(event)
+        return events
+    
+    def active(self):
+        """Stations currently at MEDIUM or HIGH, highest first"""
+        with self.lock:
+            raised = np.flatnonzero(self.level > 1)
+            raised = raised[np.argsort(-self.level[raised], kind='stable')]
+            return [{
+                'location_name': self.state.names[i],
+                'status': STATUS_NAMES[self.level[i]],
+                'since': datetime.fromtimestamp(self.since[i]).isoformat() if np.isfinite(self.since[i]) else None,
+                'emission': round(float(self.state.emission[i]), 2)
+            } for i in raised]
+    
+    def recent(self, limit=100):
+        with self.lock:
+            events = list(self.history)
+        return events[::-1][:limit]
+
+class LogSink:
+    name = 'log'
+    
+    def send(self, event):
+        print(f"🚨 [{event['status']}] {event['location_name']} ({event['region']}): "
+              f"{event['kind']} at emission {event['emission']}")
+
+class FileSink:
+    name = 'file'
+    
+    def __init__(self, path='alerts.ndjson'):
+        self.path = path
+    
+    def send(self, event):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+class WebhookSink:
+    name = 'webhook'
+    
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+    
+    def send(self, event):
+        body = json.dumps(event).encode('utf-8')
+        req = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise IOError(f"webhook returned HTTP {response.status}")
+
+SINK_TYPES = {
+    'log': lambda cfg: LogSink(),
+    'file': lambda cfg: FileSink(cfg.get('path', 'alerts.ndjson')),
+    'webhook': lambda cfg: WebhookSink(cfg['url'], cfg.get('timeout', 5.0))
+}
+
+class TokenBucket:
+    """Allows `rate` sends per second on average and bursts of up to `burst`; only used by one sink thread"""
+    
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def acquire(self):
+        """Take a token, sleeping until one is available; returns the seconds waited"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        delay = (1 - self.tokens) / self.rate
+        time.sleep(delay)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        return delay
+
+class AlertNotifier:
+    """
+    Asynchronous fan-out of alert events to sinks.
+    
+    Every sink gets its own bounded queue and worker thread, so a slow or
+    failing sink neither blocks the others nor the tick that raised the
+    alert. Failed deliveries are retried with exponential backoff and
+    jitter; events are dropped (and counted) when a sink's queue is full.
+    A sink can be rate limited with a token bucket: sends (retries
+    included) then wait for a token, and events that had to wait are
+    counted as throttled.
+    """
+    
+    def __init__(self, sinks, queue_size=1000, max_retries=5, base_backoff=0.5, max_backoff=30.0,
+                 rate_per_s=None, burst=10, rate_limits=None):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.channels = []
+        # Sink threads and submit() both update the per-sink counters
+        self.stats_lock = threading.Lock()
+        # Per-sink (rate_per_s, burst) overrides, parallel to sinks; rate_per_s=None means unlimited
+        rate_limits = rate_limits or [(rate_per_s, burst)] * len(sinks)
+        
+        for sink, (rate, sink_burst) in zip(sinks, rate_limits):
+            channel = {
+                'sink': sink,
+                'queue': queue.Queue(maxsize=queue_size),
+                'bucket': TokenBucket(rate, sink_burst) if rate else None,
+                'stats': {'delivered': 0, 'retries': 0, 'failed': 0, 'dropped': 0, 'throttled': 0}
+            }
+            worker = threading.Thread(target=self._run, args=(channel,), daemon=True)
+            worker.start()
+            self.channels.append(channel)
+    
+    @classmethod
+    def from_config(cls, config):
+        notifier_config = dict(config.get('notifier', {}))
+        rate_per_s = notifier_config.pop('rate_per_s', None)
+        burst = notifier_config.pop('burst', 10)
+        sinks = []
+        rate_limits = []
+        for sink_config in config.get('sinks', [{'type': 'log'}]):
+            if not sink_config.get('enabled', True):
+                continue
+            factory = SINK_TYPES.get(sink_config.get('type'))
+            if factory is None:
+                print(f"Warning: unknown alert sink type {sink_config.get('type')!r}")
+                continue
+            sinks.append(factory(sink_config))
+            rate_limits.append((sink_config.get('rate_per_s', rate_per_s), sink_config.get('burst', burst)))
+        return cls(sinks, rate_limits=rate_limits, **notifier_config)
+    
+    def submit(self, event):
+        for channel in self.channels:
+            try:
+                channel['queue'].put_nowait(event)
+            except queue.Full:
+                self._count(channel, 'dropped')
+    
+    def _run(self, channel):
+        while True:
+            event = channel['queue'].get()
+            throttled = False
+            for attempt in range(self.max_retries + 1):
+                if channel['bucket'] is not None and channel['bucket'].acquire() and not throttled:
+                    throttled = True
+                    self._count(channel, 'throttled')
+                try:
+                    channel['sink'].send(event)
+                    self._count(channel, 'delivered')
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self._count(channel, 'failed')
+                        print(f"Warning: alert sink '{channel['sink'].name}' gave up on alert "
+                              f"{event.get('alert_id')}: {e}")
+                        break
+                    self._count(channel, 'retries')
+                    delay = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+                    time.sleep(delay * (0.5 + random.random() / 2))
+    
+    def _count(self, channel, stat):
+        with self.stats_lock:
+            channel['stats'][stat] += 1
+    
+    def stats(self):
+        with self.stats_lock:
+            return [{
+                'sink': channel['sink'].name,
+                'queue_depth': channel['queue'].qsize(),
+                **channel['stats']
+            } for channel in self.channels]
@@ -0,0 +1,140 @@
+import numpy as np
+import threading
+from collections import deque
+
+from station_state import StationWindow
+
+SIGNALS = ('emission', 'SO2', 'NO2', 'CO')
+MAD_SCALE = 1.4826  # makes MAD a consistent estimator of the standard deviation
+
+# Severity by robust z-score magnitude (modified z-score convention, 3.5 = outlier)
+SEVERITY_THRESHOLDS = np.array([3.5, 5.0, 8.0])
+SEVERITY_NAMES = np.array([None, 'medium', 'high', 'critical'], dtype=object)
+
+class AnomalyDetector:
+    """
+    Per-tick anomaly scoring over all stations at once.
+    
+    Each reading is compared with
+      - the station's own recent history (rolling median/MAD z-score for
+        emission and each gas), and
+      - its spatial neighbours' current emission (median/MAD over the k
+        nearest stations, on a log scale since station types differ by
+        a constant factor).
+    The largest absolute score decides the severity. Work per tick is one
+    (stations x window) pass, so cost stays linear in the station count.
+    """
+    
+    def __init__(self, station_state, spatial_index, window=60, min_history=10, neighbours=6,
+                 spatial_min_scale=0.25, history_size=2000):
+        self.state = station_state
+        self.min_history = min_history
+        # Neighbour MAD from a handful of stations is noisy; never treat less than ~25% spread as unusual
+        self.spatial_min_scale = spatial_min_scale
+        self.window = StationWindow(len(station_state), window, SIGNALS)
+        _, self.neighbours = spatial_index.query(station_state.lat, station_state.lon, k=neighbours, exclude_self=True)
+        
+        n = len(station_state)
+        self.scores = {signal: np.zeros(n) for signal in SIGNALS + ('spatial',)}
+        self.score = np.zeros(n)
+        self.level = np.zeros(n, dtype=np.int64)  # index into SEVERITY_NAMES, 0 = normal
+        self.history = deque(maxlen=history_size)
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _robust_z(values, reference, min_scale=0.0):
+        """z-score of values against each row of reference using median/MAD (NaNs ignored)"""
+        median = np.nanmedian(reference, axis=1)
+        mad = np.nanmedian(np.abs(reference - median[:, None]), axis=1)
+        # Floor the scale so near-constant series don't turn noise into infinite scores
+        scale = np.maximum(MAD_SCALE * mad, np.maximum(0.01 * np.abs(median), min_scale) + 1e-12)
+        return (values - median) / scale
+    
+    def evaluate(self, records):
+        """Score one tick of records, setting each record's data_quality; returns anomaly events"""
+        idx = np.array([self.state.index[r['location_name']] for r in records], dtype=np.int64)
+        if len(idx) == 0:
+            return []
+        
+        current = {
+            'emission': np.array([r['emission'] for r in records], dtype=np.float64),
+            'SO2': np.array([r['gas_levels']['SO2'] for r in records], dtype=np.float64),
+            'NO2': np.array([r['gas_levels']['NO2'] for r in records], dtype=np.float64),
+            'CO': np.array([r['gas_levels']['CO'] for r in records], dtype=np.float64)
+        }
+        
+        with self.lock:
+            # Temporal: against each station's own window, before this reading is added
+            warm = self.window.count[idx] >= self.min_history
+            temporal = np.zeros((len(SIGNALS), len(idx)))
+            if warm.any():
+                warm_idx = idx[warm]
+                with np.errstate(invalid='ignore'):
+                    for s, signal in enumerate(SIGNALS):
+                        temporal[s, warm] = self._robust_z(current[signal][warm], self.window.history(signal, warm_idx))
+            
+            # Spatial: against neighbours' latest emission, including readings from this tick
+            emission = np.where(self.state.has_data, self.state.emission, np.nan)
+            emission[idx] = current['emission']
+            neighbour_emission = np.log1p(emission[self.neighbours[idx]])
+            with np.errstate(invalid='ignore'):
+                spatial = self._robust_z(np.log1p(current['emission']), neighbour_emission, self.spatial_min_scale)
+            spatial = np.nan_to_num(spatial, nan=0.0, posinf=0.0, neginf=0.0)
+            temporal = np.nan_to_num(temporal, nan=0.0, posinf=0.0, neginf=0.0)
+            
+            self.window.push(idx, current)
+            
+            for s, signal in enumerate(SIGNALS):
+                self.scores[signal][idx] = temporal[s]
+            self.scores['spatial'][idx] = spatial
+            score = np.maximum(np.abs(temporal).max(axis=0), np.abs(spatial))
+            self.score[idx] = score
+            
+            level = np.searchsorted(SEVERITY_THRESHOLDS, score, side='right')
+            self.level[idx] = level
+            
+            events = []
+            for j in np.flatnonzero(level):
+                record = records[j]
+                signals = {signal: round(float(temporal[s, j]), 2) for s, signal in enumerate(SIGNALS)}
+                signals['spatial'] = round(float(spatial[j]), 2)
+                event = {
+                    'location_name': record['location_name'],
+                    'region': record.get('region', 'Unknown'),
+                    'location_type': record.get('location_type', 'unknown'),
+                    'timestamp': record['timestamp'],
+                    'severity': SEVERITY_NAMES[level[j]],
+                    'score': round(float(score[j]), 2),
+                    'emission': record['emission'],
+                    'signals': signals,
+                    'primary_signal': max(signals, key=lambda k: abs(signals[k]))
+                }
+                events.append(event)
+                self.history.append(event)
+        
+        for j, record in enumerate(records):
+            record['data_quality'] = 'anomaly_detected' if level[j] else 'good'
+        return events
+    
+    def current(self):
+        """Stations whose latest reading is anomalous, highest score first"""
+        with self.lock:
+            flagged = np.flatnonzero(self.level)
+            flagged = flagged[np.argsort(-self.score[flagged])]
+            return [{
+                'location_name': self.state.names[i],
+                'severity': SEVERITY_NAMES[self.level[i]],
+                'score': round(float(self.score[i]), 2),
+                'signals': {signal: round(float(self.scores[signal][i]), 2) for signal in self.scores}
+            } for i in flagged]
+    
+    def recent(self, location_name=None, severity=None, limit=100):
+        """Anomaly events, newest first"""
+        with self.lock:
+            events = list(self.history)
+        events.reverse()
+        if location_name:
+            events = [e for e in events if e['location_name'] == location_name]
+        if severity:
+            events = [e for e in events if e['severity'] == severity]
+        return events[:limit]
@@ -1,5 +1,5 @@
 # Enhanced app.py with improved GeoJSON mapping support
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import joblib
 import pandas as pd
@@ -10,11 +10,69 @@ import threading
 import warnings
 import os
 import json
+import atexit
+import hmac
+import functools
+import bisect
+import math
+from extract_location import load_locations_from_npz
+from region_classifier import RegionClassifier
+from station_state import StationState
+from heatmap import HeatmapCache
+from clusters import ClusterIndex
+from spatial_index import SpatialIndex
+from anomalies import AnomalyDetector
+from alerts import AlertEngine, AlertNotifier, load_alert_config
+from ingest import IngestQueue, make_batch, parse_ndjson, parse_binary, split_by_occurrence, RECORD_DTYPE
+from shared_state import SharedTickBuffer, DEFAULT_SEGMENT_NAME, SOURCE_NAMES
+from metrics import REGISTRY, SIZE_BUCKETS, start_trace, stop_trace
+from profiler import SamplingProfiler, SlowRequestLog
+from scenario import ScenarioEngine
+from forecast import ForecastCache
+from features import GAS_COLUMNS, RollingFeatureState, rolling_features
+from aggregates import GroupAggregates
+from history import HistoryStore, HISTORY_DTYPE
+from checkpoint import Checkpointer
+import export
+from coalesce import SingleFlight
+import location_detail
+from location_detail import LocationHistory
+from series import CompressedSeries
+from sampling import SamplingSchedule
+from sketches import QuantileSketches
+import sys
+from collections import Counter, deque
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
+# Hot-path instrumentation, exposed at /metrics
+STAGE_SECONDS = REGISTRY.histogram('co2_pipeline_stage_seconds', 'Time spent in each stage of the tick pipeline', ('stage',))
+TICK_SECONDS = REGISTRY.histogram('co2_tick_seconds', 'Time to score and publish one drained ingest batch')
+READINGS_TOTAL = REGISTRY.counter('co2_readings_processed_total', 'Readings scored and published', ('source',))
+GENERATOR_LAG = REGISTRY.histogram('co2_generator_lag_seconds', 'Delay from a simulated reading being generated to it being published')
+GENERATOR_INTERVAL = REGISTRY.gauge('co2_generator_interval_seconds', 'Wall time between the last two simulator ticks')
+REQUEST_SECONDS = REGISTRY.histogram('co2_http_request_seconds', 'HTTP request latency', ('route', 'method', 'status'))
+RESPONSE_BYTES = REGISTRY.histogram('co2_http_response_bytes', 'HTTP response payload size', ('route',), SIZE_BUCKETS)
+SLOW_TOTAL = REGISTRY.counter('co2_slow_operations_total', 'Requests and ticks slower than CO2_SLOW_REQUEST_MS', ('name',))
+
+# Admin endpoints (profile capture, slow-request log) are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('CO2_ADMIN_TOKEN', '')
+# Requests and ticks slower than this are logged with their stack and stage timings (0 disables)
+slow_requests = SlowRequestLog(float(os.environ.get('CO2_SLOW_REQUEST_MS', '1000')) / 1000)
+slow_requests.start_watchdog()
+
+def log_if_slow(entry):
+    """Report a SlowRequestLog entry: counter, one summary line and the innermost frames"""
+    if entry is None:
+        return
+    SLOW_TOTAL.inc(name=entry.get('route', entry['name']))
+    stages = ', '.join(f"{name} {ms}ms" for name, ms in sorted(entry['stage_ms'].items(), key=lambda item: -item[1])[:5])
+    print(f"🐢 Slow {entry['name']}: {entry['duration_ms']:.0f}ms" + (f" ({stages})" if stages else ""))
+    for frame in (entry['stack'] or [])[-6:]:
+        print(f"      at {frame}")
+
 class RealTimeEmissionMonitor:
     def __init__(self, model_path='emission_model_complete.pkl', data_path='playground-series-s3e20'):
         """Initialize the real-time emission monitor"""
@@ -38,17 +96,31 @@ class RealTimeEmissionMonitor:
         print(f"Initialized monitor with {len(self.locations)} locations")
     
     def _load_locations_from_json(self):
-        """Load locations from extracted_locations.json file"""
+        """Load locations from extracted_locations.json (or its faster .npz station table)"""
         try:
             # Try multiple possible paths
             possible_paths = [
                 'extracted_locations.json',
-                './extracted_locations.json',
-                os.path.join(os.path.dirname(__file__), 'extracted_locations.json'),
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extracted_locations.json'),
                 'playground-series-s3e20/extracted_locations.json'
             ]
+            # Explicit station file (e.g. synthetic networks for benchmark.py)
+            if os.environ.get('CO2_LOCATIONS_FILE'):
+                possible_paths.insert(0, os.environ['CO2_LOCATIONS_FILE'])
             
             for json_path in possible_paths:
+                npz_path = os.path.splitext(json_path)[0] + '.npz'
+                
+                # Prefer the binary station table unless the JSON was edited after it was written
+                if os.path.exists(npz_path) and (not os.path.exists(json_path) or
+                                                 os.path.getmtime(npz_path) >= os.path.getmtime(json_path)):
+                    try:
+                        locations = load_locations_from_npz(npz_path)
+                        print(f"✓ Loaded {len(locations)} locations from {npz_path}")
+                        return locations
+                    except Exception as e:
+                        print(f"Warning: could not read {npz_path} ({e}), falling back to JSON")
+                
                 if os.path.exists(json_path):
                     with open(json_path, 'r') as f:
                         locations = json.load(f)
@@ -137,11 +209,13 @@ class RealTimeEmissionMonitor:
         """Return all monitoring locations"""
         return self.locations
     
-    def predict_emission(self, latitude, longitude, so2_density=None, no2_density=None, co_density=None, year=2023, week_no=None):
-        """Predict emission and calculate CO2 equivalent"""
+    def predict_emission(self, latitude, longitude, so2_density=None, no2_density=None, co_density=None, year=2023, week_no=None,
+                         timestamp=None):
+        """Predict emission and calculate CO2 equivalent (at `timestamp` in epoch seconds, default now)"""
+        moment = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
         
         if week_no is None:
-            week_no = datetime.now().isocalendar()[1]
+            week_no = moment.isocalendar()[1]
         
         if self.model is None:
             # Enhanced mock prediction with location-specific patterns
@@ -168,7 +242,7 @@ class RealTimeEmissionMonitor:
                 base_emission *= type_multipliers.get(location_info['type'], 1.0)
             
             # Add time-based variation
-            current_hour = datetime.now().hour
+            current_hour = moment.hour
             time_factor = 1.0 + 0.3 * np.sin(2 * np.pi * current_hour / 24)
             
             # Add gas density influence
@@ -190,26 +264,14 @@ class RealTimeEmissionMonitor:
             input_data['year'] = year
             input_data['week_no'] = week_no
             
-            if so2_density is not None:
-                input_data['SulphurDioxide_SO2_column_number_density'] = so2_density
-                so2_features = [f for f in self.feature_names if 'SulphurDioxide' in f]
-                for feature in so2_features:
-                    if 'roll_mean' in feature:
-                        input_data[feature] = so2_density
-            
-            if no2_density is not None:
-                input_data['NitrogenDioxide_NO2_column_number_density'] = no2_density
-                no2_features = [f for f in self.feature_names if 'NitrogenDioxide' in f]
-                for feature in no2_features:
-                    if 'roll_mean' in feature:
-                        input_data[feature] = no2_density
-            
-            if co_density is not None:
-                input_data['CarbonMonoxide_CO_column_number_density'] = co_density
-                co_features = [f for f in self.feature_names if 'CarbonMonoxide' in f]
-                for feature in co_features:
-                    if 'roll_mean' in feature:
-                        input_data[feature] = co_density
+            # Without a station history the gas roll_means can only take the given density
+            densities = {'so2': so2_density, 'no2': no2_density, 'co': co_density}
+            for gas, column in GAS_COLUMNS.items():
+                if densities[gas] is not None:
+                    input_data[column] = densities[gas]
+            for feature, gas, _ in rolling_features(self.feature_names):
+                if densities[gas] is not None:
+                    input_data[feature] = densities[gas]
             
             df = pd.DataFrame([input_data])
             df = df[self.feature_names]
@@ -225,16 +287,107 @@ class RealTimeEmissionMonitor:
             'emission': float(emission),
             'co2_equivalent': float(co2_equivalent),
             'location': {'lat': latitude, 'lon': longitude},
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': moment.isoformat(),
             'gas_levels': {
                 'SO2': float(so2_density) if so2_density else 0,
                 'NO2': float(no2_density) if no2_density else 0,
                 'CO': float(co_density) if co_density else 0
             }
         }
+    
+    def predict_batch(self, latitudes, longitudes, so2_density, no2_density, co_density,
+                      timestamps=None, location_types=None, year=2023, week_no=None, noise=True, features=None,
+                      tick_stages=True):
+        """Vectorized predict_emission over arrays of readings, returns (emission, co2_equivalent)
+        
+        timestamps (epoch seconds) drive the time-of-day and week features;
+        week_no (scalar or per reading) overrides the week taken from them.
+        location_types avoids the nearest-station search when the stations are known.
+        noise=False drops the mock model's random term, for comparing two batches.
+        features maps roll_mean feature names to per-reading values (RollingFeatureState).
+        tick_stages=False keeps calls outside the tick pipeline (forecast, scenarios) out of STAGE_SECONDS.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        so2 = np.asarray(so2_density, dtype=np.float64)
+        no2 = np.asarray(no2_density, dtype=np.float64)
+        co = np.asarray(co_density, dtype=np.float64)
+        n = len(latitudes)
+        started = time.perf_counter()
+        
+        if timestamps is None:
+            timestamps = np.full(n, time.time())
+        
+        # Calendar fields per distinct timestamp (a simulator tick shares one)
+        unique_ts, inverse = np.unique(np.asarray(timestamps, dtype=np.float64), return_inverse=True)
+        moments = [datetime.fromtimestamp(ts) for ts in unique_ts]
+        hours = np.array([m.hour for m in moments])[inverse]
+        if week_no is None:
+            week_no = np.array([m.isocalendar()[1] for m in moments])[inverse]
+        
+        if self.model is None:
+            # Enhanced mock prediction with location-specific patterns
+            base_emission = 30 + np.abs(latitudes * 15) + np.abs(longitudes * 8)
+            
+            if location_types is None:
+                # Type of the closest known location
+                loc_lats = np.array([loc['lat'] for loc in self.locations.values()])
+                loc_lons = np.array([loc['lon'] for loc in self.locations.values()])
+                loc_types = np.array([loc['type'] for loc in self.locations.values()], dtype=object)
+                nearest = np.argmin((latitudes[:, None] - loc_lats) ** 2 + (longitudes[:, None] - loc_lons) ** 2, axis=1)
+                location_types = loc_types[nearest]
+            
+            type_multipliers = {
+                'industrial': 1.5,
+                'urban': 1.0,
+                'coastal': 0.7
+            }
+            base_emission *= np.array([type_multipliers.get(t, 1.0) for t in location_types])
+            
+            # Add time-based variation
+            time_factor = 1.0 + 0.3 * np.sin(2 * np.pi * hours / 24)
+            
+            # Add gas density influence
+            gas_influence = 1.0 + so2 * 500000 + no2 * 800000 + co * 50
+            
+            assembled = time.perf_counter()
+            emission = base_emission * time_factor * gas_influence
+            if noise:
+                emission = emission + np.random.normal(0, base_emission * 0.2)
+            emission = np.maximum(0, emission)
+        else:
+            # Real model prediction: one frame, one predict call for the whole batch
+            input_data = {feature: np.full(n, self.feature_defaults[feature]) for feature in self.feature_names}
+            input_data['latitude'] = latitudes
+            input_data['longitude'] = longitudes
+            input_data['year'] = np.broadcast_to(year, n)
+            input_data['week_no'] = np.broadcast_to(week_no, n)
+            
+            gases = {'so2': so2, 'no2': no2, 'co': co}
+            for gas, column in GAS_COLUMNS.items():
+                input_data[column] = gases[gas]
+            # roll_means from the stations' history where given, else the current density
+            features = features or {}
+            for feature, gas, _ in rolling_features(self.feature_names):
+                history = features.get(feature)
+                input_data[feature] = gases[gas] if history is None else np.where(np.isnan(history), gases[gas], history)
+            
+            df = pd.DataFrame(input_data)[self.feature_names]
+            assembled = time.perf_counter()
+            emission = np.asarray(self.model.predict(df), dtype=np.float64)
+        
+        predicted = time.perf_counter()
+        if tick_stages:
+            STAGE_SECONDS.observe(assembled - started, stage='feature_assembly')
+            STAGE_SECONDS.observe(predicted - assembled, stage='model_predict')
+        
+        # Enhanced CO2 equivalent calculation
+        co2_equivalent = so2 * 2000000 + no2 * 3100000 + co * 2300
+        
+        return emission, co2_equivalent
 
-def simulate_sensor_data(location_type='urban', base_multiplier=1.0, location_lat=0, location_lon=0):
-    """Enhanced sensor data simulation with location-specific patterns"""
+def simulate_sensor_data(location_type='urban', base_multiplier=1.0, location_lat=0, location_lon=0, timestamp=None):
+    """Enhanced sensor data simulation with location-specific patterns (at `timestamp`, default now)"""
     base_values = {
         'urban': {'so2': 0.00008, 'no2': 0.00004, 'co': 0.016},
         'industrial': {'so2': 0.00015, 'no2': 0.00008, 'co': 0.025},
@@ -244,8 +397,9 @@ def simulate_sensor_data(location_type='urban', base_multiplier=1.0, location_la
     base = base_values.get(location_type, base_values['urban'])
     
     # Add time-based variations (daily and weekly cycles)
-    current_hour = datetime.now().hour
-    current_day = datetime.now().weekday()
+    moment = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
+    current_hour = moment.hour
+    current_day = moment.weekday()
     
     # Daily cycle (higher during day, lower at night)
     daily_factor = 1.0 + 0.4 * np.sin(2 * np.pi * (current_hour - 6) / 24)
@@ -266,157 +420,884 @@ def simulate_sensor_data(location_type='urban', base_multiplier=1.0, location_la
         'co': max(0, np.random.normal(base['co'] * total_factor, base['co'] * 0.3))
     }
 
+SENSOR_BASE_VALUES = {
+    'urban': (0.00008, 0.00004, 0.016),
+    'industrial': (0.00015, 0.00008, 0.025),
+    'coastal': (0.00005, 0.00002, 0.010)
+}
+
+def simulate_sensor_batch(location_types, base_multipliers, location_lats, location_lons, timestamp=None):
+    """
+    Vectorized simulate_sensor_data, returns (so2, no2, co).
+    
+    timestamp (epoch seconds) is shared by all stations or given per station.
+    """
+    timestamps = np.atleast_1d(np.asarray(time.time() if timestamp is None else timestamp, dtype=np.float64))
+    unique_ts, inverse = np.unique(timestamps, return_inverse=True)
+    moments = [datetime.fromtimestamp(ts) for ts in unique_ts]
+    hours = np.array([m.hour for m in moments])[inverse]
+    weekdays = np.array([m.weekday() for m in moments])[inverse]
+    base = np.array([SENSOR_BASE_VALUES.get(t, SENSOR_BASE_VALUES['urban']) for t in location_types])
+    
+    # Daily cycle (higher during day, lower at night)
+    daily_factor = 1.0 + 0.4 * np.sin(2 * np.pi * (hours - 6) / 24)
+    
+    # Weekly cycle (higher on weekdays for industrial/urban)
+    busy = np.isin(np.asarray(location_types, dtype=object), ['industrial', 'urban'])
+    weekly_factor = np.where(busy, np.where(weekdays < 5, 1.2, 0.8), 1.0)
+    
+    # Location-specific geographical influence
+    geo_factor = 1.0 + 0.1 * np.sin(np.asarray(location_lats) * 2) + 0.1 * np.cos(np.asarray(location_lons) * 2)
+    
+    total_factor = (daily_factor * weekly_factor * geo_factor * base_multipliers)[:, None]
+    readings = np.maximum(0, np.random.normal(base * total_factor, base * 0.3))
+    return readings[:, 0], readings[:, 1], readings[:, 2]
+
 # Initialize the monitor
 monitor = RealTimeEmissionMonitor()
 
+# Region/type lookup for arbitrary coordinates (boundary polygons if available)
+region_classifier = RegionClassifier()
+
 # Store real-time data
 real_time_data = []
+MAX_STORED_POINTS = 3000
+# Readings ever appended, so positions in the store stay stable while old ones are dropped
+store_counters = {'appended': 0}
+store_lock = threading.Lock()
+
+def store_records(records, first_seq=None):
+    """
+    Append to the recent-readings store, keeping only the last MAX_STORED_POINTS.
+    
+    Every record gets a 'seq', increasing by one per reading; first_seq
+    sets the first one (workers number readings as the producer wrote them).
+    store_counters['appended'] is the last sequence number handed out.
+    """
+    with store_lock:
+        seq = store_counters['appended'] + 1 if first_seq is None else first_seq
+        for k, record in enumerate(records):
+            record['seq'] = seq + k
+        real_time_data.extend(records)
+        store_counters['appended'] = seq + len(records) - 1
+        if len(real_time_data) > MAX_STORED_POINTS:
+            del real_time_data[:len(real_time_data) - MAX_STORED_POINTS]
 locations = monitor.get_locations()
 
+# Latest reading per station as arrays, updated once per tick
+station_state = StationState(locations)
+
+# Weekly rolling means behind the model's roll_mean features (the three gas roll_means in mock mode)
+rolling_feature_state = RollingFeatureState(
+    len(station_state),
+    monitor.feature_names if monitor.model is not None else [f"{column}_roll_mean" for column in GAS_COLUMNS.values()]
+)
+
+def compute_rwanda_bounds():
+    """Map bounds around all stations: [[lat_min, lon_min], [lat_max, lon_max]] with 0.1 degree padding"""
+    if not locations:
+        return [[-2.8, 28.8], [-1.0, 30.9]]
+    return [
+        [float(station_state.lat.min()) - 0.1, float(station_state.lon.min()) - 0.1],
+        [float(station_state.lat.max()) + 0.1, float(station_state.lon.max()) + 0.1]
+    ]
+
+# Nearest-station lookups shared by the heatmap and the anomaly detector
+station_index = SpatialIndex(station_state.lat, station_state.lon)
+
+# Interpolated emission rasters, one per requested resolution
+heatmaps = HeatmapCache(station_state, compute_rwanda_bounds(), station_index)
+
+# Zoom-level cluster hierarchy for the map endpoints, colored with each station's alert thresholds
+# (alert_engine is created further down, before the first refresh)
+cluster_index = ClusterIndex(station_state, lambda indices, emissions: alert_engine.status_levels(indices, emissions))
+
+# What-if perturbations of the latest readings, scored in one batch
+scenario_engine = ScenarioEngine(station_state, monitor, cluster_index.stations_in_bbox)
+
+def forecast_inputs():
+    """Gas levels to forecast from: each station's latest reading, its type's base values before it has one"""
+    base = np.array([SENSOR_BASE_VALUES.get(t, SENSOR_BASE_VALUES['urban']) for t in station_state.types])
+    with station_state.lock:
+        current = np.column_stack([station_state.so2, station_state.no2, station_state.co])
+        has_data = station_state.has_data.copy()
+    gases = np.where(has_data[:, None], current, base)
+    return gases[:, 0], gases[:, 1], gases[:, 2]
+
+# Weekly forecast matrix, refreshed nightly so lookups never run the model
+FORECAST_HORIZON_WEEKS = 52
+forecast_cache = ForecastCache(station_state, monitor, forecast_inputs, FORECAST_HORIZON_WEEKS)
+
+# Rolling per-station and neighbour-based anomaly scoring
+anomaly_detector = AnomalyDetector(station_state, station_index)
+
+# Last readings of every station by station index, for the location detail endpoints
+location_history = LocationHistory(len(station_state))
+
+# Emission quantile sketches and histograms per station, region, type and overall, cumulative since startup
+emission_sketches = QuantileSketches(len(station_state), {'region': station_state.regions, 'type': station_state.types})
+
+# Compressed per-station history (delta-of-delta timestamps, XOR floats), oldest blocks dropped past CO2_SERIES_MAX_MB
+SERIES_MAX_BYTES = int(float(os.environ.get('CO2_SERIES_MAX_MB', '512')) * 1024 * 1024)
+station_series = CompressedSeries(len(station_state), max_bytes=SERIES_MAX_BYTES)
+
+def record_location_history(indices, timestamp, emission, so2, no2, co, anomaly_level):
+    location_history.push(indices, {'timestamp': timestamp, 'emission': emission, 'so2': so2, 'no2': no2, 'co': co,
+                                    'good': np.asarray(anomaly_level) == 0})
+    emission_sketches.update(indices, emission)
+    station_series.append(indices, {'timestamp': timestamp, 'emission': emission, 'so2': so2, 'no2': no2, 'co': co})
+
+# Threshold alerts with hysteresis, delivered asynchronously to the configured sinks
+alert_config = load_alert_config()
+# Multi-process deployment: one producer publishes to shared memory, HTTP workers only read it
+SHARED_STATE_ROLE = os.environ.get('CO2_SHARED_STATE', '').lower()  # '', 'producer' or 'worker'
+SHARED_STATE_NAME = os.environ.get('CO2_SHARED_STATE_NAME', DEFAULT_SEGMENT_NAME)
+IS_WORKER = SHARED_STATE_ROLE == 'worker'
+
+# Workers never raise alerts themselves, so they don't start sink threads
+alert_notifier = AlertNotifier.from_config(alert_config) if not IS_WORKER else AlertNotifier([])
+alert_engine = AlertEngine(station_state, alert_config, alert_notifier)
+
+# Adaptive simulator sampling: each station every CO2_SAMPLE_MIN_SECONDS (volatile or near a threshold)
+# to CO2_SAMPLE_MAX_SECONDS (quiet); equal values sample every station every tick
+GENERATOR_SECONDS = 3.0
+sampling_schedule = SamplingSchedule(
+    len(station_state), alert_engine.medium, alert_engine.high, tick=GENERATOR_SECONDS,
+    min_interval=float(os.environ.get('CO2_SAMPLE_MIN_SECONDS', GENERATOR_SECONDS)),
+    max_interval=float(os.environ.get('CO2_SAMPLE_MAX_SECONDS', '24'))
+)
+
+# Status presentation per level (1 = LOW, 2 = MEDIUM, 3 = HIGH)
+STATUS_STYLES = {
+    3: {'status': 'HIGH', 'hex': '#dc2626', 'color': 'red'},
+    2: {'status': 'MEDIUM', 'hex': '#ea580c', 'color': 'orange'},
+    1: {'status': 'LOW', 'hex': '#059669', 'color': 'green'}
+}
+
+# Region and type aggregates, folded in incrementally per tick
+aggregates = {
+    'region': GroupAggregates(station_state, station_state.regions),
+    'type': GroupAggregates(station_state, station_state.types)
+}
+
+def update_aggregates(changed):
+    levels = alert_engine.level[changed]
+    for group_aggregates in aggregates.values():
+        group_aggregates.update(changed, levels)
+
+def update_sampling_schedule(changed):
+    sampling_schedule.observe(changed, station_state.emission[changed], station_state.timestamp[changed],
+                              urgent=alert_engine.pending_level[changed] != 0)
+
+# Callables run with the changed station indices after every published tick (e.g. the ASGI stream)
+tick_listeners = [update_aggregates, update_sampling_schedule]
+
+def publish_tick(tick_results):
+    """Apply one generator tick to the per-station state and everything derived from it"""
+    # Sets data_quality on every record before it is stored
+    with STAGE_SECONDS.time(stage='anomaly_detection'):
+        anomaly_detector.evaluate(tick_results)
+    
+    with STAGE_SECONDS.time(stage='store_append'):
+        # The recent-readings store keeps the last MAX_STORED_POINTS; older readings live in the per-station history
+        store_records(tick_results)
+        changed = station_state.update(tick_results)
+        record_location_history(changed, station_state.timestamp[changed], station_state.emission[changed],
+                                station_state.so2[changed], station_state.no2[changed], station_state.co[changed],
+                                anomaly_detector.level[changed])
+    
+    with STAGE_SECONDS.time(stage='alert_evaluation'):
+        alert_engine.evaluate(changed)
+    
+    with STAGE_SECONDS.time(stage='snapshot_publish'):
+        heatmaps.refresh_all()
+        cluster_index.refresh()
+        
+        for listener in tick_listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"❌ Error in tick listener: {e}")
+
+# Bounded queue between reading producers (simulator, /api/ingest) and the scoring consumer
+ingest_queue = IngestQueue()
+
+def simulate_station_batch(timestamp=None, stations=None):
+    """
+    One simulated reading for every station (or the given station indices), as an ingest batch.
+    
+    timestamp may also be an array of tick times (replay), giving one
+    reading per station per tick, tick by tick.
+    """
+    started = time.perf_counter()
+    ticks = np.atleast_1d(np.asarray(time.time() if timestamp is None else timestamp, dtype=np.float64))
+    stations = np.arange(len(station_state)) if stations is None else np.asarray(stations, dtype=np.int64)
+    n = len(stations)
+    idx = np.tile(stations, len(ticks))
+    m = len(idx)
+    
+    # Enhanced variation based on location properties
+    coord_factor = 1.0 + 0.15 * np.sin(station_state.lat * 3) + 0.15 * np.cos(station_state.lon * 3)
+    
+    # Add random events (occasional spikes)
+    event_factor = np.where(np.random.random(m) < 0.05, 1.5 + np.random.random(m) * 1.0, 1.0)
+    
+    timestamps = np.repeat(ticks, n)
+    so2, no2, co = simulate_sensor_batch(
+        station_state.types[idx],
+        coord_factor[idx] * event_factor,
+        station_state.lat[idx],
+        station_state.lon[idx],
+        timestamps
+    )
+    batch = make_batch(idx, timestamps, so2, no2, co, 'simulator')
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage='simulate')
+    return batch
+
+def score_readings(batch):
+    """Score raw readings through the model in one call and build the stored records"""
+    idx = batch['station']
+    with STAGE_SECONDS.time(stage='rolling_features'):
+        rolling_feature_state.update(idx, batch['so2'], batch['no2'], batch['co'], batch['timestamp'])
+        features = rolling_feature_state.values(idx)
+    emission, co2_equivalent = monitor.predict_batch(
+        station_state.lat[idx],
+        station_state.lon[idx],
+        batch['so2'],
+        batch['no2'],
+        batch['co'],
+        timestamps=batch['timestamp'],
+        location_types=station_state.types[idx],
+        features=features
+    )
+    
+    started = time.perf_counter()
+    iso_times = {ts: datetime.fromtimestamp(ts).isoformat() for ts in np.unique(batch['timestamp']).tolist()}
+    records = []
+    for j, i in enumerate(idx.tolist()):
+        location_name = station_state.names[i]
+        location_info = locations[location_name]
+        records.append({
+            'emission': float(emission[j]),
+            'co2_equivalent': float(co2_equivalent[j]),
+            'location': {'lat': location_info['lat'], 'lon': location_info['lon']},
+            'timestamp': iso_times[float(batch['timestamp'][j])],
+            'gas_levels': {
+                'SO2': float(batch['so2'][j]),
+                'NO2': float(batch['no2'][j]),
+                'CO': float(batch['co'][j])
+            },
+            'location_name': location_name,
+            'location_type': location_info['type'],
+            'region': location_info['region'],
+            'source': location_info.get('source', 'unknown'),
+            'reading_source': batch['source'][j]
+        })
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage='record_build')
+    return records
+
+# Held while a batch is published, so a checkpoint never sees half a tick
+pipeline_lock = threading.Lock()
+
+def process_ingest_batch(batch):
+    """Score and publish a drained batch, one publish per round of distinct stations"""
+    slow_requests.begin('tick')
+    start_trace()
+    try:
+        with TICK_SECONDS.time(), pipeline_lock:
+            for part in split_by_occurrence(batch):
+                publish_tick(score_readings(part))
+    finally:
+        log_if_slow(slow_requests.finish(stop_trace(), readings=len(batch['station'])))
+    
+    sources, counts = np.unique(batch['source'], return_counts=True)
+    for source, count in zip(sources, counts):
+        READINGS_TOTAL.inc(int(count), source=source)
+    
+    simulated = batch['timestamp'][batch['source'] == 'simulator']
+    if len(simulated):
+        GENERATOR_LAG.observe(max(0.0, time.time() - float(simulated.min())))
+
+def consume_ingest_queue():
+    """Background consumer: drain queued readings and score them in vectorized batches"""
+    while True:
+        batch = ingest_queue.drain()
+        if len(batch['station']) == 0:
+            continue
+        
+        started = time.perf_counter()
+        try:
+            process_ingest_batch(batch)
+        except Exception as e:
+            print(f"❌ Error processing ingest batch: {e}")
+        ingest_queue.record_drain(len(batch['station']), time.perf_counter() - started)
+
 def generate_real_time_data():
-    """Enhanced background thread to generate realistic real-time data"""
+    """Simulator producer: every 3 seconds, enqueue one reading per station the sampling schedule says is due"""
     print("🔄 Starting real-time data generation...")
     
+    last_tick = None
     while True:
-        timestamp = datetime.now()
+        now = time.perf_counter()
+        if last_tick is not None:
+            GENERATOR_INTERVAL.set(now - last_tick)
+        last_tick = now
         
-        # Generate data for all locations
-        for location_name, location_info in locations.items():
-            # Enhanced variation based on location properties
-            coord_factor = 1.0 + 0.15 * np.sin(location_info['lat'] * 3) + 0.15 * np.cos(location_info['lon'] * 3)
-            
-            # Add random events (occasional spikes)
-            event_factor = 1.0
-            if np.random.random() < 0.05:  # 5% chance of event
-                event_factor = 1.5 + np.random.random() * 1.0
-            
-            sensor_data = simulate_sensor_data(
-                location_info['type'], 
-                coord_factor * event_factor,
-                location_info['lat'],
-                location_info['lon']
-            )
-            
-            result = monitor.predict_emission(
-                latitude=location_info['lat'],
-                longitude=location_info['lon'],
-                so2_density=sensor_data['so2'],
-                no2_density=sensor_data['no2'],
-                co_density=sensor_data['co']
-            )
-            
-            # Enhance result with location metadata
-            result.update({
-                'location_name': location_name,
-                'location_type': location_info['type'],
-                'region': location_info['region'],
-                'source': location_info.get('source', 'unknown'),
-                'data_quality': 'good' if event_factor < 1.3 else 'anomaly_detected'
-            })
-            
-            # Store the data
-            real_time_data.append(result)
+        due = sampling_schedule.due(time.time())
+        if len(due) and not ingest_queue.offer(simulate_station_batch(stations=due)):
+            print("⚠️ Ingest queue full, dropping simulator tick")
+        
+        time.sleep(GENERATOR_SECONDS)
+
+SOURCE_CODES = {name: code for code, name in enumerate(SOURCE_NAMES)}
+
+def publish_shared_state(changed):
+    """Producer tick listener: write this tick's readings and the latest state to shared memory"""
+    source = np.array([SOURCE_CODES.get(station_state.latest[i].get('reading_source'), 0) for i in changed.tolist()],
+                      dtype=np.uint8)
+    readings = {
+        'station': changed,
+        'timestamp': station_state.timestamp[changed],
+        'emission': station_state.emission[changed],
+        'co2_equivalent': station_state.co2_equivalent[changed],
+        'so2': station_state.so2[changed],
+        'no2': station_state.no2[changed],
+        'co': station_state.co[changed],
+        'anomaly_level': anomaly_detector.level[changed],
+        'source': source
+    }
+    latest = dict(readings, indices=changed, has_data=1, alert_level=alert_engine.level[changed],
+                  anomaly_score=anomaly_detector.score[changed])
+    shared_buffer.write(latest, readings, station_state.tick)
+
+def shared_record(i, timestamp, emission, co2_equivalent, so2, no2, co, anomaly_level, source):
+    """Rebuild a stored record from its shared-memory columns"""
+    location_name = station_state.names[i]
+    location_info = locations[location_name]
+    return {
+        'emission': emission,
+        'co2_equivalent': co2_equivalent,
+        'location': {'lat': location_info['lat'], 'lon': location_info['lon']},
+        'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+        'gas_levels': {'SO2': so2, 'NO2': no2, 'CO': co},
+        'location_name': location_name,
+        'location_type': location_info['type'],
+        'region': location_info['region'],
+        'source': location_info.get('source', 'unknown'),
+        'reading_source': SOURCE_NAMES[source] if source < len(SOURCE_NAMES) else 'unknown',
+        'data_quality': 'anomaly_detected' if anomaly_level else 'good'
+    }
+
+def apply_shared_snapshot(snapshot):
+    """
+    Worker: fold a shared-memory snapshot into the local state.
+    
+    Only the station arrays, the per-station history and the alert levels
+    are updated here. Record dicts, clusters and aggregates cost far more
+    and not every request reads them, so the readings they are built from
+    wait in worker_pending until ensure_worker_views() needs them.
+    """
+    ring = snapshot['ring']
+    latest = snapshot['latest']
+    changed = np.flatnonzero(latest['has_data'].astype(bool) & (latest['timestamp'] != station_state.timestamp))
+    station_state.update_arrays(changed, {field: latest[field][changed] for field in
+                                          ('emission', 'co2_equivalent', 'so2', 'no2', 'co', 'timestamp')})
+    record_location_history(ring['station'], ring['timestamp'], ring['emission'], ring['so2'], ring['no2'], ring['co'],
+                            ring['anomaly_level'])
+    
+    alert_engine.level[:] = np.maximum(latest['alert_level'], 1)
+    anomaly_detector.level[:] = latest['anomaly_level']
+    anomaly_detector.score[:] = latest['anomaly_score']
+    
+    if len(changed):
+        for listener in shared_tick_listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"❌ Error in shared tick listener: {e}")
+    
+    with worker_views_lock:
+        worker_pending['latest'] = latest
+        worker_pending['stale'][changed] = True
+        if len(ring['station']):
+            worker_pending['ring'].append((snapshot['first'] + 1, ring))
+        # The store keeps MAX_STORED_POINTS readings, older pending ones would be dropped right away
+        pending = worker_pending['ring']
+        while len(pending) > 1 and \
+                sum(len(chunk['station']) for _, chunk in pending[1:]) >= MAX_STORED_POINTS:
+            pending.pop(0)
+
+# Worker: callables run with the changed station indices after every sync that brought new readings (e.g. the ASGI
+# stream); tick_listeners only run in the process that publishes ticks
+shared_tick_listeners = []
+
+# Worker: readings synced but not yet turned into record dicts, and stations whose latest record is out of date
+worker_pending = {'ring': [], 'latest': None, 'stale': np.zeros(len(station_state), dtype=bool), 'aggregates_tick': 0}
+worker_views_lock = threading.Lock()
+
+# Worker: the derived views each endpoint reads; endpoints not listed get the recent records
+WORKER_VIEWS = {
+    'get_locations': ('records', 'clusters'),
+    'get_locations_geojson': ('records', 'clusters'),
+    'get_aggregates': ('aggregates',),
+    'get_heatmap': (),
+    'get_distribution': (),
+    'get_series': (),
+    'get_forecast': (),
+    'predict_single': (),
+    'run_scenario': (),
+    'get_rwanda_bounds': (),
+    'get_ingest_registry': (),
+    'ingest_readings': (),
+    'get_alerts': (),
+    'get_anomalies': (),
+    'metrics': ()
+}
+
+def ensure_worker_views(parts):
+    """Worker: bring the given views ('records', 'clusters', 'aggregates') up to the last sync"""
+    with worker_views_lock:
+        if 'records' in parts:
+            chunks, worker_pending['ring'] = worker_pending['ring'], []
+            stale = worker_pending['stale']
+            latest = worker_pending['latest']
+            for first_seq, ring in chunks:
+                columns = [ring[name].tolist() for name in
+                           ('station', 'timestamp', 'emission', 'co2_equivalent', 'so2', 'no2', 'co', 'anomaly_level', 'source')]
+                records = [shared_record(*values) for values in zip(*columns)]
+                store_records(records, first_seq=first_seq)
+                # Readings are in arrival order, so a station's last one is its newest
+                for i, record in zip(columns[0], records):
+                    station_state.latest[i] = record
+                stale[ring['station'][ring['timestamp'] == latest['timestamp'][ring['station']]]] = False
             
-            # Keep only recent data (last 3000 points for better analysis)
-            if len(real_time_data) > 3000:
-                real_time_data.pop(0)
+            # Stations whose newest reading is no longer in the ring (first sync, or this worker was lapped)
+            for i in np.flatnonzero(stale).tolist():
+                station_state.latest[i] = shared_record(
+                    i, latest['timestamp'][i], latest['emission'][i], latest['co2_equivalent'][i], latest['so2'][i],
+                    latest['no2'][i], latest['co'][i], latest['anomaly_level'][i], latest['source'][i])
+            stale[:] = False
         
-        time.sleep(3)  # Update every 3 seconds
+        if 'clusters' in parts:
+            cluster_index.refresh()
+        
+        if 'aggregates' in parts and worker_pending['aggregates_tick'] != station_state.tick:
+            worker_pending['aggregates_tick'] = station_state.tick
+            # Alert levels arrive for every station at once
+            update_aggregates(np.flatnonzero(station_state.has_data))
+
+shared_sync = {'buffer': None, 'written': 0, 'checked': 0.0}
+shared_sync_lock = threading.Lock()
+# How often a worker checks whether the producer restarted behind its mapping
+SHARED_EPOCH_CHECK_SECONDS = 1.0
+
+def detach_shared_state():
+    """Worker: drop a mapping the producer no longer writes, and the readings numbered after it"""
+    shared_sync['buffer'].close()
+    shared_sync['buffer'] = None
+    shared_sync['written'] = 0
+    with store_lock:
+        real_time_data.clear()
+        store_counters['appended'] = 0
+    with worker_views_lock:
+        worker_pending['ring'].clear()
+
+def sync_shared_state():
+    """Worker: pick up whatever the producer published since the last request"""
+    with shared_sync_lock:
+        buffer = shared_sync['buffer']
+        now = time.monotonic()
+        if buffer is not None and now - shared_sync['checked'] >= SHARED_EPOCH_CHECK_SECONDS:
+            shared_sync['checked'] = now
+            if SharedTickBuffer.current_epoch(SHARED_STATE_NAME) not in (None, buffer.epoch):
+                print("🔗 Producer restarted, reattaching to its shared state")
+                detach_shared_state()
+                buffer = None
+        if buffer is None:
+            try:
+                buffer = SharedTickBuffer.attach(SHARED_STATE_NAME)
+            except FileNotFoundError:
+                return  # producer not up yet, serve what we have
+            if buffer.n_stations != len(station_state):
+                print(f"❌ Shared state has {buffer.n_stations} stations, this worker loaded {len(station_state)}")
+                buffer.close()
+                return
+            shared_sync['buffer'] = buffer
+        
+        if buffer.written == shared_sync['written']:
+            return
+        snapshot, shared_sync['written'] = buffer.read(shared_sync['written'])
+        apply_shared_snapshot(snapshot)
+
+def prepare_worker_request(endpoint=None):
+    """Worker before_request hook: sync, then build what this endpoint (default: the request's) reads"""
+    sync_shared_state()
+    ensure_worker_views(WORKER_VIEWS.get(endpoint or request.endpoint, ('records',)))
 
-# Start background data generation
-data_thread = threading.Thread(target=generate_real_time_data, daemon=True)
-data_thread.start()
+# Optional on-disk history of every reading (CO2_HISTORY_DIR); exports read it, workers only read it
+HISTORY_DIR = os.environ.get('CO2_HISTORY_DIR', '')
+history_store = None
+
+def record_history(changed):
+    """Tick listener: append the tick's readings to the history store"""
+    history_store.append({
+        'station': changed,
+        'timestamp': station_state.timestamp[changed],
+        'emission': station_state.emission[changed],
+        'co2_equivalent': station_state.co2_equivalent[changed],
+        'so2': station_state.so2[changed],
+        'no2': station_state.no2[changed],
+        'co': station_state.co[changed],
+        'anomaly_level': anomaly_detector.level[changed]
+    })
+
+def records_to_rows(records):
+    """Stored records as HISTORY_DTYPE rows, plus each record's reading-source code"""
+    rows = np.zeros(len(records), dtype=HISTORY_DTYPE)
+    if records:
+        rows['station'] = [station_state.index.get(r['location_name'], -1) for r in records]
+        rows['timestamp'] = [datetime.fromisoformat(r['timestamp']).timestamp() for r in records]
+        for field in ('emission', 'co2_equivalent'):
+            rows[field] = [r[field] for r in records]
+        for field, gas in (('so2', 'SO2'), ('no2', 'NO2'), ('co', 'CO')):
+            rows[field] = [r['gas_levels'][gas] for r in records]
+        rows['anomaly_level'] = [r.get('data_quality') == 'anomaly_detected' for r in records]
+    source = np.array([SOURCE_CODES.get(r.get('reading_source'), 0) for r in records], dtype=np.uint8)
+    return rows, source
+
+if HISTORY_DIR and not IS_WORKER:
+    # ~6 MB parts: about ten minutes of readings at 497 stations
+    history_store = HistoryStore(HISTORY_DIR, station_state.names, part_rows=100_000)
+    atexit.register(history_store.flush)
+    tick_listeners.append(record_history)
+    print(f"🗄️ Recording history to {HISTORY_DIR}")
+
+# Warm restart: the producer snapshots its hot state every CO2_CHECKPOINT_SECONDS (0 disables)
+# and restores the last snapshot at startup
+CHECKPOINT_PATH = os.environ.get('CO2_CHECKPOINT_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoint.bin'))
+CHECKPOINT_SECONDS = float(os.environ.get('CO2_CHECKPOINT_SECONDS', '30'))
+
+def _named(prefix, arrays):
+    return {f'{prefix}.{key}': value for key, value in arrays.items()}
+
+def checkpoint_arrays():
+    """The live arrays a warm restart brings back, by checkpoint name"""
+    window, rolling = anomaly_detector.window, rolling_feature_state
+    arrays = {f'station.{name}': getattr(station_state, name) for name in
+              ('emission', 'co2_equivalent', 'so2', 'no2', 'co', 'timestamp', 'has_data', 'updated_tick')}
+    arrays.update(_named('anomaly.window', window.buffers))
+    arrays.update(_named('anomaly.scores', anomaly_detector.scores))
+    arrays.update({'anomaly.window.position': window.position, 'anomaly.window.count': window.count,
+                   'anomaly.score': anomaly_detector.score, 'anomaly.level': anomaly_detector.level})
+    arrays.update(_named('location.window', location_history.window.buffers))
+    arrays.update({'location.window.position': location_history.window.position,
+                   'location.window.count': location_history.window.count})
+    arrays.update(_named('series.pending', station_series.pending))
+    arrays.update({'series.pending_count': station_series.pending_count, 'series.capacity': station_series.capacity})
+    arrays.update({'sketch.stations': emission_sketches.stations, 'sketch.total': emission_sketches.total})
+    arrays.update({f'sketch.{by}': counts for by, (_, _, counts) in emission_sketches.groups.items()})
+    arrays.update({f'sampling.{name}': getattr(sampling_schedule, name) for name in
+                   ('mean', 'var', 'count', 'interval', 'next_due')})
+    arrays.update({f'alert.{name}': getattr(alert_engine, name) for name in
+                   ('level', 'pending_level', 'pending_since', 'since', 'last_notified')})
+    arrays.update(_named('rolling.sums', rolling.sums))
+    arrays.update(_named('rolling.completed', rolling.completed.buffers))
+    arrays.update({'rolling.bucket': rolling.bucket, 'rolling.counts': rolling.counts,
+                   'rolling.completed.position': rolling.completed.position, 'rolling.completed.count': rolling.completed.count})
+    for by, group in aggregates.items():
+        arrays.update({f'aggregates.{by}.{name}': getattr(group, name) for name in
+                       ('level', 'reporting', 'status_counts', 'max_emission', 'history_total', 'history_mean')})
+        arrays.update(_named(f'aggregates.{by}.values', group.values))
+        arrays.update(_named(f'aggregates.{by}.sums', group.sums))
+    return arrays
+
+def collect_checkpoint():
+    """(arrays, meta) copy of the hot state; runs with pipeline_lock held"""
+    arrays = {name: array.copy() for name, array in checkpoint_arrays().items()}
+    with store_lock:
+        records = list(real_time_data)
+        appended = store_counters['appended']
+    arrays['recent.rows'], arrays['recent.source'] = records_to_rows(records)
+    arrays['station.source'] = np.array([SOURCE_CODES.get(record.get('reading_source'), 0) if record else 0
+                                         for record in station_state.latest], dtype=np.uint8)
+    arrays['series.blocks'], arrays['series.payload'] = station_series.export_blocks()
+    meta = {
+        'version': 2,
+        'stations': station_state.names,
+        'tick': station_state.tick,
+        'appended': appended,
+        'alert_sequence': alert_engine.sequence,
+        'alert_events': list(alert_engine.history),
+        'anomaly_events': list(anomaly_detector.history),
+        'aggregates': {by: {'history_count': group.history_count, 'updates': group.updates,
+                            'history_times': list(group.history_times)} for by, group in aggregates.items()},
+        'series_evicted_blocks': station_series.stats['evicted_blocks']
+    }
+    return arrays, meta
+
+def restore_checkpoint(meta, arrays):
+    """Copy a checkpoint into the live state and rebuild the records and caches derived from it"""
+    if meta.get('stations') != station_state.names:
+        raise ValueError("written for a different station list")
+    live = checkpoint_arrays()
+    for name, target in live.items():
+        if name not in arrays or arrays[name].shape != target.shape:
+            raise ValueError(f"array {name} is missing or has a different shape")
+    station_series.load_blocks(arrays['series.blocks'], arrays['series.payload'])
+    for name, target in live.items():
+        np.copyto(target, arrays[name])
+    
+    station_state.tick = meta['tick']
+    latest = [station_state.timestamp, station_state.emission, station_state.co2_equivalent, station_state.so2,
+              station_state.no2, station_state.co, anomaly_detector.level, arrays['station.source']]
+    station_state.latest = [shared_record(i, *values) if has_data else None for i, (has_data, *values) in
+                            enumerate(zip(station_state.has_data.tolist(), *(column.tolist() for column in latest)))]
+    rows = arrays['recent.rows']
+    columns = [rows[name].tolist() for name in HISTORY_DTYPE.names] + [arrays['recent.source'].tolist()]
+    records = [shared_record(*values) for values in zip(*columns)]
+    first_seq = meta['appended'] - len(records) + 1
+    for k, record in enumerate(records):
+        record['seq'] = first_seq + k
+    # As after a live tick, a station's latest record is its newest stored reading (seq included)
+    for record in records:
+        station_state.latest[station_state.index[record['location_name']]] = record
+    with store_lock:
+        real_time_data[:] = records
+        store_counters['appended'] = meta['appended']
+    
+    station_series.stats['evicted_blocks'] = meta['series_evicted_blocks']
+    
+    alert_engine.sequence = meta['alert_sequence']
+    alert_engine.history.extend(meta['alert_events'])
+    anomaly_detector.history.extend(meta['anomaly_events'])
+    for by, group in aggregates.items():
+        saved = meta['aggregates'][by]
+        group.history_count, group.updates = saved['history_count'], saved['updates']
+        group.history_times = saved['history_times']
+        group.rebuild_body()
+    heatmaps.refresh_all()
+    cluster_index.refresh()
+
+checkpointer = Checkpointer(CHECKPOINT_PATH, collect_checkpoint, pipeline_lock, CHECKPOINT_SECONDS)
+
+# CO2_BACKGROUND_THREADS=0 leaves ticks to the caller (benchmark.py drives them itself)
+BACKGROUND_THREADS = os.environ.get('CO2_BACKGROUND_THREADS', '1') != '0'
+
+if IS_WORKER:
+    # Readings come from the producer process; no generator or consumer here
+    app.before_request(prepare_worker_request)
+    print(f"🔗 HTTP worker reading shared state '{SHARED_STATE_NAME}'")
+else:
+    if SHARED_STATE_ROLE == 'producer':
+        shared_buffer = SharedTickBuffer.create(len(station_state), MAX_STORED_POINTS, SHARED_STATE_NAME)
+        atexit.register(shared_buffer.close)
+        tick_listeners.append(publish_shared_state)
+        print(f"🔗 Publishing state to shared memory '{SHARED_STATE_NAME}'")
+    
+    if BACKGROUND_THREADS and CHECKPOINT_SECONDS > 0:
+        restored = checkpointer.restore(restore_checkpoint)
+        if restored:
+            print(f"♻️ Restored checkpoint from {restored['saved_at']} (tick {restored['tick']}, "
+                  f"{len(real_time_data)} readings) in {checkpointer.stats['restore_seconds'] * 1000:.1f} ms")
+        checkpoint_thread = threading.Thread(target=checkpointer.run, name='checkpoint', daemon=True)
+        checkpoint_thread.start()
+        atexit.register(checkpointer.save)
+    
+    if BACKGROUND_THREADS:
+        # Start background data generation and the ingest consumer
+        consumer_thread = threading.Thread(target=consume_ingest_queue, name='ingest-consumer', daemon=True)
+        consumer_thread.start()
+        data_thread = threading.Thread(target=generate_real_time_data, name='generator', daemon=True)
+        data_thread.start()
+        forecast_thread = threading.Thread(target=forecast_cache.run_nightly, name='forecast',
+                                           args=(int(os.environ.get('CO2_FORECAST_HOUR', '2')),), daemon=True)
+        forecast_thread.start()
+
+# Identical requests to the heavier read endpoints share one computation per tick
+# Memoized bodies are dropped at the next tick and capped at CO2_COALESCE_MAX_MB in total
+single_flight = SingleFlight(max_bytes=int(float(os.environ.get('CO2_COALESCE_MAX_MB', '64')) * 1024 * 1024),
+                             size=lambda result: len(result[0]))
+
+def coalesced(*params):
+    """
+    Serve a GET view through single_flight, keyed by route and the query parameters it reads.
+    
+    The first request after a tick runs the view; concurrent identical
+    requests wait for its body, and later ones reuse it until the next tick.
+    `params` must list every query parameter the view reads; others (like
+    cache-busting `_=<timestamp>`) don't split the key.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            query = tuple((name, tuple(request.args.getlist(name))) for name in params)
+            key = (view.__name__, query, tuple(sorted(kwargs.items())))
+            
+            def compute():
+                response = app.make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, response.mimetype
+            
+            body, status, mimetype = single_flight.run(key, station_state.tick, compute)
+            return Response(body, status=status, mimetype=mimetype)
+        return wrapper
+    return decorator
+
+def _parse_viewport():
+    """Optional viewport parameters: bbox=lon_min,lat_min,lon_max,lat_max and zoom"""
+    bbox = request.args.get('bbox')
+    zoom = request.args.get('zoom')
+    
+    if bbox is not None:
+        bbox = [float(v) for v in bbox.split(',')]
+        if len(bbox) != 4:
+            raise ValueError('bbox must be lon_min,lat_min,lon_max,lat_max')
+    if zoom is not None:
+        zoom = float(zoom)
+    return bbox, zoom
+
+def _visible_stations():
+    """Clusters (None when no zoom given) and station indices for the requested viewport"""
+    bbox, zoom = _parse_viewport()
+    if zoom is None:
+        return None, cluster_index.stations_in_bbox(bbox)
+    return cluster_index.query(zoom, bbox)
 
 @app.route('/api/locations', methods=['GET'])
+@coalesced('bbox', 'zoom')
 def get_locations():
-    """Get all monitoring locations with enhanced metadata"""
+    """Get all monitoring locations with enhanced metadata
+    
+    With zoom (and optionally bbox), stations that overlap at that zoom are
+    returned as aggregated clusters alongside the individual locations.
+    """
+    try:
+        clusters, station_indices = _visible_stations()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    data_points = Counter(d.get('location_name') for d in real_time_data)
     enhanced_locations = {}
     
-    for location_name, location_info in locations.items():
-        # Get recent data for this location
-        recent_data = [d for d in real_time_data if d.get('location_name') == location_name]
-        latest_data = recent_data[-1] if recent_data else None
+    for i in station_indices:
+        location_name = station_state.names[i]
+        location_info = locations[location_name]
+        latest_data = station_state.latest[i]
         
         enhanced_locations[location_name] = {
             **location_info,
-            'data_points': len(recent_data),
+            'data_points': data_points.get(location_name, 0),
             'last_update': latest_data['timestamp'] if latest_data else None,
             'current_emission': latest_data['emission'] if latest_data else 0,
             'data_quality': latest_data.get('data_quality', 'unknown') if latest_data else 'no_data'
         }
     
-    return jsonify(enhanced_locations)
+    if clusters is None:
+        return jsonify(enhanced_locations)
+    
+    return jsonify({
+        'clusters': clusters,
+        'locations': enhanced_locations
+    })
+
+def _station_feature(location_name, location_info, latest_data):
+    """GeoJSON feature for a single station"""
+    if latest_data:
+        emission = latest_data['emission']
+        gas_levels = latest_data['gas_levels']
+        timestamp = latest_data['timestamp']
+        data_quality = latest_data.get('data_quality', 'unknown')
+    else:
+        emission = 0
+        gas_levels = {'SO2': 0, 'NO2': 0, 'CO': 0}
+        timestamp = datetime.now().isoformat()
+        data_quality = 'no_data'
+    
+    # Enhanced status determination (per-station thresholds from the alert rules)
+    priority = alert_engine.status_level(station_state.index[location_name], emission)
+    status = STATUS_STYLES[priority]['status']
+    color = STATUS_STYLES[priority]['hex']
+    
+    # Calculate air quality index based on gas levels
+    aqi_so2 = (gas_levels['SO2'] * 1000000) / 0.075 * 100  # Simplified AQI calculation
+    aqi_no2 = (gas_levels['NO2'] * 1000000) / 0.053 * 100
+    aqi_co = (gas_levels['CO'] * 1000) / 9.0 * 100
+    overall_aqi = max(aqi_so2, aqi_no2, aqi_co)
+    
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [location_info['lon'], location_info['lat']]
+        },
+        "properties": {
+            "location_name": location_name,
+            "region": location_info['region'],
+            "location_type": location_info['type'],
+            "source": location_info.get('source', 'unknown'),
+            "emission": round(emission, 2),
+            "status": status,
+            "color": color,
+            "priority": priority,
+            "gas_levels": gas_levels,
+            "air_quality_index": round(overall_aqi, 1),
+            "timestamp": timestamp,
+            "data_quality": data_quality,
+            "coordinates_formatted": f"{location_info['lat']:.4f}, {location_info['lon']:.4f}"
+        }
+    }
+
+def _cluster_feature(cluster):
+    """GeoJSON feature for an aggregated cluster, colored by its worst station"""
+    max_emission = cluster['max_emission']
+    priority = cluster['max_status_level']
+    status = STATUS_STYLES[priority]['status']
+    color = STATUS_STYLES[priority]['hex']
+    
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [cluster['lon'], cluster['lat']]
+        },
+        "properties": {
+            "cluster": True,
+            "cluster_id": cluster['cluster_id'],
+            "point_count": cluster['point_count'],
+            "reporting_count": cluster['reporting_count'],
+            "mean_emission": round(cluster['mean_emission'], 2),
+            "max_emission": round(max_emission, 2),
+            "expansion_zoom": cluster['expansion_zoom'],
+            "status": status,
+            "color": color,
+            "priority": priority
+        }
+    }
 
 @app.route('/api/locations-geojson', methods=['GET'])
+@coalesced('bbox', 'zoom')
 def get_locations_geojson():
-    """Get locations in enhanced GeoJSON format optimized for mapping"""
-    features = []
+    """Get locations in enhanced GeoJSON format optimized for mapping
     
-    for location_name, location_info in locations.items():
-        # Get latest data for this location
-        location_data = [d for d in real_time_data if d.get('location_name') == location_name]
-        latest_data = location_data[-1] if location_data else None
-        
-        if latest_data:
-            emission = latest_data['emission']
-            gas_levels = latest_data['gas_levels']
-            timestamp = latest_data['timestamp']
-            data_quality = latest_data.get('data_quality', 'unknown')
-        else:
-            emission = 0
-            gas_levels = {'SO2': 0, 'NO2': 0, 'CO': 0}
-            timestamp = datetime.now().isoformat()
-            data_quality = 'no_data'
-        
-        # Enhanced status determination
-        if emission > 100:
-            status = "HIGH"
-            color = "#dc2626"
-            priority = 3
-        elif emission > 50:
-            status = "MEDIUM"
-            color = "#ea580c"
-            priority = 2
-        else:
-            status = "LOW"
-            color = "#059669"
-            priority = 1
-        
-        # Calculate air quality index based on gas levels
-        aqi_so2 = (gas_levels['SO2'] * 1000000) / 0.075 * 100  # Simplified AQI calculation
-        aqi_no2 = (gas_levels['NO2'] * 1000000) / 0.053 * 100
-        aqi_co = (gas_levels['CO'] * 1000) / 9.0 * 100
-        overall_aqi = max(aqi_so2, aqi_no2, aqi_co)
-        
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [location_info['lon'], location_info['lat']]
-            },
-            "properties": {
-                "location_name": location_name,
-                "region": location_info['region'],
-                "location_type": location_info['type'],
-                "source": location_info.get('source', 'unknown'),
-                "emission": round(emission, 2),
-                "status": status,
-                "color": color,
-                "priority": priority,
-                "gas_levels": gas_levels,
-                "air_quality_index": round(overall_aqi, 1),
-                "timestamp": timestamp,
-                "data_quality": data_quality,
-                "coordinates_formatted": f"{location_info['lat']:.4f}, {location_info['lon']:.4f}"
-            }
-        }
-        features.append(feature)
+    Accepts the same bbox/zoom viewport parameters as /api/locations; at low
+    zoom overlapping stations come back as cluster features.
+    """
+    try:
+        clusters, station_indices = _visible_stations()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    features = [_cluster_feature(cluster) for cluster in clusters or []]
+    for i in station_indices:
+        location_name = station_state.names[i]
+        features.append(_station_feature(location_name, locations[location_name], station_state.latest[i]))
     
     geojson = {
         "type": "FeatureCollection",
         "features": features,
         "metadata": {
-            "total_locations": len(features),
+            "total_locations": len(station_indices) + sum(c['point_count'] for c in clusters or []),
+            "total_clusters": len(clusters or []),
             "generation_time": datetime.now().isoformat(),
             "coordinate_system": "WGS84",
             "country": "Rwanda",
@@ -450,12 +1331,137 @@ def predict_single():
         co_density=data.get('co_density')
     )
     
+    region, location_type = region_classifier.classify_point(lat, lon)
+    result.update({
+        'region': region,
+        'location_type': location_type
+    })
+    
     return jsonify(result)
 
+@app.route('/api/scenario', methods=['POST'])
+def run_scenario():
+    """What-if run: perturb gas levels/week for selected stations and compare against their latest readings
+    
+    Body: {"selector": {"region": ..., "type": ..., "bbox": [lon_min, lat_min, lon_max, lat_max]},
+           "perturbations": {"CO": {"scale": 1.2}, "SO2": {"add": 1e-5}, "week": {"set": 30}}}
+    """
+    try:
+        result = scenario_engine.run(request.get_json(silent=True))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/forecast', methods=['GET'])
+def get_forecast():
+    """Emission forecast for the next ?weeks=N ISO weeks, for ?location=<name> or for a whole ?region=<name>"""
+    try:
+        weeks = int(request.args.get('weeks', 4))
+    except ValueError:
+        return jsonify({'error': 'weeks must be an integer'}), 400
+    if not 1 <= weeks <= FORECAST_HORIZON_WEEKS:
+        return jsonify({'error': f'weeks must be between 1 and {FORECAST_HORIZON_WEEKS}'}), 400
+    
+    location_name = request.args.get('location')
+    region = request.args.get('region')
+    if location_name:
+        i = station_state.index.get(location_name)
+        if i is None:
+            return jsonify({'error': 'Unknown location'}), 404
+        return jsonify({
+            'location_name': location_name,
+            'region': station_state.regions[i],
+            'location_type': station_state.types[i],
+            **forecast_cache.station(i, weeks)
+        })
+    if region:
+        indices = np.flatnonzero(np.array([r.lower() == region.lower() for r in station_state.regions]))
+        if not len(indices):
+            return jsonify({'error': 'Unknown region'}), 404
+        return jsonify({'region': station_state.regions[indices[0]], **forecast_cache.group(indices, weeks)})
+    return jsonify({'error': 'location or region is required'}), 400
+
+MAX_INGEST_BYTES = 8 * 1024 * 1024
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_readings():
+    """Accept a batch of field gateway readings into the ingest queue
+    
+    Body: JSON lines (one reading per line) or, with Content-Type
+    application/octet-stream, the packed binary format described by
+    /api/ingest/registry. Returns 202 once queued, 429 + Retry-After when
+    the queue is full, 413 when the batch is larger than the whole queue.
+    """
+    if IS_WORKER:
+        return jsonify({'error': 'Readings are ingested by the producer process'}), 503
+    
+    if request.content_length and request.content_length > MAX_INGEST_BYTES:
+        return jsonify({'error': f'Batch larger than {MAX_INGEST_BYTES} bytes'}), 413
+    
+    body = request.get_data()
+    try:
+        if request.mimetype == 'application/octet-stream':
+            batch, errors = parse_binary(body, station_state)
+        else:
+            batch, errors = parse_ndjson(body.decode('utf-8'), station_state)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    count = len(batch['station'])
+    if count == 0:
+        return jsonify({'error': 'No valid readings in batch', 'errors': errors[:20]}), 400
+    if count > ingest_queue.max_readings:
+        # Would never fit, even in an empty queue: retrying can't help, the client has to split it
+        return jsonify({'error': f'Batch of {count} readings exceeds the queue capacity of '
+                                 f'{ingest_queue.max_readings}; split it into smaller batches'}), 413
+    
+    if not ingest_queue.offer(batch):
+        retry_after = ingest_queue.retry_after(count)
+        response = jsonify({
+            'error': 'Ingest queue full',
+            'queue_depth': ingest_queue.depth,
+            'retry_after': retry_after
+        })
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    
+    return jsonify({
+        'accepted': count,
+        'errors': errors[:20],
+        'queue_depth': ingest_queue.depth
+    }), 202
+
+@app.route('/api/ingest/registry', methods=['GET'])
+def get_ingest_registry():
+    """Station registry for gateways: names and indices used by the binary ingest format"""
+    return jsonify({
+        'stations': [
+            {'index': i, 'location_name': name, 'lat': float(station_state.lat[i]), 'lon': float(station_state.lon[i])}
+            for i, name in enumerate(station_state.names)
+        ],
+        'binary_format': {
+            'content_type': 'application/octet-stream',
+            'header': "4-byte magic 'CO2I' + little-endian uint32 record count",
+            'record_fields': [[name, RECORD_DTYPE.fields[name][0].str] for name in RECORD_DTYPE.names],
+            'record_size': RECORD_DTYPE.itemsize
+        }
+    })
+
 @app.route('/api/realtime-data', methods=['GET'])
 def get_realtime_data():
-    """Get enhanced real-time data with filtering options"""
+    """Get enhanced real-time data with filtering options
+    
+    since=<seq> returns only readings newer than that sequence number
+    (oldest first, at most limit), plus next_cursor to pass as the next
+    since and gap=true when readings after the cursor were already evicted.
+    """
     location_name = request.args.get('location')
+    if request.args.get('since') is not None:
+        since = request.args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({'error': 'since must be a non-negative sequence number'}), 400
+        return jsonify(realtime_since(since, location_name, request.args.get('limit', MAX_STORED_POINTS, type=int)))
+    
     limit = request.args.get('limit', 100, type=int)
     
     if location_name:
@@ -475,100 +1481,116 @@ def get_realtime_data():
         }
     })
 
+def realtime_since(since, location_name=None, limit=MAX_STORED_POINTS):
+    """Stored readings with seq > since, found by binary search on seq"""
+    with store_lock:
+        oldest = real_time_data[0]['seq'] if real_time_data else store_counters['appended'] + 1
+        latest = store_counters['appended']
+        # A cursor past the newest reading comes from before a restart; start over from the oldest
+        gap = since < oldest - 1 or since > latest
+        start = 0 if since > latest else bisect.bisect_right(real_time_data, since, key=lambda record: record['seq'])
+        newer = real_time_data[start:]
+    
+    if location_name:
+        newer = [d for d in newer if d.get('location_name') == location_name]
+    data = newer[:max(limit, 0)]
+    
+    if data:
+        next_cursor = data[-1]['seq']
+    elif newer:
+        next_cursor = since if since <= latest else oldest - 1
+    else:
+        next_cursor = latest
+    return {
+        'data': data,
+        'total_points': len(data),
+        'time_range': {
+            'start': data[0]['timestamp'] if data else None,
+            'end': data[-1]['timestamp'] if data else None
+        },
+        'next_cursor': next_cursor,
+        'has_more': len(newer) > len(data),
+        'gap': gap,
+        'oldest_seq': oldest,
+        'latest_seq': latest
+    }
+
+LOCATION_RECORDS = {
+    'location_info': lambda i: locations.get(station_state.names[i], {}),
+    'current': lambda i: station_state.latest[i]
+}
+
 @app.route('/api/location-data/<location_name>', methods=['GET'])
 def get_location_data(location_name):
     """Get enhanced detailed data for a specific location"""
-    location_data = [d for d in real_time_data if d.get('location_name') == location_name]
-    recent_data = location_data[-50:] if len(location_data) > 50 else location_data
-    
-    if not recent_data:
+    i = station_state.index.get(location_name)
+    if i is None or not location_history.window.count[i]:
         return jsonify({'error': 'No data found for location'}), 404
     
-    # Enhanced analytics
-    latest = recent_data[-1] if recent_data else {}
-    
-    if len(recent_data) > 1:
-        emissions = [d['emission'] for d in recent_data]
-        so2_levels = [d['gas_levels']['SO2'] for d in recent_data]
-        no2_levels = [d['gas_levels']['NO2'] for d in recent_data]
-        co_levels = [d['gas_levels']['CO'] for d in recent_data]
-        timestamps = [d['timestamp'] for d in recent_data]
-        
-        # Calculate trends
-        emission_trend = 'stable'
-        if len(emissions) >= 10:
-            recent_avg = np.mean(emissions[-5:])
-            older_avg = np.mean(emissions[-10:-5])
-            if recent_avg > older_avg * 1.1:
-                emission_trend = 'increasing'
-            elif recent_avg < older_avg * 0.9:
-                emission_trend = 'decreasing'
-        
-        response = {
-            'location_name': location_name,
-            'location_info': locations.get(location_name, {}),
-            'current': latest,
-            'trends': {
-                'timestamps': timestamps,
-                'emissions': emissions,
-                'so2_levels': so2_levels,
-                'no2_levels': no2_levels,
-                'co_levels': co_levels,
-                'emission_trend': emission_trend
-            },
-            'statistics': {
-                'avg_emission': float(np.mean(emissions)),
-                'max_emission': float(np.max(emissions)),
-                'min_emission': float(np.min(emissions)),
-                'std_emission': float(np.std(emissions)),
-                'avg_so2': float(np.mean(so2_levels)),
-                'avg_no2': float(np.mean(no2_levels)),
-                'avg_co': float(np.mean(co_levels)),
-                'data_quality_score': len([d for d in recent_data if d.get('data_quality') == 'good']) / len(recent_data)
-            },
-            'data_summary': {
-                'total_readings': len(recent_data),
-                'time_span_hours': (datetime.fromisoformat(timestamps[-1].replace('Z', '+00:00')) - 
-                                  datetime.fromisoformat(timestamps[0].replace('Z', '+00:00'))).total_seconds() / 3600
-            }
-        }
-    else:
-        response = {
-            'location_name': location_name,
-            'location_info': locations.get(location_name, {}),
-            'current': latest,
-            'trends': {},
-            'statistics': {},
-            'data_summary': {'total_readings': len(recent_data)}
-        }
+    columns = location_history.columns([i], location_detail.ALL_FIELDS, location_detail.DEFAULT_WINDOW, LOCATION_RECORDS)
+    response = {'location_name': location_name}
+    for field, values in columns.items():
+        group, _, leaf = field.partition('.')
+        if leaf:
+            response.setdefault(group, {})[leaf] = values[0]
+        else:
+            response[group] = values[0]
     
+    if response['data_summary']['total_readings'] < 2:
+        response.update(trends={}, statistics={}, data_summary={'total_readings': response['data_summary']['total_readings']})
     return jsonify(response)
 
-@app.route('/api/current-status', methods=['GET'])
-def get_current_status():
-    """Get enhanced current status for all locations"""
+@app.route('/api/location-data', methods=['GET'])
+def get_locations_data():
+    """Detail for several stations at once, as columns
+    
+    names=a,b,c selects the stations, fields= projects the response
+    (dotted names like statistics.avg_emission, whole groups like trends,
+    or unique leaf names like emissions) and window=N sets how many recent
+    readings the series and statistics cover. Every column lists one value
+    per requested station, in the order of names.
+    """
+    names = [name for name in request.args.get('names', '').split(',') if name]
+    if not names:
+        return jsonify({'error': 'names is required (comma-separated location names)'}), 400
+    unknown = [name for name in names if name not in station_state.index]
+    if unknown:
+        return jsonify({'error': f"Unknown locations: {', '.join(unknown[:10])}"}), 400
+    
+    window = request.args.get('window', location_detail.DEFAULT_WINDOW, type=int)
+    if not 1 <= window <= location_history.window.window:
+        return jsonify({'error': f'window must be between 1 and {location_history.window.window}'}), 400
+    try:
+        fields = location_detail.resolve_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    indices = [station_state.index[name] for name in names]
+    return jsonify({
+        'names': names,
+        'window': window,
+        'fields': fields,
+        'columns': location_history.columns(indices, fields, window, LOCATION_RECORDS)
+    })
+
+# current-status JSON, serialized at most once per tick and shared by every client
+status_snapshot = {'tick': None, 'body': None}
+status_snapshot_lock = threading.Lock()
+
+def build_current_status():
+    """Enhanced current status for all locations"""
     current_status = {}
     
     # Get latest data point for each location
-    for location_name, location_info in locations.items():
-        location_data = [d for d in real_time_data if d.get('location_name') == location_name]
-        if location_data:
-            latest = location_data[-1]
+    for i, location_name in enumerate(station_state.names):
+        latest = station_state.latest[i]
+        if latest:
             emission = latest['emission']
             
             # Enhanced status classification
-            if emission > 100:
-                status = "HIGH"
-                color = "red"
-                alert_level = 3
-            elif emission > 50:
-                status = "MEDIUM" 
-                color = "orange"
-                alert_level = 2
-            else:
-                status = "LOW"
-                color = "green"
-                alert_level = 1
+            alert_level = alert_engine.status_level(i, emission)
+            status = STATUS_STYLES[alert_level]['status']
+            color = STATUS_STYLES[alert_level]['color']
             
             # Calculate data freshness
             time_diff = (datetime.now() - datetime.fromisoformat(latest['timestamp'].replace('Z', '+00:00'))).total_seconds()
@@ -590,7 +1612,104 @@ def get_current_status():
                 'coordinates_string': f"{latest['location']['lat']:.4f}, {latest['location']['lon']:.4f}"
             }
     
-    return jsonify(current_status)
+    return current_status
+
+def current_status_body():
+    """Serialized current status for the current tick, rebuilt only after a new tick"""
+    tick = station_state.tick
+    with status_snapshot_lock:
+        if status_snapshot['tick'] != tick:
+            status_snapshot['body'] = app.json.dumps(build_current_status())
+            status_snapshot['tick'] = tick
+        return status_snapshot['body']
+
+@app.route('/api/current-status', methods=['GET'])
+def get_current_status():
+    """Get enhanced current status for all locations"""
+    return Response(current_status_body(), mimetype='application/json')
+
+@app.route('/api/distribution', methods=['GET'])
+def get_distribution():
+    """Emission histogram and p50/p90/p99: overall, by=region|type (all groups or name=), or by=station&name="""
+    by = request.args.get('by', 'all')
+    name = request.args.get('name')
+    histogram = request.args.get('histogram', 'true').lower() != 'false'
+    
+    if by == 'all':
+        return jsonify(emission_sketches.overall(histogram))
+    if by == 'station':
+        i = station_state.index.get(name)
+        if i is None:
+            return jsonify({'error': f"Unknown location '{name}'"}), 404
+        return jsonify(dict(emission_sketches.station(i, histogram), name=name))
+    if by not in emission_sketches.groups:
+        return jsonify({'error': "by must be one of: all, region, type, station"}), 400
+    
+    groups = emission_sketches.by_group(by, histogram)
+    if name is not None:
+        groups = [group for group in groups if group['name'] == name]
+        if not groups:
+            return jsonify({'error': f"Unknown {by} '{name}'"}), 404
+        return jsonify(groups[0])
+    return jsonify({'by': by, 'groups': groups})
+
+@app.route('/api/series/<location_name>', methods=['GET'])
+def get_series(location_name):
+    """Stored readings of one station from the compressed series, as columns
+    
+    start/end (ISO time or epoch seconds) bound the time range, fields=
+    picks among emission, so2, no2 and co, and min_<field>/max_<field>
+    keep only readings inside a value range. Blocks that fall outside
+    the time or value range are skipped without being decoded. Timestamps
+    are epoch seconds; limit= keeps the newest readings.
+    """
+    i = station_state.index.get(location_name)
+    if i is None:
+        return jsonify({'error': f"Unknown location '{location_name}'"}), 404
+    fields = [field for field in request.args.get('fields', ','.join(station_series.fields)).split(',') if field]
+    unknown = [field for field in fields if field not in station_series.fields]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)} (one of {', '.join(station_series.fields)})"}), 400
+    try:
+        start = _parse_time(request.args.get('start'))
+        end = _parse_time(request.args.get('end'))
+        limit = int(request.args.get('limit', 10000))
+        ranges = {}
+        for field in station_series.fields:
+            low, high = request.args.get(f'min_{field}'), request.args.get(f'max_{field}')
+            if low is not None or high is not None:
+                ranges[field] = (float(low) if low is not None else -np.inf, float(high) if high is not None else np.inf)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid series parameter: {e}'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be >= 1'}), 400
+    
+    columns, blocks = station_series.scan(i, start, end, fields, ranges)
+    total = len(columns['timestamp'])
+    return jsonify({
+        'location_name': location_name,
+        'fields': fields,
+        'count': min(total, limit),
+        'truncated': total > limit,
+        'blocks': blocks,
+        'columns': {field: values[-limit:].tolist() for field, values in columns.items()}
+    })
+
+@app.route('/api/aggregates', methods=['GET'])
+def get_aggregates():
+    """Current per-region or per-type emission/gas aggregates (?by=region|type), optionally with ?history=<ticks>"""
+    group_aggregates = aggregates.get(request.args.get('by', 'region'))
+    if group_aggregates is None:
+        return jsonify({'error': 'by must be region or type'}), 400
+    
+    history = request.args.get('history')
+    if history is None:
+        return Response(group_aggregates.body, mimetype='application/json')
+    try:
+        limit = int(history)
+    except ValueError:
+        return jsonify({'error': 'history must be an integer'}), 400
+    return jsonify({**json.loads(group_aggregates.body), 'history': group_aggregates.history(limit)})
 
 @app.route('/api/rwanda-bounds', methods=['GET'])
 def get_rwanda_bounds():
@@ -623,10 +1742,7 @@ def get_rwanda_bounds():
     
     return jsonify({
         'center': {'lat': center_lat, 'lon': center_lon},
-        'bounds': [
-            [min(lats) - 0.1, min(lons) - 0.1], 
-            [max(lats) + 0.1, max(lons) + 0.1]
-        ],
+        'bounds': compute_rwanda_bounds(),
         'coordinate_range': {
             'lat_min': min(lats),
             'lat_max': max(lats),
@@ -644,7 +1760,71 @@ def get_rwanda_bounds():
         }
     })
 
+@app.route('/api/heatmap', methods=['GET'])
+def get_heatmap():
+    """Interpolated (IDW) current-emission raster over /api/rwanda-bounds
+    
+    res: cells along the longer side, one of 32, 64, 128, 256, 512 (default 128; others snap to the nearest)
+    format: 'png' (16-bit greyscale, 0 = no data, 1..65535 linear over X-Heatmap-Min/Max)
+            or 'f32' (little-endian float32, row-major from the northern edge, NaN = no data)
+    """
+    resolution = request.args.get('res', 128, type=int)
+    export_format = request.args.get('format', 'png')
+    if export_format not in ('png', 'f32'):
+        return jsonify({'error': "format must be 'png' or 'f32'"}), 400
+    
+    payload, headers = heatmaps.get(resolution).encode(export_format)
+    return Response(payload, headers=headers)
+
+@app.route('/api/alerts', methods=['GET'])
+def get_alerts():
+    """Active threshold alerts, recent alert events and sink delivery stats"""
+    limit = request.args.get('limit', 100, type=int)
+    
+    return jsonify({
+        'active': alert_engine.active(),
+        'history': alert_engine.recent(limit),
+        'sinks': alert_notifier.stats()
+    })
+
+# Local stand-in for an external webhook receiver (point a webhook sink at it for testing)
+webhook_received = deque(maxlen=100)
+
+@app.route('/api/alerts/webhook-sink', methods=['GET', 'POST'])
+def alert_webhook_sink():
+    """Record alert webhooks posted to this server; GET lists what was received"""
+    if request.method == 'POST':
+        webhook_received.append(request.get_json(silent=True))
+        return jsonify({'received': True})
+    return jsonify({'received': list(webhook_received)})
+
+@app.route('/api/anomalies', methods=['GET'])
+def get_anomalies():
+    """Currently anomalous stations plus recent anomaly history"""
+    location_name = request.args.get('location')
+    severity = request.args.get('severity')
+    limit = request.args.get('limit', 100, type=int)
+    
+    current = anomaly_detector.current()
+    if location_name:
+        current = [a for a in current if a['location_name'] == location_name]
+    if severity:
+        current = [a for a in current if a['severity'] == severity]
+    
+    severity_counts = Counter(a['severity'] for a in current)
+    
+    return jsonify({
+        'current': current,
+        'history': anomaly_detector.recent(location_name, severity, limit),
+        'summary': {
+            'anomalous_locations': len(current),
+            'by_severity': dict(severity_counts),
+            'total_locations': len(locations)
+        }
+    })
+
 @app.route('/api/eda-data', methods=['GET'])
+@coalesced()
 def get_eda_data():
     """Get enhanced data for EDA visualizations"""
     np.random.seed(42)
@@ -684,12 +1864,15 @@ def get_eda_data():
         'correlations': [0.103, 0.069, 0.047, 0.041, 0.033, 0.028]
     }
     
-    # Enhanced distribution data
+    # Emission distribution of every reading since startup, pre-binned, with quantiles per region and type
+    distribution = emission_sketches.overall()
+    distribution['by_region'] = emission_sketches.by_group('region', histogram=False)
+    distribution['by_type'] = emission_sketches.by_group('type', histogram=False)
+    
+    # Deprecated raw samples, kept for one release for existing consumers; use 'distribution' instead
     if real_time_data:
-        emissions = [d['emission'] for d in real_time_data[-2000:]]  # Last 2000 points
-        distribution_data = emissions
+        distribution_data = [d['emission'] for d in real_time_data[-2000:]]  # Last 2000 points
     else:
-        # Generate realistic distribution based on Rwanda data patterns
         distribution_data = np.concatenate([
             np.random.lognormal(mean=3.2, sigma=1.1, size=700),  # Main distribution
             np.random.lognormal(mean=4.2, sigma=0.8, size=200),  # Industrial peaks
@@ -697,18 +1880,14 @@ def get_eda_data():
         ]).tolist()
     
     # Location summary with enhanced metrics
-    location_types = {}
-    regions = {}
-    sources = {}
-    
-    for loc_data in locations.values():
-        location_types[loc_data['type']] = location_types.get(loc_data['type'], 0) + 1
-        regions[loc_data['region']] = regions.get(loc_data['region'], 0) + 1
-        sources[loc_data.get('source', 'unknown')] = sources.get(loc_data.get('source', 'unknown'), 0) + 1
+    location_types = aggregates['type'].sizes()
+    regions = aggregates['region'].sizes()
+    sources = dict(Counter(loc_data.get('source', 'unknown') for loc_data in locations.values()))
     
     return jsonify({
         'emission_trends': emission_trends,
         'correlation_data': correlation_data,
+        'distribution': distribution,
         'distribution_data': distribution_data,
         'location_summary': {
             'total_locations': len(locations),
@@ -724,10 +1903,86 @@ def get_eda_data():
         }
     })
 
+def _parse_time(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+def recent_segments():
+    """The recent-readings store as one export segment, positioned by readings ever appended"""
+    with store_lock:
+        records = list(real_time_data)
+        base = store_counters['appended'] - len(records)
+    rows, _ = records_to_rows(records)
+    if records:
+        return [export.Segment(base, len(rows), float(rows['timestamp'].min()), float(rows['timestamp'].max()), lambda: rows)]
+    return [export.Segment(base, 0, 0.0, 0.0, lambda: rows)]
+
+def stream_export(export_format):
+    try:
+        start = _parse_time(request.args.get('start'))
+        end = _parse_time(request.args.get('end'))
+        cursor = int(request.args.get('cursor', 0))
+        page_rows = int(request.args.get('limit', export.DEFAULT_PAGE_ROWS))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid export parameter: {e}'}), 400
+    if cursor < 0 or page_rows < 1:
+        return jsonify({'error': 'cursor must be >= 0 and limit >= 1'}), 400
+    
+    stations = None
+    if request.args.get('stations'):
+        names = request.args.get('stations').split(',')
+        unknown = [name for name in names if name not in station_state.index]
+        if unknown:
+            return jsonify({'error': f"Unknown stations: {', '.join(unknown[:10])}"}), 400
+        stations = np.array([station_state.index[name] for name in names], dtype=np.int32)
+    
+    if export_format == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return jsonify({'error': 'Parquet export requires pyarrow (pip install pyarrow)'}), 400
+    
+    store = history_store
+    if store is None and HISTORY_DIR:
+        try:
+            store = HistoryStore(HISTORY_DIR)  # HTTP worker: the producer's flushed parts
+        except FileNotFoundError:
+            store = None
+    if store is not None:
+        parts, pending = store.snapshot()
+        segments = export.store_segments(parts, pending, store.part_path)
+        source = 'history'
+    else:
+        segments = recent_segments()
+        source = 'recent'
+    
+    ranges, next_cursor = export.plan(segments, start, end, cursor, page_rows)
+    chunks = export.iter_chunks(ranges, start, end, stations)
+    headers = {
+        'Content-Disposition': f'attachment; filename=co2_export.{export_format}',
+        'X-Export-Source': source
+    }
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = str(next_cursor)
+    return Response(export.FORMATTERS[export_format](chunks, station_state.names),
+                    mimetype=export.MIMETYPES[export_format], headers=headers)
+
 @app.route('/api/export-data', methods=['GET'])
 def export_data():
-    """Export current data in various formats"""
+    """Export current data in various formats
+    
+    format=csv|ndjson|parquet streams stored readings (the history store
+    when CO2_HISTORY_DIR is set, otherwise the recent-readings store), with
+    optional start/end (ISO time or epoch seconds), stations=a,b, and
+    cursor/limit paging. json and geojson return the current snapshot.
+    """
     export_format = request.args.get('format', 'json')
+    if export_format in export.FORMATTERS:
+        return stream_export(export_format)
     
     # Prepare export data
     export_data = {
@@ -739,7 +1994,7 @@ def export_data():
             'coordinate_system': 'WGS84'
         },
         'locations': locations,
-        'current_status': get_current_status().get_json(),
+        'current_status': json.loads(current_status_body()),
         'recent_data': real_time_data[-500:] if len(real_time_data) > 500 else real_time_data
     }
     
@@ -758,13 +2013,154 @@ def health_check():
         'data_points_collected': len(real_time_data),
         'model_status': 'loaded' if monitor.model else 'mock_mode',
         'last_data_update': real_time_data[-1]['timestamp'] if real_time_data else 'no_data',
+        'ingest': {
+            'queue_depth': ingest_queue.depth,
+            'queue_capacity': ingest_queue.max_readings,
+            **ingest_queue.stats
+        },
+        'shared_state': {
+            'role': SHARED_STATE_ROLE or 'standalone',
+            'segment': SHARED_STATE_NAME if SHARED_STATE_ROLE else None,
+            'readings_synced': shared_sync['written'] if IS_WORKER else None
+        },
+        'checkpoint': dict(checkpointer.stats, path=CHECKPOINT_PATH, interval_seconds=CHECKPOINT_SECONDS)
+                      if BACKGROUND_THREADS and CHECKPOINT_SECONDS > 0 and not IS_WORKER else None,
+        'series': station_series.summary(),
+        'sampling': sampling_schedule.summary(),
+        'rolling_features': {
+            'features': [feature for feature, _, _ in rolling_feature_state.specs],
+            'stations_warm': int(rolling_feature_state.warm().sum())
+        },
         'system_info': {
             'python_backend': 'Flask',
             'data_update_interval': '3 seconds',
-            'max_stored_points': 3000
+            'max_stored_points': MAX_STORED_POINTS
         }
     })
 
+def _deep_size(value):
+    """Approximate memory of a stored record (dicts, lists, strings, numbers)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(v) for v in value)
+    return size
+
+def store_bytes():
+    """In-memory store sizes by component; records are sampled, the arrays are exact"""
+    records = real_time_data[-1:]
+    queued = list(ingest_queue.batches)
+    return {
+        ('realtime_records',): sys.getsizeof(real_time_data) + len(real_time_data) * (_deep_size(records[0]) if records else 0),
+        ('station_state',): sum(getattr(station_state, name).nbytes for name in
+                                ('lat', 'lon', 'emission', 'co2_equivalent', 'so2', 'no2', 'co', 'timestamp', 'has_data', 'updated_tick')),
+        ('series',): station_series.summary()['bytes'] + sum(p.nbytes for p in station_series.pending.values()),
+        ('anomaly_window',): sum(buffer.nbytes for buffer in anomaly_detector.window.buffers.values()),
+        ('heatmaps',): sum(layer.values.nbytes + layer.weights.nbytes + layer.neighbours.nbytes + layer.cells_by_station.nbytes
+                           for layer in list(heatmaps.layers.values())),
+        ('ingest_queue',): sum(values.nbytes for batch in queued for values in batch.values()),
+        ('coalesced_bodies',): single_flight.memo_bytes
+    }
+
+REGISTRY.gauge('co2_store_bytes', 'Approximate in-memory size of each data store', ('store',), callback=store_bytes)
+REGISTRY.gauge('co2_stored_points', 'Readings held in the recent-readings store', callback=lambda: len(real_time_data))
+REGISTRY.gauge('co2_ingest_queue_depth', 'Readings waiting in the ingest queue', callback=lambda: ingest_queue.depth)
+REGISTRY.counter('co2_ingest_rejected_readings_total', 'Readings rejected because the ingest queue was full',
+                 callback=lambda: ingest_queue.stats['rejected_full'])
+REGISTRY.counter('co2_coalesced_requests_total', 'Requests to coalesced endpoints: computed, memoized (same tick) '
+                 'or shared (waited for an identical request in flight)', ('route', 'outcome'), callback=single_flight.counts)
+REGISTRY.gauge('co2_coalescing_ratio', 'Requests served per computation of a coalesced endpoint', ('route',),
+               callback=lambda: {(route,): ratio for route, ratio in single_flight.ratios().items() if ratio is not None})
+REGISTRY.gauge('co2_station_sample_rate_hz', 'Simulator readings per second scheduled for each station', ('station',),
+               callback=lambda: {(name,): rate for name, rate in zip(station_state.names, sampling_schedule.rates().tolist())})
+REGISTRY.gauge('co2_sampling_load_ratio', 'Scheduled readings as a fraction of sampling every station at the minimum interval',
+               callback=lambda: sampling_schedule.summary()['load_ratio'])
+REGISTRY.gauge('co2_sampling_due_stations', 'Stations sampled by the last simulator tick',
+               callback=lambda: sampling_schedule.stats['last_due'])
+REGISTRY.gauge('co2_station_tick', 'Ticks published to the station state', callback=lambda: station_state.tick)
+REGISTRY.gauge('co2_stations_reporting', 'Stations with at least one reading', callback=lambda: int(station_state.has_data.sum()))
+REGISTRY.gauge('co2_alerts_active', 'Stations at MEDIUM or HIGH alert level', callback=lambda: int((alert_engine.level > 1).sum()))
+
+@app.before_request
+def start_request_timer():
+    request.environ['co2.started'] = time.perf_counter()
+    slow_requests.begin(f"{request.method} {request.path}")
+    start_trace()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get('co2.started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        log_if_slow(slow_requests.finish(stop_trace(), route=route, status=response.status_code))
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=str(response.status_code))
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_BYTES.observe(size, route=route)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text-format metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def _admin_denied():
+    """Error response unless admin endpoints are enabled and the request carries the token"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (set CO2_ADMIN_TOKEN)'}), 404
+    supplied = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+    if not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+profile_lock = threading.Lock()
+
+@app.route('/api/admin/profile', methods=['GET'])
+def capture_profile():
+    """Sample every thread of this process for ?seconds= and return collapsed stacks or a pstats file"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not (math.isfinite(seconds) and math.isfinite(interval)):
+        return jsonify({'error': 'seconds and interval_ms must be finite'}), 400
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'pstats'):
+        return jsonify({'error': 'format must be collapsed or pstats'}), 400
+    
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile capture is already running'}), 409
+    try:
+        # The capture itself is not a slow request
+        slow_requests.finish()
+        profile = SamplingProfiler(interval, request.args.get('thread')).run(seconds)
+    finally:
+        profile_lock.release()
+    
+    print(f"🔬 Profile captured: {profile.sample_count} samples over {profile.duration:.1f}s")
+    headers = {'X-Profile-Samples': str(profile.sample_count), 'X-Profile-Interval-Ms': str(profile.interval * 1000)}
+    if output_format == 'pstats':
+        return Response(profile.pstats(), mimetype='application/octet-stream', headers={
+            **headers, 'Content-Disposition': 'attachment; filename=co2_backend.pstats'})
+    return Response(profile.collapsed(), mimetype='text/plain', headers=headers)
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+def get_slow_requests():
+    """Recent requests and ticks over the slow threshold, newest first"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify({
+        'threshold_ms': slow_requests.threshold * 1000,
+        'entries': list(reversed(slow_requests.entries))
+    })
+
 if __name__ == '__main__':
     print("🚀 Starting Enhanced Flask CO2 Monitoring Server...")
     print("=" * 60)
@@ -772,19 +2168,33 @@ if __name__ == '__main__':
     print("=" * 60)
     print("Available API endpoints:")
     print("  GET  /api/health                    - System health check")
+    print("  GET  /metrics                       - Prometheus metrics")
     print("  GET  /api/locations                 - All monitoring locations")
     print("  GET  /api/locations-geojson         - Locations in GeoJSON format")
+    print("  GET  /api/aggregates?by=region|type - Per-region/type emission aggregates")
     print("  GET  /api/rwanda-bounds             - Rwanda geographical bounds")
     print("  POST /api/predict                   - Single location prediction")
+    print("  POST /api/scenario                  - What-if gas/week perturbations for selected stations")
+    print("  GET  /api/forecast?location=&weeks= - Weekly emission forecast for a station or ?region=")
+    print("  POST /api/ingest                    - Batched sensor readings (NDJSON/binary)")
     print("  GET  /api/realtime-data             - Real-time data stream")
     print("  GET  /api/location-data/<location>  - Detailed location analysis")
+    print("  GET  /api/location-data?names=a,b   - Several locations, projected fields as columns")
+    print("  GET  /api/distribution?by=region    - Emission histograms and p50/p90/p99")
+    print("  GET  /api/series/<location>         - Compressed history of a location, as columns")
     print("  GET  /api/current-status            - Current status overview")
+    print("  GET  /api/heatmap?res=              - Interpolated emission raster (PNG/f32)")
+    print("  GET  /api/alerts                    - Active alerts and notification status")
+    print("  GET  /api/anomalies                 - Current anomalies and history")
     print("  GET  /api/eda-data                  - EDA visualization data")
-    print("  GET  /api/export-data               - Data export endpoint")
+    print("  GET  /api/export-data               - Data export (json, geojson, csv/ndjson/parquet streaming)")
+    print("  GET  /api/admin/profile             - Sampling profile capture (needs CO2_ADMIN_TOKEN)")
+    print("  GET  /api/admin/slow-requests       - Slow requests/ticks with stacks (needs CO2_ADMIN_TOKEN)")
     print("=" * 60)
     print(f"📊 Monitoring {len(locations)} locations across Rwanda")
     print("🔄 Real-time data generation active")
     print("🌐 CORS enabled for frontend integration")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # The reloader would start a second producer writing the same segment
+    app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=SHARED_STATE_ROLE != 'producer')
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+ASGI serving mode for the CO2 monitoring API.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+All Flask routes are served unchanged through a small WSGI bridge that runs
+each request on a thread pool. Two paths are answered directly on the event
+loop so they never wait for a worker thread:
+
+  GET /api/current-status  - pre-serialized snapshot, rebuilt once per tick
+  GET /api/stream          - Server-Sent Events, one compact event per tick
+
+Stream subscribers are plain asyncio queues, so thousands of long-lived
+connections cost a coroutine each rather than a thread. The generator and
+ingest consumer keep running in their background threads and hand ticks to
+the loop with call_soon_threadsafe. As a shared-state worker
+(CO2_SHARED_STATE=worker) there is no generator: while anyone is subscribed,
+the shared state is polled and every sync that brings new readings becomes
+an event.
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import app as backend
+
+# Events buffered per subscriber; a client that falls further behind skips to the newest ticks
+SUBSCRIBER_QUEUE_SIZE = 8
+KEEPALIVE_SECONDS = 15.0
+# Worker: how often the shared state is polled while stream subscribers are connected
+WORKER_POLL_SECONDS = 0.5
+WSGI_THREADS = 32
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+class TickBroadcaster:
+    """Fan one serialized event per tick out to every stream subscriber"""
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = set()
+        self.stats = {'events': 0, 'dropped': 0}
+
+    def attach(self, loop):
+        self.loop = loop
+
+    def subscribe(self):
+        subscriber = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def on_tick(self, changed):
+        """Tick listener, called on the producer thread"""
+        if self.loop is None or not self.subscribers:
+            return
+        message = encode_tick_event(changed)
+        self.loop.call_soon_threadsafe(self._fanout, message)
+
+    def _fanout(self, message):
+        self.stats['events'] += 1
+        for subscriber in list(self.subscribers):
+            if subscriber.full():
+                subscriber.get_nowait()
+                self.stats['dropped'] += 1
+            subscriber.put_nowait(message)
+
+def encode_tick_event(changed):
+    """SSE event with the latest emission and alert level of the stations updated in a tick"""
+    state = backend.station_state
+    levels = backend.alert_engine.status_levels(changed, state.emission[changed])
+    payload = {
+        'tick': state.tick,
+        'timestamp': datetime.now().isoformat(),
+        'readings': [{
+            'location_name': state.names[i],
+            'emission': round(float(state.emission[i]), 2),
+            'alert_level': int(level)
+        } for i, level in zip(changed.tolist(), levels.tolist())]
+    }
+    return f"id: {state.tick}\nevent: tick\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode('utf-8')
+
+broadcaster = TickBroadcaster()
+if backend.IS_WORKER:
+    backend.shared_tick_listeners.append(broadcaster.on_tick)
+else:
+    backend.tick_listeners.append(broadcaster.on_tick)
+    # Keep the status snapshot warm so the loop normally finds it already serialized
+    backend.tick_listeners.append(lambda changed: backend.current_status_body())
+
+worker_poller = None
+
+async def poll_shared_state():
+    """Worker: sync with the producer until the last stream subscriber leaves"""
+    while broadcaster.subscribers:
+        try:
+            await asyncio.to_thread(backend.sync_shared_state)
+        except Exception as e:
+            print(f"❌ Shared state sync failed: {e}")
+        await asyncio.sleep(WORKER_POLL_SECONDS)
+
+def ensure_worker_poller():
+    global worker_poller
+    if worker_poller is None or worker_poller.done():
+        worker_poller = asyncio.ensure_future(poll_shared_state())
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def start_wsgi(environ):
+    """Run the Flask app up to its first body chunk, returns (status, headers, first_chunk, iterator)"""
+    response = {}
+    
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    
+    result = backend.app(environ, start_response)
+    iterator = iter(result)
+    first_chunk = next(iterator, b'')
+    return response['status'], response['headers'], first_chunk, (result, iterator)
+
+def next_chunk(iterator):
+    return next(iterator, None)
+
+def close_wsgi(result):
+    if hasattr(result, 'close'):
+        result.close()
+
+async def serve_wsgi(scope, receive, send):
+    """Hand a request to the Flask app on the thread pool, streaming its body back"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    
+    loop = asyncio.get_running_loop()
+    status, headers, chunk, (result, iterator) = await loop.run_in_executor(
+        wsgi_executor, start_wsgi, build_environ(scope, bytes(body)))
+    try:
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        while chunk is not None:
+            following = await loop.run_in_executor(wsgi_executor, next_chunk, iterator)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': following is not None})
+            chunk = following
+    finally:
+        await loop.run_in_executor(wsgi_executor, close_wsgi, result)
+
+async def serve_current_status(scope, receive, send):
+    started = time.perf_counter()
+    if backend.IS_WORKER:
+        # This route skips Flask, so catch up with the producer as its before_request hook would
+        await asyncio.to_thread(backend.prepare_worker_request, 'get_current_status')
+    if backend.status_snapshot['tick'] == backend.station_state.tick:
+        body = backend.status_snapshot['body']
+    else:
+        body = await asyncio.to_thread(backend.current_status_body)
+    body = body.encode('utf-8')
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + CORS_HEADERS
+    })
+    await send({'type': 'http.response.body', 'body': body})
+    backend.REQUEST_SECONDS.observe(time.perf_counter() - started, route='/api/current-status', method='GET', status='200')
+    backend.RESPONSE_BYTES.observe(len(body), route='/api/current-status')
+
+async def serve_stream(scope, receive, send):
+    subscriber = broadcaster.subscribe()
+    if backend.IS_WORKER:
+        ensure_worker_poller()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')] + CORS_HEADERS
+    })
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(subscriber.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                message = next_event.result()
+            else:
+                next_event.cancel()
+                if disconnected.done():
+                    break
+                message = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            broadcaster.attach(asyncio.get_running_loop())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        if broadcaster.loop is None:
+            broadcaster.attach(asyncio.get_running_loop())
+        if scope['path'] == '/api/stream':
+            return await serve_stream(scope, receive, send)
+        if scope['path'] == '/api/current-status':
+            return await serve_current_status(scope, receive, send)
+
+    if scope['type'] == 'http':
+        await serve_wsgi(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting CO2 Monitoring Server (ASGI mode)...")
+    print("  GET  /api/stream                    - Server-Sent Events, one event per tick")
+    uvicorn.run(application, host='0.0.0.0', port=5000, log_level='warning')
@@ -0,0 +1,325 @@
+"""
+Benchmark suite for the backend hot paths.
+
+    python benchmark.py                                   # 497 (dataset), 5k and 50k stations
+    python benchmark.py --stations 497 5000 --save baseline.json
+    python benchmark.py --compare baseline.json           # exit code 1 on regressions
+
+Every station count runs in a fresh process with the background threads
+off, so ticks are driven only by the benchmark. The network is the
+extracted dataset for 497 stations and a synthetic one otherwise. Results
+are JSON with per-call p50/p95/p99 and throughput.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+DATASET_STATIONS = 497
+WARMUP_TICKS = 12  # enough history for the anomaly detector's temporal check
+RWANDA_BOX = (-2.85, 28.85, -1.05, 30.90)  # lat_min, lon_min, lat_max, lon_max
+
+def synthetic_locations(n, seed=42):
+    """n distinct stations spread over Rwanda, classified with the threshold rules"""
+    from region_classifier import classify_by_thresholds
+
+    rng = np.random.default_rng(seed)
+    lat_min, lon_min, lat_max, lon_max = RWANDA_BOX
+    lats = np.round(rng.uniform(lat_min, lat_max, n), 3)
+    lons = np.round(rng.uniform(lon_min, lon_max, n), 3)
+    regions, types = classify_by_thresholds(lats, lons)
+
+    locations = {}
+    for lat, lon, region, location_type in zip(lats.tolist(), lons.tolist(), regions, types):
+        name = f"LOC_{lat}_{lon}"
+        while name in locations:  # rounding collisions
+            lon = round(lon + 0.001, 3)
+            name = f"LOC_{lat}_{lon}"
+        locations[name] = {'lat': lat, 'lon': lon, 'type': location_type, 'region': region, 'source': 'synthetic'}
+    return locations
+
+def measure(fn, items=1, min_time=1.0, min_iterations=3, max_iterations=1000):
+    """Call fn repeatedly, returns latency percentiles (ms) and throughput"""
+    fn()  # warm caches and lazy initialisation
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_iterations and (len(latencies) < min_iterations or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+
+    latencies = np.array(latencies)
+    total = latencies.sum()
+    return {
+        'iterations': len(latencies),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4),
+        'mean_ms': round(float(latencies.mean()) * 1000, 4),
+        'ops_per_s': round(len(latencies) / total, 2) if total > 0 else None,
+        'items_per_s': round(len(latencies) * items / total, 2) if total > 0 else None
+    }
+
+def endpoint_paths(app, station_name):
+    """(route, concrete URL) for every GET route"""
+    paths = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static':
+            continue
+        paths.append((rule.rule, rule.rule.replace('<location_name>', station_name)))
+    return paths
+
+def memory_footprint(backend, ticks, min_time):
+    """
+    Memory per reading of `ticks` ticks kept as the store's list of dicts vs the compressed series.
+
+    Ticks are 3 s apart with up to 50 ms of jitter, like the generator's.
+    The dicts are the records the pipeline stores, kept alive across ticks;
+    their cost is what tracemalloc sees released when they are dropped.
+    The same readings are then fed to a fresh CompressedSeries, measured
+    the same way (blocks, Python objects and the pending buffers).
+    """
+    from series import CompressedSeries
+
+    n = len(backend.station_state)
+    state = backend.station_state
+    rng = np.random.default_rng(7)
+    times = time.time() + np.arange(ticks) * 3.0 + rng.uniform(0, 0.05, ticks)
+    columns = []
+    kept = []
+    tracemalloc.start()
+    for t in times.tolist():
+        backend.process_ingest_batch(backend.simulate_station_batch(t))
+        kept.extend(backend.real_time_data[-n:])
+        columns.append({name: getattr(state, name).copy() for name in ('timestamp', 'emission', 'so2', 'no2', 'co')})
+    held = tracemalloc.get_traced_memory()[0]
+    del kept
+    dict_bytes = held - tracemalloc.get_traced_memory()[0]
+
+    indices = np.arange(n)
+    before = tracemalloc.get_traced_memory()[0]
+    series = CompressedSeries(n, max_bytes=2 ** 40)
+    append_seconds = []
+    for tick in columns:
+        started = time.perf_counter()
+        series.append(indices, tick)
+        append_seconds.append(time.perf_counter() - started)
+    series_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    readings = n * ticks
+    summary = series.summary()
+    readings_per_day = n * 86400 / 3
+    return {
+        'readings': readings,
+        'list_of_dicts_bytes_per_reading': round(dict_bytes / readings, 1),
+        'columnar_float64_bytes_per_reading': 8 * len(columns[0]),
+        'compressed_bytes_per_reading': round(series_bytes / readings, 1),
+        'encoded_block_bytes_per_reading': summary['bytes_per_reading'],
+        'pending_buffer_bytes': summary['pending_bytes'],
+        'reduction_vs_dicts': round(dict_bytes / series_bytes, 1),
+        # Retention in 1 GB at one reading per station every 3 s; pending buffers are a fixed cost, left out
+        'days_per_gb_dicts': round(2 ** 30 / (dict_bytes / readings) / readings_per_day, 2),
+        'days_per_gb_compressed': round(2 ** 30 / summary['bytes_per_reading'] / readings_per_day, 2),
+        'append_p99_ms': round(float(np.percentile(append_seconds, 99)) * 1000, 3),
+        'scan_station_all': measure(lambda: series.scan(0), items=ticks, min_time=min_time),
+        'scan_station_last_10min': measure(lambda: series.scan(0, start=times[-1] - 600), min_time=min_time)
+    }
+
+def run_size(n_stations, min_time, model_path, memory_ticks=0):
+    """Benchmarks for one network size; runs in its own process"""
+    if n_stations != DATASET_STATIONS:
+        handle, locations_file = tempfile.mkstemp(suffix='.json', prefix='bench_locations_')
+        with os.fdopen(handle, 'w') as f:
+            json.dump(synthetic_locations(n_stations), f)
+        os.environ['CO2_LOCATIONS_FILE'] = locations_file
+    os.environ['CO2_BACKGROUND_THREADS'] = '0'
+
+    import app as backend
+
+    n = len(backend.station_state)
+    results = {}
+    for _ in range(WARMUP_TICKS):
+        backend.process_ingest_batch(backend.simulate_station_batch())
+
+    monitor = backend.monitor
+    state = backend.station_state
+    types = state.types
+    multipliers = np.ones(n)
+    so2, no2, co = backend.simulate_sensor_batch(types, multipliers, state.lat, state.lon)
+    lat0, lon0 = float(state.lat[0]), float(state.lon[0])
+
+    results['simulate_sensor_data'] = measure(
+        lambda: backend.simulate_sensor_data(types[0], 1.0, lat0, lon0), min_time=min_time)
+    results['simulate_sensor_batch'] = measure(
+        lambda: backend.simulate_sensor_batch(types, multipliers, state.lat, state.lon), items=n, min_time=min_time)
+
+    def predict_benchmarks(label):
+        results[f'predict_emission[{label}]'] = measure(
+            lambda: monitor.predict_emission(lat0, lon0, float(so2[0]), float(no2[0]), float(co[0])), min_time=min_time)
+        results[f'predict_batch[{label}]'] = measure(
+            lambda: monitor.predict_batch(state.lat, state.lon, so2, no2, co, location_types=types),
+            items=n, min_time=min_time)
+
+    predict_benchmarks('mock' if monitor.model is None else 'model')
+    if monitor.model is None:
+        if model_path and os.path.exists(model_path):
+            import joblib
+            package = joblib.load(model_path)
+            monitor.model = package['model']
+            monitor.feature_names = package['feature_names']
+            monitor.feature_defaults = package['feature_defaults']
+            predict_benchmarks('model')
+            monitor.model = None
+        else:
+            results['predict_emission[model]'] = {'skipped': f"model file not found: {model_path}"}
+
+    results['tick'] = measure(
+        lambda: backend.process_ingest_batch(backend.simulate_station_batch()), items=n, min_time=min_time)
+
+    # Generator ticks under the adaptive sampling schedule, on a simulated 3 s clock; items are stations covered
+    clock = [time.time()]
+
+    def adaptive_tick():
+        clock[0] += backend.GENERATOR_SECONDS
+        due = backend.sampling_schedule.due(clock[0])
+        backend.process_ingest_batch(backend.simulate_station_batch(clock[0], stations=due))
+
+    results['tick[adaptive]'] = measure(adaptive_tick, items=n, min_time=min_time)
+    results['tick[adaptive]']['load_ratio'] = backend.sampling_schedule.summary()['load_ratio']
+
+    client = backend.app.test_client()
+    for route, path in endpoint_paths(backend.app, state.names[0]):
+        sizes = []
+
+        def get():
+            response = client.get(path)
+            sizes.append(len(response.get_data()))
+
+        result = measure(get, min_time=min_time, max_iterations=200)
+        result['payload_bytes'] = sizes[-1]
+        results[f'GET {route}'] = result
+
+    if memory_ticks:
+        results['memory'] = memory_footprint(backend, memory_ticks, min_time)
+
+    if n_stations != DATASET_STATIONS:
+        os.remove(locations_file)
+    return {f"{name}@{n}": result for name, result in results.items()}
+
+def collect_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Flag benchmarks that got slower than the baseline.
+    
+    A regression is a p50 slowdown beyond `threshold` (or a p99 slowdown
+    beyond three times that, tails being noisier) that is also larger than
+    min_delta_ms in absolute terms, so sub-millisecond jitter is ignored.
+    """
+    comparison = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or 'p50_ms' not in current or 'p50_ms' not in previous:
+            continue
+        regressed = []
+        ratios = {}
+        for metric, tolerance in (('p50_ms', threshold), ('p99_ms', 3 * threshold)):
+            ratio = current[metric] / previous[metric] if previous[metric] else None
+            ratios[metric] = round(ratio, 3) if ratio else None
+            if ratio and ratio > 1 + tolerance and current[metric] - previous[metric] > min_delta_ms:
+                regressed.append(metric)
+        comparison[name] = {
+            'baseline_p50_ms': previous['p50_ms'],
+            'p50_ms': current['p50_ms'],
+            'baseline_p99_ms': previous['p99_ms'],
+            'p99_ms': current['p99_ms'],
+            'p50_ratio': ratios['p50_ms'],
+            'p99_ratio': ratios['p99_ms'],
+            'regression': regressed
+        }
+    return comparison
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CO2 monitoring backend")
+    parser.add_argument('--stations', type=int, nargs='+', default=[DATASET_STATIONS, 5000, 50000])
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds spent per benchmark")
+    parser.add_argument('--model', default='emission_model_complete.pkl', help="model package for the real-model runs")
+    parser.add_argument('--save', help="write results to this file (e.g. to use as a baseline)")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.15, help="allowed p50 slowdown before flagging")
+    parser.add_argument('--min-delta-ms', type=float, default=0.25, help="ignore slowdowns smaller than this")
+    parser.add_argument('--memory-ticks', type=int, default=512,
+                        help="ticks for the memory-footprint comparison at the dataset size (0 skips it)")
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size:
+        # Child process: keep the app's own logging out of the way
+        sys.stdout = open(os.devnull, 'w')
+        results = run_size(args.run_size, args.min_time, args.model, args.memory_ticks)
+        with open(args.output_file, 'w') as f:
+            json.dump(results, f)
+        return
+
+    report = {'meta': collect_metadata(), 'results': {}}
+    for n_stations in args.stations:
+        print(f"⏱️  Benchmarking {n_stations} stations...", file=sys.stderr)
+        handle, output_file = tempfile.mkstemp(suffix='.json', prefix='bench_results_')
+        os.close(handle)
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-size', str(n_stations),
+                                    '--min-time', str(args.min_time), '--model', args.model,
+                                    '--memory-ticks', str(args.memory_ticks if n_stations == DATASET_STATIONS else 0),
+                                    '--output-file', output_file], cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            print(f"❌ Benchmark run for {n_stations} stations failed", file=sys.stderr)
+            continue
+        with open(output_file) as f:
+            report['results'].update(json.load(f))
+        os.remove(output_file)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report['baseline'] = baseline.get('meta')
+        report['comparison'] = compare(report['results'], baseline.get('results', {}), args.threshold, args.min_delta_ms)
+        regressions = [name for name, c in report['comparison'].items() if c['regression']]
+        report['regressions'] = regressions
+        for name in regressions:
+            c = report['comparison'][name]
+            print(f"⚠️  Regression: {name} p50 {c['baseline_p50_ms']} -> {c['p50_ms']} ms, "
+                  f"p99 {c['baseline_p99_ms']} -> {c['p99_ms']} ms", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.save:
+        with open(args.save, 'w') as f:
+            f.write(output)
+    print(output)
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import json
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b'CO2CKPT1'
+ALIGN = 64
+
+def _padded(size):
+    return -(-size // ALIGN) * ALIGN
+
+def write_checkpoint(path, arrays, meta):
+    """
+    Write named arrays and a JSON-able meta dict to path, returns the file size.
+
+    Layout: magic, header length (uint64), JSON header with every array's
+    dtype, shape and offset, then the raw arrays, each 64-byte aligned. The
+    file is written under a temporary name, fsynced and renamed over path,
+    so a crash mid-write leaves the previous checkpoint intact.
+    """
+    described = {}
+    offset = 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise ValueError(f"checkpoint array {name!r} has an object dtype")
+        dtype = array.dtype.descr if array.dtype.names else array.dtype.str
+        described[name] = {'dtype': dtype, 'shape': list(array.shape), 'offset': offset}
+        offset += _padded(array.nbytes)
+    header = json.dumps({'meta': meta, 'arrays': described}).encode('utf-8')
+    data_start = _padded(len(MAGIC) + 8 + len(header))
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).data)
+            f.write(b'\0' * (_padded(array.nbytes) - array.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return data_start + offset
+
+def _dtype(spec):
+    # Structured dtypes are stored as their descr, a list of [name, type] pairs
+    return np.dtype([tuple(field) for field in spec] if isinstance(spec, list) else spec)
+
+def read_checkpoint(path):
+    """(meta, {name: array}) with the arrays as read-only views of the memory-mapped file"""
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(mapped[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a checkpoint file")
+    (header_length,) = struct.unpack('<Q', bytes(mapped[len(MAGIC):len(MAGIC) + 8]))
+    header = json.loads(bytes(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_length]))
+    data_start = _padded(len(MAGIC) + 8 + header_length)
+    arrays = {
+        name: np.ndarray(tuple(spec['shape']), dtype=_dtype(spec['dtype']), buffer=mapped,
+                         offset=data_start + spec['offset'])
+        for name, spec in header['arrays'].items()
+    }
+    return header['meta'], arrays
+
+class Checkpointer:
+    """
+    Periodic snapshots of the in-memory state to one checkpoint file.
+
+    collect() returns (arrays, meta) as of now and is called with `lock`
+    held, the lock the tick pipeline holds while it publishes, so a
+    snapshot never contains half a tick. It should copy what it returns;
+    the file is written after the lock is released. restore(apply) maps the
+    file and hands (meta, arrays) to apply, which copies them into place.
+    """
+
+    def __init__(self, path, collect, lock, interval=30.0):
+        self.path = path
+        self.collect = collect
+        self.lock = lock
+        self.interval = interval
+        self.stats = {'saves': 0, 'failures': 0, 'last_saved': None, 'last_save_seconds': None,
+                      'bytes': None, 'restored_tick': None, 'restore_seconds': None}
+
+    def save(self):
+        started = time.perf_counter()
+        with self.lock:
+            arrays, meta = self.collect()
+        meta = dict(meta, saved_at=datetime.now().isoformat())
+        size = write_checkpoint(self.path, arrays, meta)
+        self.stats.update(saves=self.stats['saves'] + 1, last_saved=meta['saved_at'],
+                          last_save_seconds=round(time.perf_counter() - started, 4), bytes=size)
+        return size
+
+    def restore(self, apply):
+        """Apply the checkpoint file if there is one; returns its meta, or None when nothing was restored"""
+        if not os.path.exists(self.path):
+            return None
+        started = time.perf_counter()
+        try:
+            meta, arrays = read_checkpoint(self.path)
+            with self.lock:
+                apply(meta, arrays)
+        except (ValueError, KeyError, OSError) as e:
+            print(f"⚠️ Ignoring checkpoint {self.path}: {e}")
+            return None
+        self.stats.update(restored_tick=meta.get('tick'), restore_seconds=round(time.perf_counter() - started, 4))
+        return meta
+
+    def run(self):
+        """Background loop: save every `interval` seconds"""
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.save()
+            except Exception as e:
+                self.stats['failures'] += 1
+                print(f"❌ Checkpoint failed: {e}")
@@ -0,0 +1,164 @@
+import numpy as np
+import threading
+
+CLUSTER_RADIUS_PX = 40
+TILE_SIZE_PX = 256
+
+class ClusterIndex:
+    """
+    Hierarchical grid clustering of stations for zoom-aware map endpoints.
+    
+    At zoom z stations are grouped into square cells of roughly
+    CLUSTER_RADIUS_PX screen pixels. Cell sizes halve per zoom level from a
+    fixed origin, so every cell nests inside its parent and the hierarchy is
+    fully precomputed. Per-cluster emission sums, counts and maxima, and the
+    worst member status, are kept up to date per tick from the stations
+    that changed. status_levels(indices, emissions) gives each station's
+    status (1..3) with its own thresholds.
+    """
+    
+    def __init__(self, station_state, status_levels, min_zoom=0, max_zoom=16):
+        self.state = station_state
+        self.status_levels = status_levels
+        self.min_zoom = min_zoom
+        self.zooms = list(range(min_zoom, max_zoom + 1))
+        self.levels = {}
+        
+        for zoom in self.zooms:
+            cell = self.cell_size(zoom)
+            cx = np.floor((station_state.lon + 180.0) / cell).astype(np.int64)
+            cy = np.floor((station_state.lat + 90.0) / cell).astype(np.int64)
+            keys, labels, counts = np.unique(np.stack([cx, cy], axis=1), axis=0, return_inverse=True, return_counts=True)
+            labels = labels.ravel()
+            
+            # Members of each cluster as a CSR slice of `order`
+            order = np.argsort(labels, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            
+            self.levels[zoom] = {
+                'keys': keys,
+                'labels': labels,
+                'counts': counts,
+                'order': order,
+                'offsets': offsets,
+                'lat': np.bincount(labels, weights=station_state.lat) / counts,
+                'lon': np.bincount(labels, weights=station_state.lon) / counts,
+                'emission_sum': np.zeros(len(keys)),
+                'with_data': np.zeros(len(keys), dtype=np.int64),
+                'emission_max': np.zeros(len(keys)),
+                'status_max': np.ones(len(keys), dtype=np.int64)
+            }
+        
+        # Zoom at which every station is its own cluster: beyond it, serve raw stations
+        self.max_zoom = next((z for z in self.zooms if len(self.levels[z]['keys']) == len(station_state)), max_zoom)
+        
+        for zoom in self.zooms:
+            level = self.levels[zoom]
+            level['expansion_zoom'] = self._expansion_zoom(zoom)
+        
+        self.emission = np.zeros(len(station_state))
+        self.has_data = np.zeros(len(station_state), dtype=bool)
+        self.status = np.zeros(len(station_state), dtype=np.int64)  # 0 until a station reports
+        self.tick = -1
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def cell_size(zoom):
+        """Cell edge in degrees covering CLUSTER_RADIUS_PX at the given zoom"""
+        return 360.0 * CLUSTER_RADIUS_PX / (TILE_SIZE_PX * 2 ** zoom)
+    
+    def _expansion_zoom(self, zoom):
+        """For each cluster at `zoom`, the first deeper zoom at which it splits"""
+        level = self.levels[zoom]
+        expansion = np.full(len(level['keys']), self.zooms[-1], dtype=np.int64)
+        unresolved = level['counts'] > 1
+        first_station = level['order'][level['offsets'][:-1]]
+        
+        for deeper in self.zooms[self.zooms.index(zoom) + 1:]:
+            if not unresolved.any():
+                break
+            child_counts = self.levels[deeper]['counts'][self.levels[deeper]['labels'][first_station]]
+            splits = unresolved & (child_counts < level['counts'])
+            expansion[splits] = deeper
+            unresolved &= ~splits
+        return expansion
+    
+    def refresh(self):
+        """Fold station changes since the last refresh into every zoom level"""
+        with self.lock:
+            changed = self.state.changed_since(self.tick)
+            self.tick = self.state.tick
+            if len(changed) == 0:
+                return 0
+            
+            new_emission = self.state.emission[changed]
+            new_has_data = self.state.has_data[changed]
+            delta = np.where(new_has_data, new_emission, 0.0) - np.where(self.has_data[changed], self.emission[changed], 0.0)
+            delta_count = new_has_data.astype(np.int64) - self.has_data[changed].astype(np.int64)
+            self.emission[changed] = new_emission
+            self.has_data[changed] = new_has_data
+            self.status[changed] = np.where(new_has_data, self.status_levels(changed, new_emission), 0)
+            masked = np.where(self.has_data, self.emission, -np.inf)
+            
+            for zoom in self.zooms:
+                level = self.levels[zoom]
+                labels = level['labels'][changed]
+                np.add.at(level['emission_sum'], labels, delta)
+                np.add.at(level['with_data'], labels, delta_count)
+                
+                # Maxima only need recomputing for clusters that had a member change
+                affected = np.unique(labels)
+                starts = level['offsets'][affected]
+                ends = level['offsets'][affected + 1]
+                members = np.concatenate([level['order'][s:e] for s, e in zip(starts, ends)])
+                segments = np.concatenate([[0], np.cumsum(ends - starts)[:-1]])
+                maxima = np.maximum.reduceat(masked[members], segments)
+                level['emission_max'][affected] = np.where(np.isfinite(maxima), maxima, 0.0)
+                level['status_max'][affected] = np.maximum(np.maximum.reduceat(self.status[members], segments), 1)
+            return len(changed)
+    
+    def query(self, zoom, bbox=None):
+        """
+        Clusters and stations visible at a zoom level inside bbox (lon_min, lat_min, lon_max, lat_max).
+        
+        Returns (clusters, station_indices): clusters is a list of aggregate
+        dicts, station_indices the stations to render individually (raw
+        stations past max_zoom, and single-station clusters below it).
+        """
+        zoom = int(min(max(zoom, self.zooms[0]), self.zooms[-1]))
+        if zoom >= self.max_zoom:
+            return [], self.stations_in_bbox(bbox)
+        
+        level = self.levels[zoom]
+        visible = np.ones(len(level['keys']), dtype=bool)
+        if bbox is not None:
+            lon_min, lat_min, lon_max, lat_max = bbox
+            visible = ((level['lon'] >= lon_min) & (level['lon'] <= lon_max) &
+                       (level['lat'] >= lat_min) & (level['lat'] <= lat_max))
+        
+        with self.lock:
+            single = visible & (level['counts'] == 1)
+            station_indices = level['order'][level['offsets'][:-1][single]]
+            
+            clusters = []
+            for c in np.flatnonzero(visible & (level['counts'] > 1)):
+                with_data = int(level['with_data'][c])
+                clusters.append({
+                    'cluster_id': f"{zoom}:{level['keys'][c][0]}:{level['keys'][c][1]}",
+                    'lat': float(level['lat'][c]),
+                    'lon': float(level['lon'][c]),
+                    'point_count': int(level['counts'][c]),
+                    'reporting_count': with_data,
+                    'mean_emission': float(level['emission_sum'][c] / with_data) if with_data else 0.0,
+                    'max_emission': float(level['emission_max'][c]),
+                    'max_status_level': int(level['status_max'][c]),
+                    'expansion_zoom': int(level['expansion_zoom'][c])
+                })
+        return clusters, station_indices
+    
+    def stations_in_bbox(self, bbox):
+        if bbox is None:
+            return np.arange(len(self.state))
+        lon_min, lat_min, lon_max, lat_max = bbox
+        return np.flatnonzero((self.state.lon >= lon_min) & (self.state.lon <= lon_max) &
+                              (self.state.lat >= lat_min) & (self.state.lat <= lat_max))
@@ -0,0 +1,99 @@
+import threading
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Share one computation among concurrent identical requests, memoized per generation.
+
+    run(key, generation, compute) returns the memoized result when `key`
+    was already computed for this generation (the station tick). If another
+    thread is computing it right now, it waits for that result instead of
+    computing it again. Otherwise it computes it and memoizes it. A
+    computation that raises is not memoized; its waiters get the same
+    exception. Storing a result of a newer generation drops every entry of
+    older ones, and results from an older generation than the newest are
+    not memoized. At most `max_entries` results totalling `max_bytes`
+    (measured by `size(result)`) are kept, oldest evicted first.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, size=lambda result: 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = size
+        self.memo = {}  # key -> (generation, result, size)
+        self.memo_bytes = 0
+        self.generation = None  # newest generation memoized
+        self.flights = {}  # (key, generation) -> _Flight
+        self.lock = threading.Lock()
+        self.stats = {}  # route -> {'computed', 'memoized', 'shared'}
+
+    def _count(self, key, outcome):
+        counts = self.stats.setdefault(key[0], {'computed': 0, 'memoized': 0, 'shared': 0})
+        counts[outcome] += 1
+
+    def run(self, key, generation, compute):
+        with self.lock:
+            memoized = self.memo.get(key)
+            if memoized is not None and memoized[0] == generation:
+                self._count(key, 'memoized')
+                return memoized[1]
+            flight = self.flights.get((key, generation))
+            leader = flight is None
+            if leader:
+                flight = self.flights[(key, generation)] = _Flight()
+            self._count(key, 'computed' if leader else 'shared')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[(key, generation)]
+                if flight.error is None:
+                    self._store(key, generation, flight.result)
+            flight.done.set()
+        return flight.result
+
+    def _drop(self, key):
+        self.memo_bytes -= self.memo.pop(key)[2]
+
+    def _store(self, key, generation, result):
+        if self.generation is not None and generation < self.generation:
+            return
+        if generation != self.generation:
+            self.memo.clear()
+            self.memo_bytes = 0
+            self.generation = generation
+        if key in self.memo:
+            self._drop(key)
+        size = self.size(result)
+        if size > self.max_bytes:
+            return
+        while self.memo and (len(self.memo) >= self.max_entries or self.memo_bytes + size > self.max_bytes):
+            self._drop(next(iter(self.memo)))
+        self.memo[key] = (generation, result, size)
+        self.memo_bytes += size
+
+    def counts(self):
+        """{(route, outcome): requests}"""
+        with self.lock:
+            return {(route, outcome): n for route, counts in self.stats.items() for outcome, n in counts.items()}
+
+    def ratios(self):
+        """Requests served per computation, by route"""
+        with self.lock:
+            return {route: round((c['computed'] + c['memoized'] + c['shared']) / c['computed'], 2) if c['computed'] else None
+                    for route, c in self.stats.items()}
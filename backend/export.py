@@ -0,0 +1,163 @@
+"""
+Streaming export of stored readings as CSV, NDJSON or Parquet.
+
+Readings are addressed by their ordinal in the append-only store (parts in
+manifest order, then rows not yet flushed). A request scans at most
+`page_rows` stored readings from its cursor, filters them in bounded
+chunks and streams each chunk as soon as it is formatted, so memory stays
+at one chunk whatever the export size. The cursor for the next page is
+known before the first byte is sent and goes in the X-Next-Cursor header.
+"""
+import io
+import json
+from datetime import datetime
+
+import numpy as np
+
+CHUNK_ROWS = 50_000
+DEFAULT_PAGE_ROWS = 5_000_000
+COLUMNS = ('location_name', 'timestamp', 'emission', 'co2_equivalent', 'so2', 'no2', 'co', 'anomaly_level')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+class Segment:
+    """A run of stored readings: `count` rows starting at ordinal `base`, loaded on demand"""
+
+    def __init__(self, base, count, start, end, load):
+        self.base = base
+        self.count = count
+        self.start = start
+        self.end = end
+        self.load = load
+
+def store_segments(parts, pending, part_path, base=0):
+    """Segments for a HistoryStore snapshot: one per part, then the unflushed rows"""
+    segments = []
+    for part in parts:
+        segments.append(Segment(base, part['rows'], part['start'], part['end'],
+                                lambda path=part_path(part): np.load(path, mmap_mode='r')))
+        base += part['rows']
+    if len(pending):
+        segments.append(Segment(base, len(pending), float(pending['timestamp'].min()),
+                                float(pending['timestamp'].max()), lambda: pending))
+    return segments
+
+def plan(segments, start=None, end=None, cursor=0, page_rows=DEFAULT_PAGE_ROWS):
+    """
+    Pick the row ranges one page scans, returns ([(segment, first, stop)], next_cursor).
+
+    Segments entirely outside [start, end) are skipped without using the
+    page budget. next_cursor is None once the page reaches the end of the store.
+    """
+    position = cursor
+    budget = page_rows
+    ranges = []
+    for segment in segments:
+        stop = segment.base + segment.count
+        if stop <= position:
+            continue
+        first = max(position, segment.base)
+        if (start is not None and segment.end < start) or (end is not None and segment.start >= end):
+            position = stop
+            continue
+        take = min(stop - first, budget)
+        ranges.append((segment, first - segment.base, first - segment.base + take))
+        position = first + take
+        budget -= take
+        if budget == 0:
+            break
+    total = segments[-1].base + segments[-1].count if segments else 0
+    return ranges, (position if position < total else None)
+
+def iter_chunks(ranges, start=None, end=None, stations=None):
+    """Filtered readings of the planned ranges, at most CHUNK_ROWS scanned at a time"""
+    for segment, first, stop in ranges:
+        rows = segment.load()
+        for lo in range(first, stop, CHUNK_ROWS):
+            chunk = rows[lo:min(lo + CHUNK_ROWS, stop)]
+            mask = np.ones(len(chunk), dtype=bool)
+            if start is not None:
+                mask &= chunk['timestamp'] >= start
+            if end is not None:
+                mask &= chunk['timestamp'] < end
+            if stations is not None:
+                mask &= np.isin(chunk['station'], stations)
+            if mask.any():
+                yield np.asarray(chunk[mask])
+
+def _iso_times(timestamps):
+    """ISO strings for epoch seconds, formatted once per distinct timestamp (a tick shares one)"""
+    unique_ts, inverse = np.unique(timestamps, return_inverse=True)
+    return np.array([datetime.fromtimestamp(ts).isoformat() for ts in unique_ts.tolist()], dtype=object)[inverse]
+
+def csv_body(chunks, station_names):
+    yield (','.join(COLUMNS) + '\n').encode('utf-8')
+    quoted = [f'"{name}"' if ',' in name or '"' in name else name for name in station_names]
+    for rows in chunks:
+        times = _iso_times(rows['timestamp'])
+        lines = [f"{quoted[s]},{t},{e!r},{c!r},{so2!r},{no2!r},{co!r},{a}\n" for s, t, e, c, so2, no2, co, a in zip(
+            rows['station'].tolist(), times, rows['emission'].tolist(), rows['co2_equivalent'].tolist(),
+            rows['so2'].tolist(), rows['no2'].tolist(), rows['co'].tolist(), rows['anomaly_level'].tolist())]
+        yield ''.join(lines).encode('utf-8')
+
+def ndjson_body(chunks, station_names):
+    names = [json.dumps(name) for name in station_names]
+    for rows in chunks:
+        times = _iso_times(rows['timestamp'])
+        lines = [f'{{"location_name":{names[s]},"timestamp":"{t}","emission":{e!r},"co2_equivalent":{c!r},'
+                 f'"so2":{so2!r},"no2":{no2!r},"co":{co!r},"anomaly_level":{a}}}\n' for s, t, e, c, so2, no2, co, a in zip(
+                     rows['station'].tolist(), times, rows['emission'].tolist(), rows['co2_equivalent'].tolist(),
+                     rows['so2'].tolist(), rows['no2'].tolist(), rows['co'].tolist(), rows['anomaly_level'].tolist())]
+        yield ''.join(lines).encode('utf-8')
+
+class _Drain(io.RawIOBase):
+    """Write-only file whose bytes are taken out after every row group"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def parquet_body(chunks, station_names):
+    """One row group per chunk, streamed as written; location_name is dictionary-encoded"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    dictionary = pa.array(station_names, type=pa.string())
+    schema = pa.schema([
+        ('location_name', pa.dictionary(pa.int32(), pa.string())),
+        ('timestamp', pa.timestamp('ms', tz='UTC')),
+        ('emission', pa.float64()),
+        ('co2_equivalent', pa.float64()),
+        ('so2', pa.float64()),
+        ('no2', pa.float64()),
+        ('co', pa.float64()),
+        ('anomaly_level', pa.uint8())
+    ])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        table = pa.Table.from_arrays([
+            pa.DictionaryArray.from_arrays(pa.array(rows['station'], type=pa.int32()), dictionary),
+            pa.array((rows['timestamp'] * 1000).astype('int64'), type=pa.timestamp('ms', tz='UTC')),
+            *(pa.array(rows[name]) for name in ('emission', 'co2_equivalent', 'so2', 'no2', 'co', 'anomaly_level'))
+        ], schema=schema)
+        writer.write_table(table)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+FORMATTERS = {'csv': csv_body, 'ndjson': ndjson_body, 'parquet': parquet_body}
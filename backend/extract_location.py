@@ -1,9 +1,17 @@
 import pandas as pd
 import numpy as np
+import hashlib
 import os
+import sys
 import json
+from region_classifier import RegionClassifier
 
-def extract_locations_from_dataset(data_path=r'C:\Users\ADMIN\Desktop\co2em\co2-emissions-dashboard\backend\playground-series-s3e20'):
+DEFAULT_DATA_PATH = r'C:\Users\ADMIN\Desktop\co2em\co2-emissions-dashboard\backend\playground-series-s3e20'
+INPUT_FILES = (('train.csv', 'train'), ('test.csv', 'test'))
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+
+def extract_locations_from_dataset(data_path=DEFAULT_DATA_PATH):
     """
     Extract unique locations from train.csv and test.csv
     Returns a dictionary of locations suitable for the Flask app
@@ -12,74 +20,18 @@ def extract_locations_from_dataset(data_path=r'C:\Users\ADMIN\Desktop\co2em\co2-
     locations = {}
     
     try:
-        # Load train data
-        train_path = os.path.join(data_path, 'train.csv')
-        test_path = os.path.join(data_path, 'test.csv')
-        
         print("Loading dataset files...")
         
-        if os.path.exists(train_path):
-            print("Loading train.csv...")
-            train = pd.read_csv(train_path)
-            train_coords = train.drop_duplicates(subset=['latitude', 'longitude'])[['latitude', 'longitude']]
-            print(f"Found {len(train_coords)} unique locations in train.csv")
-            
-            for idx, row in train_coords.iterrows():
-                lat, lon = round(row['latitude'], 3), round(row['longitude'], 3)
-                location_key = f"LOC_{lat}_{lon}"
-                
-                locations[location_key] = {
-                    'lat': lat,
-                    'lon': lon,
-                    'type': determine_location_type(lat, lon),
-                    'region': get_region_name(lat, lon),
-                    'source': 'train'
-                }
-        
-        if os.path.exists(test_path):
-            print("Loading test.csv...")
-            test = pd.read_csv(test_path)
-            test_coords = test.drop_duplicates(subset=['latitude', 'longitude'])[['latitude', 'longitude']]
-            print(f"Found {len(test_coords)} unique locations in test.csv")
-            
-            for idx, row in test_coords.iterrows():
-                lat, lon = round(row['latitude'], 3), round(row['longitude'], 3)
-                location_key = f"LOC_{lat}_{lon}"
-                
-                if location_key not in locations:
-                    locations[location_key] = {
-                        'lat': lat,
-                        'lon': lon,
-                        'type': determine_location_type(lat, lon),
-                        'region': get_region_name(lat, lon),
-                        'source': 'test'
-                    }
-                else:
-                    # Mark as present in both datasets
-                    locations[location_key]['source'] = 'both'
+        for file_name, source in INPUT_FILES:
+            file_path = os.path.join(data_path, file_name)
+            if os.path.exists(file_path):
+                print(f"Loading {file_name}...")
+                coords, _ = _read_unique_coords(file_path)
+                print(f"Found {len(coords)} unique locations in {file_name}")
+                _merge_coords(locations, coords, source)
         
         print(f"\nTotal unique locations extracted: {len(locations)}")
-        
-        # Print statistics
-        location_types = {}
-        regions = {}
-        sources = {}
-        
-        for loc_data in locations.values():
-            location_types[loc_data['type']] = location_types.get(loc_data['type'], 0) + 1
-            regions[loc_data['region']] = regions.get(loc_data['region'], 0) + 1
-            sources[loc_data['source']] = sources.get(loc_data['source'], 0) + 1
-        
-        print(f"\nLocation Types: {location_types}")
-        print(f"Regions: {regions}")
-        print(f"Data Sources: {sources}")
-        
-        # Sample coordinates bounds
-        lats = [loc['lat'] for loc in locations.values()]
-        lons = [loc['lon'] for loc in locations.values()]
-        print(f"\nCoordinate Bounds:")
-        print(f"Latitude: {min(lats):.3f} to {max(lats):.3f}")
-        print(f"Longitude: {min(lons):.3f} to {max(lons):.3f}")
+        print_location_summary(locations)
         
     except Exception as e:
         print(f"Error loading dataset: {e}")
@@ -87,8 +39,225 @@ def extract_locations_from_dataset(data_path=r'C:\Users\ADMIN\Desktop\co2em\co2-
     
     return locations
 
+def update_locations_from_dataset(data_path=DEFAULT_DATA_PATH, output_file='extracted_locations.json', force=False):
+    """
+    Incrementally refresh the extracted locations.
+    
+    Each input CSV is fingerprinted (size, mtime and SHA-256) in a cache file
+    next to the output. Unchanged inputs are skipped entirely; inputs that only
+    had rows appended are read from the previous end of file onwards. Anything
+    else (edited rows, new data path, missing output) triggers a full rescan.
+    Returns (locations, changed).
+    """
+    cache_file = _cache_path(output_file)
+    cache = {} if force else _load_cache(cache_file)
+    
+    if (cache.get('version') != CACHE_VERSION or cache.get('data_path') != os.path.abspath(data_path)
+            or not os.path.exists(output_file)):
+        cache = {}
+    
+    locations = {}
+    if cache:
+        with open(output_file, 'r') as f:
+            locations = json.load(f)
+    
+    inputs = {}
+    changed = not cache
+    
+    try:
+        for file_name, source in INPUT_FILES:
+            file_path = os.path.join(data_path, file_name)
+            if not os.path.exists(file_path):
+                continue
+            
+            previous = cache.get('inputs', {}).get(file_name)
+            stat = os.stat(file_path)
+            
+            if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+                print(f"{file_name}: unchanged (size/mtime), skipping")
+                inputs[file_name] = previous
+                continue
+            
+            previous_size = previous['size'] if previous and previous['size'] <= stat.st_size else None
+            digest, prefix_digest, ends_with_newline = _hash_file(file_path, previous_size)
+            fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+            
+            if previous and previous['sha256'] == digest:
+                # Touched but identical content
+                print(f"{file_name}: content unchanged, skipping")
+                inputs[file_name] = {**previous, **fingerprint}
+                continue
+            
+            if previous and prefix_digest == previous['sha256'] and ends_with_newline:
+                print(f"{file_name}: {stat.st_size - previous['size']} bytes appended, reading new rows only")
+                coords, columns = _read_unique_coords(file_path, offset=previous['size'], columns=previous['columns'])
+            elif previous:
+                # An existing input was rewritten: the cached merge is no longer trustworthy
+                print(f"{file_name}: content changed, running full extraction")
+                return update_locations_from_dataset(data_path, output_file, force=True)
+            else:
+                print(f"Loading {file_name}...")
+                coords, columns = _read_unique_coords(file_path)
+            
+            print(f"Found {len(coords)} unique locations in new {file_name} data")
+            added = _merge_coords(locations, coords, source)
+            changed = changed or added > 0
+            inputs[file_name] = {**fingerprint, 'columns': columns}
+        
+    except Exception as e:
+        print(f"Error loading dataset: {e}")
+        return get_fallback_locations(), False
+    
+    if not locations:
+        return get_fallback_locations(), False
+    
+    if changed:
+        print(f"\nTotal unique locations extracted: {len(locations)}")
+        print_location_summary(locations)
+    
+    npz_file = os.path.splitext(output_file)[0] + '.npz'
+    if changed or not os.path.exists(npz_file):
+        # Save to JSON file for reference, plus the binary table the app loads first
+        save_locations_to_json(locations, output_file)
+        save_locations_to_npz(locations, npz_file)
+    
+    # Only record the fingerprints once the outputs they describe are on disk
+    _save_cache(cache_file, {
+        'version': CACHE_VERSION,
+        'data_path': os.path.abspath(data_path),
+        'inputs': inputs
+    })
+    
+    return locations, changed
+
+def _read_unique_coords(file_path, offset=0, columns=None):
+    """Read unique (lat, lon) pairs from a CSV, optionally starting at a byte offset"""
+    if offset:
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            df = pd.read_csv(f, header=None, names=columns, usecols=['latitude', 'longitude'])
+    else:
+        columns = list(pd.read_csv(file_path, nrows=0).columns)
+        df = pd.read_csv(file_path, usecols=['latitude', 'longitude'])
+    
+    raw = df[['latitude', 'longitude']].to_numpy(dtype=np.float64)
+    if len(raw) == 0:
+        return [], columns
+    
+    # Unique pairs in order of first appearance
+    _, first_index = np.unique(raw, axis=0, return_index=True)
+    unique = raw[np.sort(first_index)]
+    return [(round(float(lat), 3), round(float(lon), 3)) for lat, lon in unique], columns
+
+def _merge_coords(locations, coords, source):
+    """Merge coordinates from one input into the location table, returns number of changes"""
+    changes = 0
+    new_coords = []
+    for lat, lon in coords:
+        location_key = f"LOC_{lat}_{lon}"
+        
+        if location_key not in locations:
+            new_coords.append((location_key, lat, lon))
+        elif locations[location_key]['source'] not in (source, 'both'):
+            # Mark as present in both datasets
+            locations[location_key]['source'] = 'both'
+            changes += 1
+    
+    if new_coords:
+        # Classify all new stations in one vectorized pass
+        keys, lats, lons = zip(*new_coords)
+        regions, types = get_region_classifier().classify(lats, lons)
+        for i, location_key in enumerate(keys):
+            locations[location_key] = {
+                'lat': lats[i],
+                'lon': lons[i],
+                'type': types[i],
+                'region': regions[i],
+                'source': source
+            }
+        changes += len(new_coords)
+    return changes
+
+_region_classifier = None
+
+def get_region_classifier():
+    """Shared RegionClassifier (polygon boundaries if available, threshold rules otherwise)"""
+    global _region_classifier
+    if _region_classifier is None:
+        _region_classifier = RegionClassifier()
+    return _region_classifier
+
+def _hash_file(file_path, prefix_size=None):
+    """SHA-256 of the whole file and of its first prefix_size bytes, in a single pass"""
+    hasher = hashlib.sha256()
+    prefix_digest = None
+    ends_with_newline = False
+    read = 0
+    
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk_size = HASH_CHUNK_SIZE
+            if prefix_size is not None and prefix_digest is None:
+                chunk_size = min(chunk_size, prefix_size - read)
+                if chunk_size == 0:
+                    prefix_digest = hasher.hexdigest()
+                    continue
+            
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            read += len(chunk)
+            if prefix_size is not None and read == prefix_size:
+                ends_with_newline = chunk.endswith(b'\n')
+    
+    if prefix_size is not None and prefix_digest is None:
+        prefix_digest = hasher.hexdigest()
+    return hasher.hexdigest(), prefix_digest, ends_with_newline
+
+def _cache_path(output_file):
+    base, _ = os.path.splitext(output_file)
+    return base + '.cache.json'
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_cache(cache_file, cache):
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+def print_location_summary(locations):
+    """Print type/region/source counts and coordinate bounds"""
+    location_types = {}
+    regions = {}
+    sources = {}
+    
+    for loc_data in locations.values():
+        location_types[loc_data['type']] = location_types.get(loc_data['type'], 0) + 1
+        regions[loc_data['region']] = regions.get(loc_data['region'], 0) + 1
+        sources[loc_data['source']] = sources.get(loc_data['source'], 0) + 1
+    
+    print(f"\nLocation Types: {location_types}")
+    print(f"Regions: {regions}")
+    print(f"Data Sources: {sources}")
+    
+    # Sample coordinates bounds
+    lats = [loc['lat'] for loc in locations.values()]
+    lons = [loc['lon'] for loc in locations.values()]
+    print(f"\nCoordinate Bounds:")
+    print(f"Latitude: {min(lats):.3f} to {max(lats):.3f}")
+    print(f"Longitude: {min(lons):.3f} to {max(lons):.3f}")
+
 def determine_location_type(lat, lon):
-    """Determine location type based on coordinates (Rwanda context)"""
+    """Determine location type based on coordinates (Rwanda context)
+    
+    Scalar threshold rule; the extractor classifies through RegionClassifier,
+    which uses boundary polygons when available.
+    """
     # Based on Rwanda's geography and the EDA insights
     
     if lat > -1.0:  # Northern Rwanda (includes Kigali area)
@@ -153,18 +322,61 @@ def save_locations_to_json(locations, output_file='extracted_locations.json'):
         json.dump(locations, f, indent=2)
     print(f"Locations saved to {output_file}")
 
+def save_locations_to_npz(locations, output_file='extracted_locations.npz'):
+    """Save the station table as compact columnar arrays for fast app startup"""
+    keys = list(locations.keys())
+    columns = {
+        'keys': np.array(keys, dtype=str),
+        'lat': np.array([locations[k]['lat'] for k in keys], dtype=np.float64),
+        'lon': np.array([locations[k]['lon'] for k in keys], dtype=np.float64)
+    }
+    
+    # Categorical columns are stored as small integer codes plus a vocabulary
+    for field in ('type', 'region', 'source'):
+        values = [locations[k].get(field, 'unknown') for k in keys]
+        vocab, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+        columns[f'{field}_vocab'] = vocab
+        columns[f'{field}_codes'] = codes.astype(np.uint16)
+    
+    np.savez(output_file, **columns)
+    print(f"Station table saved to {output_file}")
+
+def load_locations_from_npz(npz_file):
+    """Load a station table written by save_locations_to_npz back into the location dict"""
+    with np.load(npz_file, allow_pickle=False) as data:
+        keys = data['keys'].tolist()
+        lats = data['lat'].tolist()
+        lons = data['lon'].tolist()
+        categorical = {
+            field: data[f'{field}_vocab'][data[f'{field}_codes']].tolist()
+            for field in ('type', 'region', 'source')
+        }
+    
+    return {
+        key: {
+            'lat': lats[i],
+            'lon': lons[i],
+            'type': categorical['type'][i],
+            'region': categorical['region'][i],
+            'source': categorical['source'][i]
+        }
+        for i, key in enumerate(keys)
+    }
+
 if __name__ == "__main__":
     # Extract locations
     print("Extracting locations from CO2 emissions dataset...")
     print("=" * 50)
     
-    # Specify your data path here
-    DATA_PATH = r'C:\Users\ADMIN\Desktop\co2em\co2-emissions-dashboard\backend\playground-series-s3e20'  # Adjust this path as needed
+    # Specify your data path here (or pass it as the first argument; --force ignores the cache)
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    DATA_PATH = args[0] if args else DEFAULT_DATA_PATH  # Adjust this path as needed
+    OUTPUT_FILE = 'extracted_locations.json'
     
-    locations = extract_locations_from_dataset(DATA_PATH)
+    locations, changed = update_locations_from_dataset(DATA_PATH, OUTPUT_FILE, force='--force' in sys.argv)
     
-    # Save to JSON file for reference
-    save_locations_to_json(locations)
+    if not changed:
+        print("Inputs unchanged, existing output is up to date.")
     
     print("\n" + "=" * 50)
     print("Location extraction completed!")
@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+class ForecastCache:
+    """
+    Per-station weekly emission forecast, precomputed as one (stations x weeks) float32 matrix.
+
+    refresh() scores every station for each of the next `horizon` ISO
+    weeks in a single predict_batch call. Each station's inputs are its
+    current gas levels, from inputs(), held constant while year/week_no
+    advance. Lookups only slice the matrix, so requests never run the
+    model. run_nightly() refreshes once a day at `hour` local time;
+    processes without it (HTTP workers) refresh on the first lookup after
+    the forecast is older than max_age.
+    """
+
+    def __init__(self, station_state, monitor, inputs, horizon=52, max_age=timedelta(days=1)):
+        self.state = station_state
+        self.monitor = monitor
+        self.inputs = inputs  # () -> (so2, no2, co) arrays, one value per station
+        self.horizon = horizon
+        self.emission = None  # (stations, horizon) float32
+        self.weeks = []  # (iso year, iso week, week start date) per column
+        self.generated_at = None
+        self.max_age = max_age.total_seconds()
+        self.refreshed = None  # time.monotonic() of the last refresh
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def refresh(self, now=None):
+        started = time.perf_counter()
+        now = datetime.now() if now is None else now
+        n, horizon = len(self.state), self.horizon
+
+        # Column k is the ISO week k+1 weeks from now, scored at the same time of day
+        moments = [now + timedelta(weeks=k + 1) for k in range(horizon)]
+        iso = [m.isocalendar() for m in moments]
+        weeks = [(c[0], c[1], (m - timedelta(days=m.weekday())).date().isoformat()) for c, m in zip(iso, moments)]
+
+        so2, no2, co = self.inputs()
+        station = np.repeat(np.arange(n), horizon)
+        emission, _ = self.monitor.predict_batch(
+            self.state.lat[station], self.state.lon[station],
+            so2[station], no2[station], co[station],
+            timestamps=np.tile([m.timestamp() for m in moments], n),
+            location_types=self.state.types[station],
+            year=np.tile([c[0] for c in iso], n),
+            week_no=np.tile([c[1] for c in iso], n),
+            noise=False, tick_stages=False)
+
+        matrix = emission.astype(np.float32).reshape(n, horizon)
+        with self.lock:
+            self.emission = matrix
+            self.weeks = weeks
+            self.generated_at = now.isoformat()
+            self.refreshed = time.monotonic()
+        print(f"📈 Forecast refreshed: {n} stations x {horizon} weeks in {time.perf_counter() - started:.2f}s")
+
+    def _due(self):
+        return self.refreshed is None or time.monotonic() - self.refreshed > self.max_age
+
+    def ensure(self):
+        """Refresh if there is no forecast yet or it is older than max_age, once for concurrent callers"""
+        if self._due():
+            with self.refresh_lock:
+                if self._due():
+                    self.refresh()
+
+    def _weeks(self, count):
+        return [{'year': year, 'week_no': week, 'week_start': start} for year, week, start in self.weeks[:count]]
+
+    def station(self, i, weeks):
+        self.ensure()
+        with self.lock:
+            values = self.emission[i, :weeks]
+            return {
+                'generated_at': self.generated_at,
+                'weeks': [dict(week, emission=round(float(v), 3)) for week, v in zip(self._weeks(weeks), values)]
+            }
+
+    def group(self, indices, weeks):
+        """Total and mean forecast over a set of stations"""
+        self.ensure()
+        with self.lock:
+            block = self.emission[indices, :weeks].astype(np.float64)
+            totals = block.sum(axis=0)
+            means = block.mean(axis=0) if len(indices) else totals
+            return {
+                'generated_at': self.generated_at,
+                'stations': len(indices),
+                'weeks': [dict(week, total_emission=round(float(t), 3), mean_emission=round(float(m), 3))
+                          for week, t, m in zip(self._weeks(weeks), totals, means)]
+            }
+
+    def run_nightly(self, hour=2):
+        """Background loop: refresh now, then every day at `hour`:00 local time"""
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Forecast refresh failed: {e}")
+            now = datetime.now()
+            next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            time.sleep((next_run - now).total_seconds())
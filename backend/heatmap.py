@@ -0,0 +1,179 @@
+import numpy as np
+import struct
+import threading
+import time
+import zlib
+
+from spatial_index import SpatialIndex
+
+# Served resolutions (cells along the longer side); other requests snap to the nearest.
+# A 512 layer is ~260k cells x 8 neighbours, about 35 MB, so the set bounds the cache.
+RESOLUTIONS = (32, 64, 128, 256, 512)
+# Layers not requested for this long are no longer refreshed on every tick, only when requested again
+IDLE_SECONDS = 300
+
+class HeatmapLayer:
+    """
+    Inverse-distance-weighted emission raster at one resolution.
+    
+    Each cell's k nearest stations and their IDW weights are found once via the
+    spatial index. A reverse station -> cells table means a tick only
+    recomputes the cells whose neighbours actually changed.
+    """
+    
+    def __init__(self, station_state, spatial_index, bounds, resolution, k=8, power=2.0):
+        self.state = station_state
+        self.resolution = resolution
+        (self.lat_min, self.lon_min), (self.lat_max, self.lon_max) = bounds
+        
+        # `resolution` cells along the longer side, row 0 = northern edge
+        span_lat = self.lat_max - self.lat_min
+        span_lon = self.lon_max - self.lon_min
+        cell = max(span_lat, span_lon) / resolution
+        self.width = max(1, int(round(span_lon / cell)))
+        self.height = max(1, int(round(span_lat / cell)))
+        
+        lons = self.lon_min + (np.arange(self.width) + 0.5) * (span_lon / self.width)
+        lats = self.lat_max - (np.arange(self.height) + 0.5) * (span_lat / self.height)
+        grid_lon, grid_lat = np.meshgrid(lons, lats)
+        
+        distances, self.neighbours = spatial_index.query(grid_lat.ravel(), grid_lon.ravel(), k=k)
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / np.power(distances, power)
+        # A cell centre sitting on a station takes that station's value
+        exact = np.isinf(weights)
+        weights[exact.any(axis=1)] = exact[exact.any(axis=1)].astype(np.float64)
+        weights[self.neighbours < 0] = 0.0
+        self.weights = weights
+        self.neighbours = np.maximum(self.neighbours, 0)
+        
+        # Reverse index (CSR): station -> cells that use it
+        flat = self.neighbours.ravel()
+        order = np.argsort(flat, kind='stable')
+        self.cells_by_station = (order // self.neighbours.shape[1])
+        self.station_offsets = np.concatenate([[0], np.cumsum(np.bincount(flat, minlength=len(station_state)))])
+        
+        self.values = np.full(self.width * self.height, np.nan)
+        self.tick = -1
+        self.encoded = {}
+        self.lock = threading.Lock()
+    
+    def refresh(self):
+        """Bring the raster up to date with the station state, returns number of cells recomputed"""
+        with self.lock:
+            changed = self.state.changed_since(self.tick)
+            tick = self.state.tick
+            if self.tick >= 0 and len(changed) == 0:
+                return 0
+            
+            if self.tick < 0 or len(changed) > len(self.state) // 2:
+                cells = slice(None)
+                count = len(self.values)
+            else:
+                cells = np.unique(np.concatenate([
+                    self.cells_by_station[self.station_offsets[i]:self.station_offsets[i + 1]] for i in changed
+                ]))
+                count = len(cells)
+            
+            emission = self.state.emission
+            has_data = self.state.has_data
+            nbr = self.neighbours[cells]
+            w = self.weights[cells] * has_data[nbr]
+            total = w.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.values[cells] = np.where(total > 0, (w * emission[nbr]).sum(axis=1) / total, np.nan)
+            
+            self.tick = tick
+            self.encoded = {}
+            return count
+    
+    def grid(self):
+        return self.values.reshape(self.height, self.width)
+    
+    def encode(self, fmt='png'):
+        """Encoded raster (cached until the next refresh), returns (payload, headers)"""
+        with self.lock:
+            if fmt not in self.encoded:
+                grid = self.grid()
+                finite = np.isfinite(grid)
+                v_min = float(grid[finite].min()) if finite.any() else 0.0
+                v_max = float(grid[finite].max()) if finite.any() else 0.0
+                
+                if fmt == 'f32':
+                    payload = grid.astype('<f4').tobytes()
+                    content_type = 'application/octet-stream'
+                else:
+                    # 0 = no data, 1..65535 = linear over [min, max]
+                    scale = 65534.0 / (v_max - v_min) if v_max > v_min else 0.0
+                    levels = np.where(finite, np.round((np.nan_to_num(grid, nan=v_min) - v_min) * scale) + 1, 0)
+                    payload = encode_png_gray16(levels.astype(np.uint16))
+                    content_type = 'image/png'
+                
+                headers = {
+                    'Content-Type': content_type,
+                    'X-Heatmap-Resolution': str(self.resolution),
+                    'X-Heatmap-Width': str(self.width),
+                    'X-Heatmap-Height': str(self.height),
+                    'X-Heatmap-Bounds': f"{self.lat_min},{self.lon_min},{self.lat_max},{self.lon_max}",
+                    'X-Heatmap-Min': f"{v_min:.6f}",
+                    'X-Heatmap-Max': f"{v_max:.6f}",
+                    'X-Heatmap-Tick': str(self.tick)
+                }
+                self.encoded[fmt] = (payload, headers)
+            return self.encoded[fmt]
+
+class HeatmapCache:
+    """
+    HeatmapLayer per served resolution, refreshed on every tick while in use.
+    
+    Only the RESOLUTIONS are built, so the cache holds at most one layer
+    each. Layers idle for more than idle_seconds are skipped by
+    refresh_all() and caught up by get() when requested again.
+    """
+    
+    def __init__(self, station_state, bounds, spatial_index=None, idle_seconds=IDLE_SECONDS):
+        self.state = station_state
+        self.bounds = bounds
+        self.index = spatial_index or SpatialIndex(station_state.lat, station_state.lon)
+        self.idle_seconds = idle_seconds
+        self.layers = {}
+        self.last_used = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def resolution(requested):
+        """The served resolution nearest to the requested one"""
+        return min(RESOLUTIONS, key=lambda r: abs(r - requested))
+    
+    def get(self, resolution):
+        resolution = self.resolution(resolution)
+        with self.lock:
+            layer = self.layers.get(resolution)
+            if layer is None:
+                layer = HeatmapLayer(self.state, self.index, self.bounds, resolution)
+                self.layers[resolution] = layer
+            self.last_used[resolution] = time.monotonic()
+        layer.refresh()
+        return layer
+    
+    def refresh_all(self):
+        now = time.monotonic()
+        with self.lock:
+            active = [layer for resolution, layer in self.layers.items()
+                      if now - self.last_used[resolution] <= self.idle_seconds]
+        for layer in active:
+            layer.refresh()
+
+def encode_png_gray16(array):
+    """Minimal PNG writer for a 2-D uint16 array (16-bit greyscale, no filtering)"""
+    height, width = array.shape
+    rows = np.empty((height, 1 + width * 2), dtype=np.uint8)
+    rows[:, 0] = 0  # filter type: none
+    rows[:, 1:] = array.astype('>u2').view(np.uint8).reshape(height, width * 2)
+    
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    
+    header = struct.pack('>IIBBBBB', width, height, 16, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) + chunk(b'IEND', b''))
@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# One stored reading; station is the index into the manifest's station names
+HISTORY_DTYPE = np.dtype([
+    ('station', np.int32),
+    ('timestamp', np.float64),
+    ('emission', np.float64),
+    ('co2_equivalent', np.float64),
+    ('so2', np.float64),
+    ('no2', np.float64),
+    ('co', np.float64),
+    ('anomaly_level', np.uint8)
+])
+
+MANIFEST_FILE = 'manifest.json'
+
+class HistoryStore:
+    """
+    Append-only history of readings on disk.
+
+    Rows are buffered in memory and written in bulk as numbered .npy parts
+    of HISTORY_DTYPE, each with its row count and time range in
+    manifest.json. Parts are written to a temporary name and renamed, and
+    the manifest is replaced the same way, so a reader never sees a
+    half-written part. Reads memory-map the parts and skip those outside
+    the requested time range.
+    """
+
+    def __init__(self, directory, station_names=None, part_rows=1_000_000):
+        self.directory = directory
+        self.part_rows = part_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.lock = threading.RLock()
+
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+            if station_names is not None and list(station_names) != self.manifest['stations']:
+                raise ValueError(f"history in {directory} was written for a different station list")
+        else:
+            if station_names is None:
+                raise FileNotFoundError(f"no history store in {directory}")
+            os.makedirs(directory, exist_ok=True)
+            self.manifest = {'version': 1, 'stations': list(station_names), 'parts': []}
+            self._write_manifest()
+
+    @property
+    def stations(self):
+        return self.manifest['stations']
+
+    def __len__(self):
+        return sum(part['rows'] for part in self.manifest['parts']) + self.pending_rows
+
+    def append(self, columns):
+        """Buffer readings given as {field: array} (missing fields are zero); writes a part when enough are pending"""
+        count = len(columns['station'])
+        if count == 0:
+            return
+        rows = np.zeros(count, dtype=HISTORY_DTYPE)
+        for name in HISTORY_DTYPE.names:
+            if name in columns:
+                rows[name] = columns[name]
+        with self.lock:
+            self.pending.append(rows)
+            self.pending_rows += count
+            if self.pending_rows >= self.part_rows:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending_rows:
+                return
+            self._write_part(np.concatenate(self.pending))
+            self.pending = []
+            self.pending_rows = 0
+
+    def _write_part(self, rows):
+        name = f"part-{len(self.manifest['parts']):06d}.npy"
+        temporary = os.path.join(self.directory, name + '.tmp')
+        with open(temporary, 'wb') as f:
+            np.save(f, rows)
+        os.replace(temporary, os.path.join(self.directory, name))
+
+        self.manifest['parts'].append({
+            'file': name,
+            'rows': len(rows),
+            'start': float(rows['timestamp'].min()),
+            'end': float(rows['timestamp'].max())
+        })
+        self._write_manifest()
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def reload(self):
+        """Pick up parts written by another process"""
+        with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        with self.lock:
+            self.manifest = manifest
+
+    def snapshot(self):
+        """(parts, pending rows) as of now: a consistent view while the writer keeps appending"""
+        with self.lock:
+            parts = list(self.manifest['parts'])
+            pending = np.concatenate(self.pending) if self.pending else np.zeros(0, dtype=HISTORY_DTYPE)
+        return parts, pending
+
+    def part_path(self, part):
+        return os.path.join(self.directory, part['file'])
+
+    def read(self, start=None, end=None, stations=None):
+        """Yield arrays of stored rows with start <= timestamp < end, optionally for some station indices only"""
+        for part in self.manifest['parts']:
+            if (start is not None and part['end'] < start) or (end is not None and part['start'] >= end):
+                continue
+            rows = np.load(self.part_path(part), mmap_mode='r')
+            mask = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                mask &= rows['timestamp'] >= start
+            if end is not None:
+                mask &= rows['timestamp'] < end
+            if stations is not None:
+                mask &= np.isin(rows['station'], stations)
+            yield np.asarray(rows[mask])
@@ -0,0 +1,221 @@
+import numpy as np
+import json
+import math
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Compact binary body: b'CO2I' + uint32 record count, then packed little-endian records
+BINARY_MAGIC = b'CO2I'
+BINARY_HEADER = struct.Struct('<4sI')
+RECORD_DTYPE = np.dtype([
+    ('station', '<i4'),      # index into GET /api/ingest/registry
+    ('timestamp', '<f8'),    # epoch seconds
+    ('so2', '<f4'),
+    ('no2', '<f4'),
+    ('co', '<f4')
+])
+
+# Maximum distance between a reading's reported position and the registered station
+MAX_POSITION_MISMATCH_DEG = 0.01
+
+# Accepted reading timestamps: at most this old, and at most this far ahead of the server clock
+MAX_READING_AGE_S = 30 * 86400
+MAX_CLOCK_SKEW_S = 300
+
+def empty_batch():
+    return {
+        'station': np.zeros(0, dtype=np.int64),
+        'timestamp': np.zeros(0, dtype=np.float64),
+        'so2': np.zeros(0, dtype=np.float64),
+        'no2': np.zeros(0, dtype=np.float64),
+        'co': np.zeros(0, dtype=np.float64),
+        'source': np.zeros(0, dtype=object)
+    }
+
+def make_batch(station, timestamp, so2, no2, co, source):
+    n = len(station)
+    return {
+        'station': np.asarray(station, dtype=np.int64),
+        'timestamp': np.asarray(timestamp, dtype=np.float64),
+        'so2': np.asarray(so2, dtype=np.float64),
+        'no2': np.asarray(no2, dtype=np.float64),
+        'co': np.asarray(co, dtype=np.float64),
+        'source': np.full(n, source, dtype=object) if isinstance(source, str) else np.asarray(source, dtype=object)
+    }
+
+def concat_batches(batches):
+    if not batches:
+        return empty_batch()
+    return {key: np.concatenate([b[key] for b in batches]) for key in batches[0]}
+
+def take(batch, selector):
+    return {key: values[selector] for key, values in batch.items()}
+
+def _parse_timestamp(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError("timestamp must be an ISO 8601 string or epoch seconds")
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+def parse_ndjson(body, station_state, source='gateway'):
+    """
+    Parse JSON-lines readings and validate them against the station registry.
+
+    Each line: {"location_name": ..., "so2": ..., "no2": ..., "co": ...,
+    "timestamp": ISO string or epoch seconds (optional, defaults to now),
+    "lat"/"lon" (optional, must match the registered station)}.
+    Returns (batch, errors).
+    """
+    now = time.time()
+    rows = []
+    errors = []
+
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            reading = json.loads(line)
+            if not isinstance(reading, dict):
+                raise ValueError(f"expected a JSON object, got {type(reading).__name__}")
+            i = station_state.index.get(reading.get('location_name'))
+            if i is None:
+                raise ValueError(f"unknown station {reading.get('location_name')!r}")
+            if 'lat' in reading or 'lon' in reading:
+                if (abs(float(reading.get('lat', station_state.lat[i])) - station_state.lat[i]) > MAX_POSITION_MISMATCH_DEG or
+                        abs(float(reading.get('lon', station_state.lon[i])) - station_state.lon[i]) > MAX_POSITION_MISMATCH_DEG):
+                    raise ValueError("position does not match the registered station")
+            gases = [float(reading[g]) for g in ('so2', 'no2', 'co')]
+            rows.append((i, _parse_timestamp(reading.get('timestamp'), now), *gases))
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append({'line': line_no, 'error': str(e) if not isinstance(e, KeyError) else f"missing field {e}"})
+
+    if not rows:
+        return empty_batch(), errors
+
+    station, timestamp, so2, no2, co = zip(*rows)
+    return _validate_values(make_batch(station, timestamp, so2, no2, co, source), errors)
+
+def parse_binary(body, station_state, source='gateway'):
+    """Parse the packed binary format (see RECORD_DTYPE). Returns (batch, errors)"""
+    if len(body) < BINARY_HEADER.size:
+        raise ValueError("binary body shorter than header")
+    magic, count = BINARY_HEADER.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise ValueError("bad magic, expected b'CO2I'")
+    if len(body) != BINARY_HEADER.size + count * RECORD_DTYPE.itemsize:
+        raise ValueError(f"body length does not match {count} records of {RECORD_DTYPE.itemsize} bytes")
+
+    records = np.frombuffer(body, dtype=RECORD_DTYPE, count=count, offset=BINARY_HEADER.size)
+    errors = []
+    known = (records['station'] >= 0) & (records['station'] < len(station_state))
+    for r in np.flatnonzero(~known)[:20]:
+        errors.append({'record': int(r), 'error': f"unknown station index {int(records['station'][r])}"})
+    records = records[known]
+
+    batch = make_batch(records['station'], records['timestamp'], records['so2'], records['no2'], records['co'], source)
+    return _validate_values(batch, errors)
+
+def encode_binary(station, timestamp, so2, no2, co):
+    """Pack readings into the binary ingest format (for gateways and load generators)"""
+    records = np.zeros(len(station), dtype=RECORD_DTYPE)
+    records['station'] = station
+    records['timestamp'] = timestamp
+    records['so2'] = so2
+    records['no2'] = no2
+    records['co'] = co
+    return BINARY_HEADER.pack(BINARY_MAGIC, len(records)) + records.tobytes()
+
+def _validate_values(batch, errors):
+    """Drop readings with negative or non-finite gas values, or timestamps outside the accepted window"""
+    values = np.stack([batch['so2'], batch['no2'], batch['co']])
+    valid = np.isfinite(values).all(axis=0) & (values >= 0).all(axis=0)
+    now = time.time()
+    in_window = (batch['timestamp'] >= now - MAX_READING_AGE_S) & (batch['timestamp'] <= now + MAX_CLOCK_SKEW_S)
+    out_of_window = valid & ~in_window
+    if not valid.all():
+        errors.append({'error': f"{int((~valid).sum())} readings with negative or non-finite values dropped"})
+    if out_of_window.any():
+        errors.append({'error': f"{int(out_of_window.sum())} readings with timestamps more than "
+                                f"{MAX_READING_AGE_S // 86400} days old or {MAX_CLOCK_SKEW_S} s ahead dropped"})
+    if not (valid & in_window).all():
+        batch = take(batch, valid & in_window)
+    return batch, errors
+
+class IngestQueue:
+    """
+    Bounded queue of reading batches between producers and the scoring consumer.
+
+    The bound is on readings, not batches. offer() never blocks: it returns
+    False when the batch does not fit, and retry_after() estimates how long
+    the consumer needs to make room, from its recent drain rate.
+    """
+
+    def __init__(self, max_readings=50000):
+        self.max_readings = max_readings
+        self.batches = deque()
+        self.depth = 0
+        self.condition = threading.Condition()
+        self.drain_rate = None  # readings per second, exponentially smoothed
+        self.stats = {'accepted': 0, 'rejected_full': 0, 'batches': 0}
+
+    def offer(self, batch):
+        n = len(batch['station'])
+        with self.condition:
+            if self.depth + n > self.max_readings:
+                self.stats['rejected_full'] += n
+                return False
+            self.batches.append(batch)
+            self.depth += n
+            self.stats['accepted'] += n
+            self.stats['batches'] += 1
+            self.condition.notify()
+            return True
+
+    def drain(self, max_readings=20000, timeout=1.0):
+        """Wait for queued readings and take up to max_readings (whole batches) at once"""
+        with self.condition:
+            if not self.batches:
+                self.condition.wait(timeout)
+            taken = []
+            count = 0
+            while self.batches and (not taken or count + len(self.batches[0]['station']) <= max_readings):
+                batch = self.batches.popleft()
+                taken.append(batch)
+                count += len(batch['station'])
+            self.depth -= count
+        return concat_batches(taken)
+
+    def record_drain(self, readings, seconds):
+        if readings and seconds > 0:
+            rate = readings / seconds
+            self.drain_rate = rate if self.drain_rate is None else 0.8 * self.drain_rate + 0.2 * rate
+
+    def retry_after(self, incoming=0):
+        """Seconds until roughly `incoming` readings would fit (at least 1)"""
+        if not self.drain_rate:
+            return 1
+        excess = self.depth + incoming - self.max_readings
+        return max(1, math.ceil(excess / self.drain_rate))
+
+def split_by_occurrence(batch):
+    """Split a batch into sub-batches in which each station appears at most once, in arrival order"""
+    station = batch['station']
+    if len(station) == 0:
+        return []
+    order = np.argsort(station, kind='stable')
+    sorted_station = station[order]
+    group_start = np.concatenate([[True], sorted_station[1:] != sorted_station[:-1]])
+    start_positions = np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - start_positions
+
+    if rank.max() == 0:
+        return [batch]
+    return [take(batch, np.flatnonzero(rank == r)) for r in range(int(rank.max()) + 1)]
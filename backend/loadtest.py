@@ -0,0 +1,172 @@
+"""
+HTTP load test for the dashboard API.
+
+Simulates dashboard viewers polling the read endpoints over keep-alive
+connections and, optionally, long-lived /api/stream subscribers, then
+reports requests/sec and latency percentiles per endpoint as JSON.
+
+    python loadtest.py --url http://localhost:5000 --clients 200 --duration 30
+    python loadtest.py --url http://localhost:5000 --streams 2000
+
+Run it against `python app.py` (Flask development server) and against
+`uvicorn asgi:application` to compare the serving modes.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# The polling mix of one dashboard tab (see CO2EmissionsDashboard.js)
+DEFAULT_PATHS = ['/api/realtime-data?limit=100', '/api/current-status', '/api/locations', '/api/eda-data']
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and 'close' in value.lower():
+            keep_alive = False
+
+    if chunked:
+        size = 0
+        while True:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            if chunk_size == 0:
+                await reader.readline()
+                break
+            await reader.readexactly(chunk_size + 2)
+            size += chunk_size
+        return status, size, keep_alive
+    if length is not None:
+        await reader.readexactly(length)
+        return status, length, keep_alive
+    body = await reader.read()
+    return status, len(body), False
+
+async def poller(host, port, paths, deadline, results, think_time, request_timeout=10.0):
+    """One dashboard client: request each path in turn on a keep-alive connection"""
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+            status, size, keep_alive = await asyncio.wait_for(_read_response(reader), timeout=request_timeout)
+            results[path]['latency'].append(time.perf_counter() - started)
+            results[path]['bytes'] += size
+            if status >= 400:
+                results[path]['errors'] += 1
+            if not keep_alive:
+                # e.g. the Flask development server closes after every response
+                writer.close()
+                reader = writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError):
+            results[path]['errors'] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+        if think_time:
+            await asyncio.sleep(think_time)
+    if writer is not None:
+        writer.close()
+
+async def subscriber(host, port, deadline, stats):
+    """One /api/stream connection, counting events until the deadline"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f"GET /api/stream HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        status_line = await reader.readline()
+        if b' 200 ' not in status_line:
+            stats['failed'] += 1
+            writer.close()
+            return
+        stats['connected'] += 1
+        while time.perf_counter() < deadline:
+            line = await asyncio.wait_for(reader.readline(), timeout=max(0.1, deadline - time.perf_counter()))
+            if not line:
+                break
+            if line.startswith(b'event: tick'):
+                stats['events'] += 1
+        writer.close()
+    except asyncio.TimeoutError:
+        writer.close()
+    except (OSError, ConnectionError):
+        stats['failed'] += 1
+
+def percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 2) if latencies else None
+
+async def run(url, paths, clients, streams, duration, think_time):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    deadline = time.perf_counter() + duration
+    results = {path: {'latency': [], 'bytes': 0, 'errors': 0} for path in paths}
+    stream_stats = {'connected': 0, 'failed': 0, 'events': 0}
+
+    started = time.perf_counter()
+    tasks = [subscriber(host, port, deadline, stream_stats) for _ in range(streams)]
+    tasks += [poller(host, port, paths[c % len(paths):] + paths[:c % len(paths)], deadline, results, think_time)
+              for c in range(clients)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    report = {'url': url, 'clients': clients, 'streams': streams, 'duration_s': round(elapsed, 2), 'endpoints': {}}
+    all_latencies = []
+    for path, r in results.items():
+        all_latencies.extend(r['latency'])
+        report['endpoints'][path] = {
+            'requests': len(r['latency']),
+            'errors': r['errors'],
+            'rps': round(len(r['latency']) / elapsed, 1),
+            'p50_ms': percentile_ms(r['latency'], 50),
+            'p95_ms': percentile_ms(r['latency'], 95),
+            'p99_ms': percentile_ms(r['latency'], 99),
+            'avg_bytes': int(r['bytes'] / len(r['latency'])) if r['latency'] else 0
+        }
+    report['total'] = {
+        'requests': len(all_latencies),
+        'errors': sum(r['errors'] for r in results.values()),
+        'rps': round(len(all_latencies) / elapsed, 1),
+        'p50_ms': percentile_ms(all_latencies, 50),
+        'p99_ms': percentile_ms(all_latencies, 99)
+    }
+    if streams:
+        report['streams'] = stream_stats
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the CO2 monitoring API")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=50, help="concurrent polling clients")
+    parser.add_argument('--streams', type=int, default=0, help="concurrent /api/stream subscribers")
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds")
+    parser.add_argument('--think-time', type=float, default=0.0, help="pause between a client's requests")
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.url, args.paths, args.clients, args.streams, args.duration, args.think_time))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+from datetime import datetime
+
+import numpy as np
+
+from ingest import split_by_occurrence
+from station_state import StationWindow
+
+HISTORY_FIELDS = ('timestamp', 'emission', 'so2', 'no2', 'co', 'good')
+MAX_WINDOW = 120
+DEFAULT_WINDOW = 50
+
+# Fields of the location detail response, by dotted name, grouped as in /api/location-data/<name>
+FIELD_GROUPS = {
+    'location_info': None,
+    'current': None,
+    'trends': ('timestamps', 'emissions', 'so2_levels', 'no2_levels', 'co_levels', 'emission_trend'),
+    'statistics': ('avg_emission', 'max_emission', 'min_emission', 'std_emission', 'avg_so2', 'avg_no2', 'avg_co',
+                   'data_quality_score'),
+    'data_summary': ('total_readings', 'time_span_hours')
+}
+ALL_FIELDS = [group if leaves is None else f'{group}.{leaf}'
+              for group, leaves in FIELD_GROUPS.items() for leaf in (leaves or (None,))]
+SERIES = {'emissions': 'emission', 'so2_levels': 'so2', 'no2_levels': 'no2', 'co_levels': 'co'}
+STATISTICS = {
+    'avg_emission': ('emission', np.nanmean), 'max_emission': ('emission', np.nanmax),
+    'min_emission': ('emission', np.nanmin), 'std_emission': ('emission', np.nanstd),
+    'avg_so2': ('so2', np.nanmean), 'avg_no2': ('no2', np.nanmean), 'avg_co': ('co', np.nanmean),
+    'data_quality_score': ('good', np.nanmean)
+}
+
+def resolve_fields(spec):
+    """
+    Dotted field names for a fields= parameter (None means all).
+
+    Each entry is a dotted name ('statistics.avg_emission'), a group
+    ('statistics') or a leaf name that belongs to a single group ('emissions').
+    """
+    if not spec:
+        return list(ALL_FIELDS)
+    fields = []
+    for name in (part.strip() for part in spec.split(',')):
+        if not name:
+            continue
+        matches = [field for field in ALL_FIELDS if field == name or field.startswith(name + '.')
+                   or field.split('.')[-1] == name]
+        if not matches:
+            raise ValueError(f"Unknown field '{name}'")
+        fields.extend(field for field in matches if field not in fields)
+    return fields
+
+class LocationHistory:
+    """
+    The last MAX_WINDOW readings of every station, for the location detail endpoints.
+
+    Readings are pushed per tick into a StationWindow, so a query reads
+    its stations' rows by index instead of scanning the recent-readings
+    store. columns() answers any number of stations in one pass, one
+    array operation per requested field, and returns one column per field
+    aligned with the requested stations.
+    """
+
+    def __init__(self, n_stations, window=MAX_WINDOW):
+        self.window = StationWindow(n_stations, window, HISTORY_FIELDS)
+
+    def push(self, indices, columns):
+        """Add readings given as {field: array} aligned with indices (stations may repeat, oldest first)"""
+        batch = dict(columns, station=np.asarray(indices, dtype=np.int64))
+        for part in split_by_occurrence(batch):
+            self.window.push(part['station'], part)
+
+    def counts(self, indices, window):
+        return np.minimum(self.window.count[indices], window)
+
+    def columns(self, indices, fields, window=DEFAULT_WINDOW, records=None):
+        """
+        {field: list aligned with indices} for the given dotted fields.
+
+        records maps the record fields ('location_info', 'current') to a
+        callable returning their value per station index. A station with
+        no readings gets empty series and None statistics.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        counts = self.counts(indices, window)
+        series = {}
+
+        def history(field):
+            # (stations, window) oldest to newest, NaN before a station's first reading
+            if field not in series:
+                series[field] = self.window.ordered(field, indices)[:, -window:]
+            return series[field]
+
+        def rows(matrix):
+            return [row[len(row) - count:].tolist() for row, count in zip(matrix, counts.tolist())]
+
+        def optional(values):
+            return [float(v) if count else None for v, count in zip(values, counts.tolist())]
+
+        columns = {}
+        for field in fields:
+            group, _, leaf = field.partition('.')
+            if group in ('location_info', 'current'):
+                columns[field] = [records[group](i) for i in indices.tolist()]
+            elif leaf == 'timestamps':
+                columns[field] = [[datetime.fromtimestamp(ts).isoformat() for ts in row] for row in rows(history('timestamp'))]
+            elif leaf in SERIES:
+                columns[field] = rows(history(SERIES[leaf]))
+            elif leaf == 'emission_trend':
+                columns[field] = self._trends(history('emission'), counts)
+            elif leaf in STATISTICS:
+                source, reduce = STATISTICS[leaf]
+                with np.errstate(all='ignore'):
+                    columns[field] = optional(reduce(history(source), axis=1))
+            elif leaf == 'total_readings':
+                columns[field] = counts.tolist()
+            elif leaf == 'time_span_hours':
+                timestamps = history('timestamp')
+                with np.errstate(all='ignore'):
+                    columns[field] = optional((np.nanmax(timestamps, axis=1) - np.nanmin(timestamps, axis=1)) / 3600)
+        return columns
+
+    @staticmethod
+    def _trends(emissions, counts):
+        """increasing/decreasing when the last 5 readings average 10% above/below the 5 before (needs 10)"""
+        with np.errstate(all='ignore'):
+            recent = emissions[:, -5:].mean(axis=1)
+            older = emissions[:, -10:-5].mean(axis=1)
+        trend = np.where(recent > older * 1.1, 'increasing', np.where(recent < older * 0.9, 'decreasing', 'stable'))
+        return np.where(counts >= 10, trend, 'stable').tolist()
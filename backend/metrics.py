@@ -0,0 +1,165 @@
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from 100us (a per-stage step at 497 stations) to 10s (a 50k-station tick)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Payload buckets in bytes, 256 B to 64 MB
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))
+
+# Per-thread list of observations, set while a request or tick is being traced
+_trace = threading.local()
+
+def start_trace():
+    """Record every histogram observation made on this thread until stop_trace()"""
+    _trace.entries = []
+
+def stop_trace():
+    """Observations since start_trace() as [(metric name, label values, value)]"""
+    entries = getattr(_trace, 'entries', None)
+    _trace.entries = None
+    return entries or []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter, one series per label combination, or read from a callback at scrape time"""
+    kind = 'counter'
+    
+    def __init__(self, name, documentation, labels=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        # callback() -> number, or {label values tuple: number} for labelled series
+        self.callback = callback
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    
+    def samples(self):
+        if self.callback is not None:
+            value = self.callback()
+            values = value if isinstance(value, dict) else {(): value}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [(self.name, key, (), value) for key, value in values.items()]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    kind = 'gauge'
+    
+    def set(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus layout.
+    
+    observe() is a bisect plus two increments under a lock, cheap enough
+    to time every tick stage and every request.
+    """
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+        entries = getattr(_trace, 'entries', None)
+        if entries is not None:
+            entries.append((self.name, key, value))
+    
+    def time(self, **labels):
+        return _Timer(self, labels)
+    
+    def samples(self):
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        samples = []
+        for key, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append((f'{self.name}_count', key, (), cumulative))
+            samples.append((f'{self.name}_sum', key, (), series[-1]))
+        return samples
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+    
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name, documentation, labels=(), callback=None):
+        return self.register(Counter(name, documentation, labels, callback))
+    
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+    
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+    
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in samples:
+                lines.append(f"{name}{_format_labels(metric.labels, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,184 @@
+"""
+In-process sampling profiler and slow-request log.
+
+SamplingProfiler walks sys._current_frames() at a fixed interval, so it
+sees every Python thread (generator, ingest consumer, request threads)
+without instrumenting any of them. Captures are reported as collapsed
+stacks (one `frame;frame;... count` line per unique stack, the input of
+flamegraph.pl and speedscope) or as a pstats file derived from the samples.
+
+SlowRequestLog tracks in-flight requests and ticks. A watchdog thread
+grabs the stack of any that runs past the threshold while it is still
+running, and finish() logs it with the stage timings recorded on that
+thread.
+"""
+import marshal
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+MAX_CAPTURE_SECONDS = 60.0
+MIN_INTERVAL_SECONDS = 0.001
+
+def _code_key(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+def _frame_label(frame):
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+def _stack(frame):
+    """Frames of a stack, outermost first"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+class SamplingProfiler:
+    """Statistical profile of all threads of this process over a time window"""
+
+    def __init__(self, interval=0.005, thread_filter=None):
+        if not math.isfinite(interval):
+            interval = MIN_INTERVAL_SECONDS
+        self.interval = min(max(MIN_INTERVAL_SECONDS, interval), MAX_CAPTURE_SECONDS)
+        self.thread_filter = thread_filter
+        self.samples = Counter()  # (thread name, (code key, line, label)...) -> count
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def sample(self, skip_threads=()):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in skip_threads:
+                continue
+            name = names.get(ident, f"thread-{ident}")
+            if self.thread_filter and self.thread_filter not in name:
+                continue
+            stack = tuple((_code_key(f.f_code), _frame_label(f)) for f in _stack(frame))
+            self.samples[(name, stack)] += 1
+        self.sample_count += 1
+
+    def run(self, seconds):
+        """Sample from the calling thread for `seconds` (blocking)"""
+        # NaN would slip through min/max and the deadline would never pass
+        if not math.isfinite(seconds):
+            seconds = MAX_CAPTURE_SECONDS
+        seconds = min(max(seconds, self.interval), MAX_CAPTURE_SECONDS)
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_sample = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+            self.sample(skip_threads=(me,))
+            next_sample += self.interval
+        self.duration = time.perf_counter() - started
+        return self
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack text, thread name as the root frame"""
+        lines = [f"{name};{';'.join(label for _, label in stack)} {count}" if stack else f"{name} {count}"
+                 for (name, stack), count in self.samples.most_common()]
+        return '\n'.join(lines) + '\n'
+
+    def pstats(self):
+        """
+        Marshalled stats in the layout pstats.Stats() loads.
+
+        Every sample counts as one call of each function on its stack and
+        `interval` seconds of time: own time for the innermost frame,
+        cumulative time for all of them. Times are therefore estimates.
+        """
+        own = Counter()
+        cumulative = Counter()
+        callers = {}
+        for (_, stack), count in self.samples.items():
+            keys = [key for key, _ in stack]
+            if not keys:
+                continue
+            own[keys[-1]] += count
+            for key in set(keys):
+                cumulative[key] += count
+            for caller, callee in set(zip(keys, keys[1:])):
+                edges = callers.setdefault(callee, Counter())
+                edges[caller] += count
+
+        stats = {}
+        for key, count in cumulative.items():
+            stats[key] = (
+                count, count,
+                own[key] * self.interval,
+                count * self.interval,
+                {caller: (n, n, 0.0, n * self.interval) for caller, n in callers.get(key, {}).items()}
+            )
+        return marshal.dumps(stats)
+
+class SlowRequestLog:
+    """Requests (or ticks) slower than a threshold, with their stack and stage timings"""
+
+    def __init__(self, threshold=0.5, history=100):
+        self.threshold = threshold
+        self.entries = deque(maxlen=history)
+        self.in_flight = {}  # thread ident -> {'name', 'started', 'stack'}
+        self.lock = threading.Lock()
+        self.watchdog = None
+
+    def start_watchdog(self):
+        if self.threshold <= 0 or self.watchdog is not None:
+            return
+        self.watchdog = threading.Thread(target=self._watch, name='slow-request-watchdog', daemon=True)
+        self.watchdog.start()
+
+    def _watch(self):
+        period = min(0.1, self.threshold / 4)
+        while True:
+            time.sleep(period)
+            now = time.perf_counter()
+            with self.lock:
+                overdue = [ident for ident, entry in self.in_flight.items()
+                           if entry['stack'] is None and now - entry['started'] > self.threshold]
+            if not overdue:
+                continue
+            frames = sys._current_frames()
+            with self.lock:
+                for ident in overdue:
+                    entry = self.in_flight.get(ident)
+                    if entry is not None and ident in frames:
+                        entry['stack'] = [_frame_label(f) for f in _stack(frames[ident])]
+
+    def begin(self, name):
+        with self.lock:
+            self.in_flight[threading.get_ident()] = {'name': name, 'started': time.perf_counter(), 'stack': None}
+
+    def finish(self, stages=(), **details):
+        """End the current thread's request; returns the log entry when it was slow"""
+        with self.lock:
+            entry = self.in_flight.pop(threading.get_ident(), None)
+        if entry is None:
+            return None
+        elapsed = time.perf_counter() - entry['started']
+        if self.threshold <= 0 or elapsed < self.threshold:
+            return None
+
+        timings = {}
+        for metric, labels, value in stages:
+            label = metric if not labels else f"{metric}[{','.join(map(str, labels))}]"
+            timings[label] = round(timings.get(label, 0.0) + value * 1000, 3)
+        slow = {
+            'name': entry['name'],
+            'timestamp': time.time(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'stage_ms': timings,
+            'stack': entry['stack'],
+            **details
+        }
+        self.entries.append(slow)
+        return slow
@@ -0,0 +1,212 @@
+import numpy as np
+import os
+import json
+
+# Drop a province/district GeoJSON here (e.g. geoBoundaries RWA ADM1/ADM2) to enable polygon classification
+DEFAULT_BOUNDARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rwanda_boundaries.geojson')
+
+REGION_NAME_KEYS = ('region', 'name', 'shapeName', 'NAME_2', 'NAME_1', 'ADM2_EN', 'ADM1_EN')
+TYPE_KEYS = ('location_type', 'type')
+
+OUTSIDE = -1
+BOUNDARY = -2
+
+def classify_by_thresholds(lats, lons):
+    """Vectorized version of the lat/lon threshold rules in extract_location.py"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    
+    north = lats > -1.0
+    south = lats < -2.5
+    east = lons > 30.0
+    west = lons < 29.5
+    
+    types = np.select(
+        [north & east, north, south & east, south],
+        ['urban', 'industrial', 'industrial', 'coastal'],
+        default='urban'
+    )
+    regions = np.select(
+        [north & east, north & west, north,
+         south & east, south & west, south,
+         east, west],
+        ["Eastern Province", "Northwestern Region", "Northern Province",
+         "Southeastern Region", "Western Province (Lake Kivu)", "Southern Province",
+         "Central-Eastern Region", "Western Region"],
+        default="Central Rwanda (Kigali Area)"
+    )
+    return regions.astype(object), types.astype(object)
+
+class RegionClassifier:
+    """
+    Point-in-polygon region/type classifier backed by a prebuilt lookup grid.
+    
+    The boundary polygons are rasterized once into a grid of cell labels. Cells
+    that lie wholly inside one polygon answer lookups directly; only points in
+    cells crossed by a boundary get an exact even-odd polygon test. Points
+    outside every polygon (or all points, when no boundary file is available)
+    fall back to the threshold rules.
+    """
+    
+    def __init__(self, boundary_file=DEFAULT_BOUNDARY_FILE, cell_size=0.01):
+        self.cell_size = cell_size
+        self.features = []
+        self.grid = None
+        
+        if boundary_file and os.path.exists(boundary_file):
+            try:
+                self.features = self._load_features(boundary_file)
+                self._build_grid()
+                boundary_cells = int((self.grid == BOUNDARY).sum())
+                print(f"✓ Loaded {len(self.features)} boundary polygons from {boundary_file} "
+                      f"({self.grid.shape[0]}x{self.grid.shape[1]} grid, {boundary_cells} boundary cells)")
+            except Exception as e:
+                print(f"Warning: could not load boundaries from {boundary_file} ({e}), using threshold rules")
+                self.features = []
+                self.grid = None
+    
+    @property
+    def polygon_mode(self):
+        return self.grid is not None
+    
+    def classify(self, lats, lons):
+        """Classify arrays of points, returns (regions, types) as object arrays"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        regions, types = classify_by_thresholds(lats, lons)
+        
+        if self.grid is None or len(lats) == 0:
+            return regions, types
+        
+        labels = self.lookup(lats, lons)
+        inside = labels >= 0
+        if inside.any():
+            regions[inside] = self.region_names[labels[inside]]
+            has_type = inside & self.has_type[np.maximum(labels, 0)]
+            types[has_type] = self.type_names[labels[has_type]]
+        return regions, types
+    
+    def classify_point(self, lat, lon):
+        """Classify a single coordinate, returns (region, type)"""
+        regions, types = self.classify([lat], [lon])
+        return regions[0], types[0]
+    
+    def lookup(self, lats, lons):
+        """Feature index for each point (OUTSIDE when no polygon contains it)"""
+        rows = np.floor((lats - self.lat_min) / self.cell_size).astype(np.int64)
+        cols = np.floor((lons - self.lon_min) / self.cell_size).astype(np.int64)
+        in_grid = (rows >= 0) & (rows < self.grid.shape[0]) & (cols >= 0) & (cols < self.grid.shape[1])
+        
+        labels = np.full(len(lats), OUTSIDE, dtype=np.int64)
+        labels[in_grid] = self.grid[rows[in_grid], cols[in_grid]]
+        
+        # Exact test only for points that landed in boundary cells
+        on_boundary = np.flatnonzero(labels == BOUNDARY)
+        if len(on_boundary):
+            labels[on_boundary] = self._exact_labels(lats[on_boundary], lons[on_boundary])
+        return labels
+    
+    def _load_features(self, boundary_file):
+        with open(boundary_file, 'r') as f:
+            geojson = json.load(f)
+        
+        features = []
+        for feature in geojson.get('features', []):
+            geometry = feature.get('geometry') or {}
+            properties = feature.get('properties') or {}
+            
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                continue
+            
+            # Even-odd filling over all rings handles holes and multipolygon parts alike
+            rings = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+            edges = np.concatenate([np.hstack([ring[:-1], ring[1:]]) for ring in rings if len(ring) > 1])
+            
+            region = next((properties[k] for k in REGION_NAME_KEYS if properties.get(k)), f"Region {len(features) + 1}")
+            location_type = next((properties[k] for k in TYPE_KEYS if properties.get(k)), None)
+            features.append({'region': region, 'type': location_type, 'edges': edges})
+        
+        if not features:
+            raise ValueError("no Polygon/MultiPolygon features found")
+        
+        self.region_names = np.array([f['region'] for f in features], dtype=object)
+        self.type_names = np.array([f['type'] for f in features], dtype=object)
+        self.has_type = np.array([f['type'] is not None for f in features], dtype=bool)
+        return features
+    
+    def _build_grid(self):
+        all_edges = np.concatenate([f['edges'] for f in self.features])
+        self.lon_min = float(all_edges[:, [0, 2]].min())
+        self.lat_min = float(all_edges[:, [1, 3]].min())
+        lon_max = float(all_edges[:, [0, 2]].max())
+        lat_max = float(all_edges[:, [1, 3]].max())
+        
+        n_rows = int(np.ceil((lat_max - self.lat_min) / self.cell_size)) + 1
+        n_cols = int(np.ceil((lon_max - self.lon_min) / self.cell_size)) + 1
+        corner_lats = self.lat_min + np.arange(n_rows + 1) * self.cell_size
+        corner_lons = self.lon_min + np.arange(n_cols + 1) * self.cell_size
+        
+        # Label every cell corner with a scanline fill per polygon
+        corners = np.full((n_rows + 1, n_cols + 1), OUTSIDE, dtype=np.int64)
+        for index, feature in enumerate(self.features):
+            corners[self._scanline_fill(feature['edges'], corner_lats, corner_lons)] = index
+        
+        # A cell is resolved by the grid only if all four corners agree and no edge passes through it
+        grid = corners[:-1, :-1].copy()
+        mixed = ((corners[:-1, :-1] != corners[1:, :-1]) | (corners[:-1, :-1] != corners[:-1, 1:]) |
+                 (corners[:-1, :-1] != corners[1:, 1:]))
+        grid[mixed] = BOUNDARY
+        grid[self._edge_cells(all_edges, n_rows, n_cols)] = BOUNDARY
+        self.grid = grid
+    
+    @staticmethod
+    def _scanline_fill(edges, row_lats, col_lons):
+        """Even-odd fill of one polygon sampled at a lat/lon lattice"""
+        x1, y1, x2, y2 = edges.T
+        inside = np.zeros((len(row_lats), len(col_lons)), dtype=bool)
+        
+        for r, lat in enumerate(row_lats):
+            spans = (y1 > lat) != (y2 > lat)
+            if not spans.any():
+                continue
+            crossings = np.sort(x1[spans] + (lat - y1[spans]) * (x2[spans] - x1[spans]) / (y2[spans] - y1[spans]))
+            inside[r] = np.searchsorted(crossings, col_lons, side='right') % 2 == 1
+        return inside
+    
+    def _edge_cells(self, edges, n_rows, n_cols):
+        """Mask of cells touched by any polygon edge (edges densely sampled at quarter-cell steps)"""
+        x1, y1, x2, y2 = edges.T
+        steps = np.maximum(np.ceil(np.hypot(x2 - x1, y2 - y1) / (self.cell_size / 4)).astype(np.int64), 1)
+        
+        edge_index = np.repeat(np.arange(len(edges)), steps + 1)
+        starts = np.concatenate([[0], np.cumsum(steps + 1)[:-1]])
+        t = (np.arange(len(edge_index)) - np.repeat(starts, steps + 1)) / np.repeat(steps, steps + 1)
+        
+        xs = x1[edge_index] + t * (x2 - x1)[edge_index]
+        ys = y1[edge_index] + t * (y2 - y1)[edge_index]
+        rows = np.clip(np.floor((ys - self.lat_min) / self.cell_size).astype(np.int64), 0, n_rows - 1)
+        cols = np.clip(np.floor((xs - self.lon_min) / self.cell_size).astype(np.int64), 0, n_cols - 1)
+        
+        mask = np.zeros((n_rows, n_cols), dtype=bool)
+        mask[rows, cols] = True
+        return mask
+    
+    def _exact_labels(self, lats, lons, chunk_size=2048):
+        """Exact even-odd point-in-polygon test, vectorized over points x edges"""
+        labels = np.full(len(lats), OUTSIDE, dtype=np.int64)
+        
+        for index, feature in enumerate(self.features):
+            x1, y1, x2, y2 = feature['edges'].T
+            for start in range(0, len(lats), chunk_size):
+                py = lats[start:start + chunk_size, None]
+                px = lons[start:start + chunk_size, None]
+                spans = (y1 > py) != (y2 > py)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+                inside = (np.sum(spans & (px < x_cross), axis=1) % 2) == 1
+                labels[start:start + chunk_size][inside] = index
+        return labels
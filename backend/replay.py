@@ -0,0 +1,143 @@
+"""
+Replay / backfill: run the simulator and model over a simulated time range as fast as possible.
+
+    python replay.py --start 2023-01-01 --days 365 --step 3600 --output history
+    python replay.py --days 7 --step 3 --pipeline        # full tick pipeline at the live cadence
+
+Every reading uses the simulated tick time instead of the clock, so the
+daily and weekly cycles, the model's week feature and alert durations all
+follow simulated time. Runs with the same --seed (and station list) give
+the same data. Readings go to a HistoryStore in bulk parts.
+
+By default ticks are simulated and scored in chunks of --chunk-ticks, one
+vectorized simulate and one predict call per chunk. --pipeline publishes
+every tick through the live path instead (anomaly detection, alert
+engine, heatmaps), which is slower but exercises detection and alerting.
+Alert notifications are not sent during a replay.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+PROGRESS_SECONDS = 5.0
+
+def tick_times(start, days, step):
+    begin = datetime.fromisoformat(start).timestamp()
+    count = int(days * 86400 // step)
+    return begin + step * np.arange(count, dtype=np.float64)
+
+def replay_chunks(backend, store, ticks, chunk_ticks, report):
+    """Simulate and score many ticks per call, straight into the store"""
+    state = backend.station_state
+    for chunk in np.array_split(ticks, max(1, -(-len(ticks) // chunk_ticks))):
+        batch = backend.simulate_station_batch(chunk)
+        idx = batch['station']
+        emission, co2_equivalent = backend.monitor.predict_batch(
+            state.lat[idx], state.lon[idx], batch['so2'], batch['no2'], batch['co'],
+            timestamps=batch['timestamp'], location_types=state.types[idx])
+        store.append({
+            'station': idx,
+            'timestamp': batch['timestamp'],
+            'emission': emission,
+            'co2_equivalent': co2_equivalent,
+            'so2': batch['so2'],
+            'no2': batch['no2'],
+            'co': batch['co']
+        })
+        report(len(chunk), float(chunk[-1]))
+
+def replay_pipeline(backend, store, ticks, report):
+    """Publish every tick through the live scoring path, recording what it stored"""
+    state = backend.station_state
+
+    def record(changed):
+        store.append({
+            'station': changed,
+            'timestamp': state.timestamp[changed],
+            'emission': state.emission[changed],
+            'co2_equivalent': state.co2_equivalent[changed],
+            'so2': state.so2[changed],
+            'no2': state.no2[changed],
+            'co': state.co[changed],
+            'anomaly_level': backend.anomaly_detector.level[changed]
+        })
+
+    backend.tick_listeners.append(record)
+    for ts in ticks.tolist():
+        backend.process_ingest_batch(backend.simulate_station_batch(ts))
+        report(1, ts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the CO2 simulator over a simulated time range")
+    parser.add_argument('--start', default='2023-01-01', help="simulated start (ISO date/time, local time)")
+    parser.add_argument('--days', type=float, default=365.0, help="simulated days to generate")
+    parser.add_argument('--step', type=float, default=3600.0, help="simulated seconds between ticks (live: 3)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='history', help="history store directory")
+    parser.add_argument('--pipeline', action='store_true', help="publish each tick through anomalies/alerts/heatmaps")
+    parser.add_argument('--chunk-ticks', type=int, default=64, help="ticks scored per call without --pipeline")
+    parser.add_argument('--verbose', action='store_true', help="keep the app's own logging")
+    args = parser.parse_args()
+
+    ticks = tick_times(args.start, args.days, args.step)
+    if not len(ticks):
+        parser.error("--days/--step give no ticks")
+
+    os.environ['CO2_BACKGROUND_THREADS'] = '0'
+    # The replay writes its own store; don't also record through the app's tick listener
+    os.environ.pop('CO2_HISTORY_DIR', None)
+    output = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+    import app as backend
+    from history import HistoryStore
+
+    backend.alert_engine.notifier = None
+    np.random.seed(args.seed)
+    store = HistoryStore(args.output, backend.station_state.names)
+    stored_before = len(store)
+    n = len(backend.station_state)
+
+    started = time.perf_counter()
+    progress = {'ticks': 0, 'last_report': started}
+
+    def report(count, simulated_ts):
+        progress['ticks'] += count
+        now = time.perf_counter()
+        if now - progress['last_report'] >= PROGRESS_SECONDS:
+            progress['last_report'] = now
+            rate = progress['ticks'] / (now - started)
+            print(f"⏩ {progress['ticks']}/{len(ticks)} ticks, at {datetime.fromtimestamp(simulated_ts).isoformat()} "
+                  f"({rate:.0f} ticks/s, {rate * n:.0f} readings/s)", file=sys.stderr)
+
+    print(f"⏩ Replaying {len(ticks)} ticks x {n} stations from {args.start} "
+          f"({'pipeline' if args.pipeline else 'chunked'} mode)", file=sys.stderr)
+    if args.pipeline:
+        replay_pipeline(backend, store, ticks, report)
+    else:
+        replay_chunks(backend, store, ticks, args.chunk_ticks, report)
+    store.flush()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'mode': 'pipeline' if args.pipeline else 'chunked',
+        'seed': args.seed,
+        'stations': n,
+        'ticks': len(ticks),
+        'readings': len(store) - stored_before,
+        'simulated_start': datetime.fromtimestamp(ticks[0]).isoformat(),
+        'simulated_end': (datetime.fromtimestamp(ticks[-1]) + timedelta(seconds=args.step)).isoformat(),
+        'elapsed_s': round(elapsed, 2),
+        'ticks_per_s': round(len(ticks) / elapsed, 1),
+        'readings_per_s': round(len(ticks) * n / elapsed, 1),
+        'output': os.path.abspath(args.output)
+    }, indent=2), file=output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+
+class SamplingSchedule:
+    """
+    Per-station sampling intervals from recent volatility and alert proximity.
+
+    Every observed emission updates an exponentially weighted mean and
+    variance per station. Two signals in [0, 1] are derived from them:
+    volatility, the coefficient of variation placed between quiet_cv and
+    volatile_cv, and proximity, how close the latest reading is to a
+    station's medium/high threshold in standard deviations (1 at the
+    threshold, 0 at proximity_sigmas or further). The larger of the two
+    sets the interval, geometrically between max_interval (0) and
+    min_interval (1), in whole generator ticks. Stations still warming up
+    or with an alert pending confirmation are sampled at min_interval.
+    due(now) returns the stations whose next reading is due.
+    """
+
+    def __init__(self, n_stations, medium, high, tick=3.0, min_interval=3.0, max_interval=24.0, alpha=0.2,
+                 quiet_cv=0.1, volatile_cv=0.5, proximity_sigmas=3.0, warmup=5):
+        self.tick = tick
+        self.min_interval = max(min_interval, tick)
+        self.max_interval = max(max_interval, self.min_interval)
+        self.medium = medium
+        self.high = high
+        self.alpha = alpha
+        self.quiet_cv = quiet_cv
+        self.volatile_cv = volatile_cv
+        self.proximity_sigmas = proximity_sigmas
+        self.warmup = warmup
+
+        self.mean = np.zeros(n_stations)
+        self.var = np.zeros(n_stations)
+        self.count = np.zeros(n_stations, dtype=np.int64)
+        self.interval = np.full(n_stations, self.min_interval)
+        self.next_due = np.zeros(n_stations)
+        self.stats = {'ticks': 0, 'last_due': 0, 'scheduled': 0}
+        self.lock = threading.Lock()
+
+    @property
+    def adaptive(self):
+        return self.max_interval > self.min_interval
+
+    def due(self, now):
+        """Indices of stations due at `now` (half a tick early counts, so timer jitter doesn't skip a tick)"""
+        with self.lock:
+            due = np.flatnonzero(self.next_due <= now + self.tick / 2)
+            self.stats['ticks'] += 1
+            self.stats['last_due'] = len(due)
+            self.stats['scheduled'] += len(due)
+        return due
+
+    def observe(self, indices, emission, timestamp, urgent=None):
+        """Fold in new readings (distinct stations) and reschedule their next reading"""
+        indices = np.asarray(indices, dtype=np.int64)
+        emission = np.asarray(emission, dtype=np.float64)
+        with self.lock:
+            first = self.count[indices] == 0
+            delta = emission - self.mean[indices]
+            self.mean[indices] = np.where(first, emission, self.mean[indices] + self.alpha * delta)
+            self.var[indices] = np.where(first, 0.0, (1 - self.alpha) * (self.var[indices] + self.alpha * delta ** 2))
+            self.count[indices] += 1
+
+            std = np.sqrt(self.var[indices])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cv = std / np.abs(self.mean[indices])
+                distance = np.minimum(np.abs(emission - self.medium[indices]), np.abs(emission - self.high[indices])) / std
+            volatility = np.clip((np.nan_to_num(cv, nan=0.0, posinf=1.0) - self.quiet_cv) /
+                                 (self.volatile_cv - self.quiet_cv), 0, 1)
+            proximity = np.clip(1 - np.nan_to_num(distance, nan=np.inf) / self.proximity_sigmas, 0, 1)
+            urgency = np.maximum(volatility, proximity)
+            urgency[self.count[indices] < self.warmup] = 1.0
+            if urgent is not None:
+                urgency[np.asarray(urgent, dtype=bool)] = 1.0
+
+            interval = self.max_interval * (self.min_interval / self.max_interval) ** urgency
+            ticks = np.clip(np.round(interval / self.tick), np.ceil(self.min_interval / self.tick),
+                            np.floor(self.max_interval / self.tick))
+            self.interval[indices] = ticks * self.tick
+            self.next_due[indices] = np.asarray(timestamp, dtype=np.float64) + self.interval[indices]
+
+    def rates(self):
+        """Samples per second of every station"""
+        with self.lock:
+            return 1.0 / self.interval
+
+    def summary(self):
+        with self.lock:
+            interval = self.interval.copy()
+            stats = dict(self.stats)
+        return dict(stats, adaptive=self.adaptive, min_interval_s=self.min_interval, max_interval_s=self.max_interval,
+                    interval_s={'p10': float(np.percentile(interval, 10)), 'p50': float(np.median(interval)),
+                                'p90': float(np.percentile(interval, 90))},
+                    # Readings per second as a fraction of sampling every station every min_interval
+                    load_ratio=round(float((self.min_interval / interval).mean()), 3))
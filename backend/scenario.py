@@ -0,0 +1,191 @@
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+# Perturbable inputs: request name -> StationState array (week comes from the reading timestamp)
+GAS_FIELDS = {'SO2': 'so2', 'NO2': 'no2', 'CO': 'co'}
+OPERATIONS = ('scale', 'add', 'set')
+
+def _as_list(value):
+    if value is None:
+        return None
+    return sorted({str(v) for v in (value if isinstance(value, (list, tuple)) else [value])})
+
+def normalize_scenario(spec):
+    """
+    Validated, canonical form of a scenario request; raises ValueError.
+
+    {"selector": {"region": name(s), "type": name(s), "bbox": [lon_min, lat_min, lon_max, lat_max]},
+     "perturbations": {"CO": {"scale": 1.2}, "SO2": {"add": 1e-5}, "NO2": {"set": 4e-5}, "week": {"add": 2}}}
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("scenario must be a JSON object")
+    selector = spec.get('selector') or {}
+    perturbations = spec.get('perturbations') or {}
+    if not isinstance(selector, dict) or not isinstance(perturbations, dict):
+        raise ValueError("selector and perturbations must be objects")
+
+    bbox = selector.get('bbox')
+    if bbox is not None:
+        if isinstance(bbox, str):
+            bbox = bbox.split(',')
+        bbox = [float(v) for v in bbox]
+        if len(bbox) != 4 or not all(math.isfinite(v) for v in bbox):
+            raise ValueError("bbox must be lon_min,lat_min,lon_max,lat_max")
+    normalized_selector = {'region': _as_list(selector.get('region')), 'type': _as_list(selector.get('type')), 'bbox': bbox}
+
+    normalized_perturbations = {}
+    for name, change in perturbations.items():
+        key = name.upper() if name.upper() in GAS_FIELDS else name.lower()
+        if key not in GAS_FIELDS and key != 'week':
+            raise ValueError(f"unknown perturbation {name!r}, expected one of {', '.join(list(GAS_FIELDS) + ['week'])}")
+        if not isinstance(change, dict) or len(change) != 1 or next(iter(change)) not in OPERATIONS:
+            raise ValueError(f"perturbation {name!r} must be one of {{'scale': x}}, {{'add': x}}, {{'set': x}}")
+        operation, amount = next(iter(change.items()))
+        if key == 'week' and operation == 'scale':
+            raise ValueError("week supports 'add' and 'set' only")
+        amount = float(amount)
+        if not math.isfinite(amount):
+            raise ValueError(f"perturbation {name!r} needs a finite amount")
+        normalized_perturbations[key] = {operation: amount}
+    if not normalized_perturbations:
+        raise ValueError("at least one perturbation is required")
+
+    return {'selector': normalized_selector, 'perturbations': normalized_perturbations}
+
+def scenario_hash(normalized):
+    return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def apply_change(values, change):
+    operation, amount = next(iter(change.items()))
+    if operation == 'scale':
+        return values * amount
+    if operation == 'add':
+        return values + amount
+    return np.full_like(values, amount)
+
+class ScenarioEngine:
+    """
+    What-if runs over the latest reading of a set of stations.
+
+    The selected stations' latest gas levels and weeks are perturbed as
+    whole arrays, and baseline and perturbed rows are scored together in
+    one predict_batch call without the mock model's noise, so the deltas
+    only reflect the perturbation. Results are cached per scenario hash
+    until the next tick changes the underlying readings.
+    """
+
+    def __init__(self, station_state, monitor, stations_in_bbox, cache_size=128):
+        self.state = station_state
+        self.monitor = monitor
+        self.stations_in_bbox = stations_in_bbox
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # scenario hash -> (tick, result)
+        self.lock = threading.Lock()
+
+    def select(self, selector):
+        """Indices of the stations matching every given selector field"""
+        state = self.state
+        mask = np.zeros(len(state), dtype=bool)
+        mask[self.stations_in_bbox(selector['bbox'])] = True
+        if selector['region']:
+            wanted = {r.lower() for r in selector['region']}
+            mask &= np.array([r.lower() in wanted for r in state.regions])
+        if selector['type']:
+            wanted = {t.lower() for t in selector['type']}
+            mask &= np.array([t.lower() in wanted for t in state.types])
+        return np.flatnonzero(mask & state.has_data)
+
+    def run(self, spec):
+        normalized = normalize_scenario(spec)
+        key = scenario_hash(normalized)
+        tick = self.state.tick
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == tick:
+                self.cache.move_to_end(key)
+                return dict(cached[1], cached=True)
+
+        result = self._evaluate(normalized, key, tick)
+        with self.lock:
+            self.cache[key] = (tick, result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(result, cached=False)
+
+    def _evaluate(self, normalized, key, tick):
+        state = self.state
+        idx = self.select(normalized['selector'])
+        perturbations = normalized['perturbations']
+        result = {
+            'scenario_hash': key,
+            'scenario': normalized,
+            'tick': tick,
+            'stations_matched': len(idx)
+        }
+        if not len(idx):
+            return dict(result, stations=[], regions=[], totals=None)
+
+        with state.lock:
+            timestamps = state.timestamp[idx].copy()
+            gases = {name: getattr(state, field)[idx].copy() for name, field in GAS_FIELDS.items()}
+
+        weeks = None
+        if 'week' in perturbations:
+            unique_ts, inverse = np.unique(timestamps, return_inverse=True)
+            weeks = np.array([datetime.fromtimestamp(ts).isocalendar()[1] for ts in unique_ts])[inverse]
+        perturbed = {name: np.maximum(0.0, apply_change(values, perturbations[name])) if name in perturbations else values
+                     for name, values in gases.items()}
+
+        # Baseline rows then scenario rows, one model call
+        def both(baseline, scenario):
+            return np.concatenate([baseline, scenario])
+
+        week_no = None
+        if weeks is not None:
+            week_no = both(weeks, np.clip(np.rint(apply_change(weeks.astype(np.float64), perturbations['week'])), 1, 53))
+        emission, _ = self.monitor.predict_batch(
+            both(state.lat[idx], state.lat[idx]), both(state.lon[idx], state.lon[idx]),
+            both(gases['SO2'], perturbed['SO2']), both(gases['NO2'], perturbed['NO2']), both(gases['CO'], perturbed['CO']),
+            timestamps=both(timestamps, timestamps), location_types=both(state.types[idx], state.types[idx]),
+            week_no=week_no, noise=False, tick_stages=False)
+        baseline, scenario = emission[:len(idx)], emission[len(idx):]
+        delta = scenario - baseline
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_pct = np.where(baseline > 0, delta / baseline * 100, 0.0)
+        result['stations'] = [{
+            'location_name': state.names[i],
+            'region': state.regions[i],
+            'location_type': state.types[i],
+            'baseline_emission': round(float(b), 3),
+            'scenario_emission': round(float(s), 3),
+            'delta': round(float(d), 3),
+            'delta_pct': round(float(p), 2)
+        } for i, b, s, d, p in zip(idx.tolist(), baseline, scenario, delta, delta_pct)]
+
+        regions, inverse = np.unique(state.regions[idx].astype(str), return_inverse=True)
+        counts = np.bincount(inverse)
+        baseline_sum = np.bincount(inverse, weights=baseline)
+        scenario_sum = np.bincount(inverse, weights=scenario)
+        result['regions'] = [
+            self._aggregate({'region': region, 'stations': int(count)}, b, s)
+            for region, count, b, s in zip(regions.tolist(), counts, baseline_sum, scenario_sum)
+        ]
+        result['totals'] = self._aggregate({'stations': len(idx)}, baseline.sum(), scenario.sum())
+        return result
+
+    @staticmethod
+    def _aggregate(summary, baseline_total, scenario_total):
+        delta = scenario_total - baseline_total
+        return dict(summary,
+                    baseline_total=round(float(baseline_total), 3),
+                    scenario_total=round(float(scenario_total), 3),
+                    delta=round(float(delta), 3),
+                    delta_pct=round(float(delta / baseline_total * 100), 2) if baseline_total > 0 else 0.0)
@@ -0,0 +1,287 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+from ingest import split_by_occurrence
+
+SERIES_FIELDS = ('emission', 'so2', 'no2', 'co')
+BLOCK_SIZE = 256
+
+def _bits(values, width):
+    """(len(values), width) bool matrix of the low `width` bits of each value, most significant first"""
+    octets = np.asarray(values, dtype=np.uint64).astype('>u8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(octets, axis=1)[:, 64 - width:].astype(bool)
+
+def _from_bits(bits):
+    """uint64 values of a (n, width <= 64) bool matrix, most significant bit first"""
+    padded = np.zeros((len(bits), 64), dtype=bool)
+    padded[:, 64 - bits.shape[1]:] = bits
+    return np.packbits(padded, axis=1).view('>u8').ravel().astype(np.uint64)
+
+def encode_floats(matrix):
+    """
+    XOR-encode each row of a (rows, n) float64 matrix, returns one bytes object per row.
+
+    As in Gorilla, each value is XORed with the previous one in its row and
+    only the bits between the XOR's leading and trailing zeros are kept.
+    Every row holds a bitmap of non-zero XORs (n bits), then 12 header bits
+    per non-zero XOR (leading zeros, length - 1), then the kept bits. The
+    headers sit apart from the kept bits, so offsets are prefix sums and
+    both directions are array operations rather than a bit-by-bit loop.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    rows, n = matrix.shape
+    raw = matrix.view(np.uint64)
+    xor = raw ^ np.concatenate([np.zeros((rows, 1), dtype=np.uint64), raw[:, :-1]], axis=1)
+    nonzero = xor != 0
+    bitmaps = np.packbits(nonzero, axis=1)
+
+    row_of = np.nonzero(nonzero)[0]
+    x = xor[nonzero]
+    bits = _bits(x, 64)
+    lead = bits.argmax(axis=1)
+    trail = bits[:, ::-1].argmax(axis=1)
+    length = 64 - lead - trail
+    headers = np.concatenate([_bits(lead, 6), _bits(length - 1, 6)], axis=1).ravel()
+    # Right-aligned, the kept bits of all XORs are the trailing `length` columns, in order
+    kept = _bits(x >> trail.astype(np.uint64), 64)[np.arange(64) >= (64 - length)[:, None]]
+
+    # Per row: its headers, then its kept bits, then zeros up to a whole byte
+    per_row = np.bincount(row_of, minlength=rows)
+    header_end = np.cumsum(12 * per_row)
+    kept_end = np.cumsum(np.bincount(row_of, weights=length, minlength=rows).astype(np.int64))
+    padding = -(header_end - np.concatenate([[0], header_end[:-1]]) + kept_end - np.concatenate([[0], kept_end[:-1]])) % 8
+    zeros = np.zeros(8, dtype=bool)
+    pieces, sizes = [], []
+    for r in range(rows):
+        h0 = header_end[r - 1] if r else 0
+        k0 = kept_end[r - 1] if r else 0
+        pieces += [headers[h0:header_end[r]], kept[k0:kept_end[r]], zeros[:padding[r]]]
+        sizes.append((header_end[r] - h0 + kept_end[r] - k0 + padding[r]) // 8)
+    body = np.packbits(np.concatenate(pieces)).tobytes()
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    return [bitmaps[r].tobytes() + body[offsets[r]:offsets[r + 1]] for r in range(rows)]
+
+def decode_floats(data, count):
+    """Inverse of encode_floats for one row of `count` values"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    bitmap_bytes = -(-count // 8)
+    nonzero = np.unpackbits(data[:bitmap_bytes], count=count).astype(bool)
+    k = int(nonzero.sum())
+    stream = np.unpackbits(data[bitmap_bytes:]).astype(bool)
+    headers = stream[:12 * k].reshape(k, 12)
+    lead = _from_bits(headers[:, :6]).astype(np.int64)
+    length = _from_bits(headers[:, 6:]).astype(np.int64) + 1
+    columns = np.arange(64)
+    mask = (columns >= lead[:, None]) & (columns < (lead + length)[:, None])
+    bits = np.zeros((k, 64), dtype=bool)
+    bits[mask] = stream[12 * k:12 * k + int(length.sum())]
+    xor = np.zeros(count, dtype=np.uint64)
+    xor[nonzero] = _from_bits(bits)
+    return np.bitwise_xor.accumulate(xor).view(np.float64)
+
+def encode_timestamps(micros):
+    """Delta-of-delta encoding of integer timestamps: (first, first delta, bit width, zigzag payload)"""
+    micros = np.asarray(micros, dtype=np.int64)
+    if len(micros) < 2:
+        return int(micros[0]), 0, 0, b''
+    dod = np.diff(micros, n=2)
+    zigzag = ((dod << 1) ^ (dod >> 63)).view(np.uint64)
+    width = int(zigzag.max()).bit_length() if len(zigzag) else 0
+    payload = np.packbits(_bits(zigzag, width).ravel()).tobytes() if width else b''
+    return int(micros[0]), int(micros[1] - micros[0]), width, payload
+
+def decode_timestamps(first, delta, width, payload, count):
+    if width:
+        zigzag = _from_bits(np.unpackbits(np.frombuffer(payload, dtype=np.uint8))[:(count - 2) * width]
+                            .astype(bool).reshape(count - 2, width))
+        dod = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    else:
+        dod = np.zeros(max(count - 2, 0), dtype=np.int64)
+    deltas = delta + np.concatenate([[0], np.cumsum(dod)]) if count > 1 else np.zeros(0, dtype=np.int64)
+    return first + np.concatenate([[0], np.cumsum(deltas)]).astype(np.int64)
+
+class Block:
+    """One station's encoded run of readings, with the time span and ranges scans use to skip it"""
+
+    __slots__ = ('count', 'start', 'end', 'timestamps', 'values', 'ranges', 'nbytes')
+
+    def __init__(self, count, start, end, timestamps, values, ranges):
+        self.count = count
+        self.start = start
+        self.end = end
+        self.timestamps = timestamps  # encode_timestamps() of the readings in microseconds
+        self.values = values  # field -> encode_floats() bytes
+        self.ranges = ranges  # field -> (min, max)
+        self.nbytes = len(timestamps[3]) + sum(len(data) for data in values.values())
+
+    def decode(self, fields):
+        columns = {'timestamp': decode_timestamps(*self.timestamps, self.count) / 1e6}
+        for field in fields:
+            columns[field] = decode_floats(self.values[field], self.count)
+        return columns
+
+class CompressedSeries:
+    """
+    Per-station history of readings in compressed blocks, in memory.
+
+    Readings wait in a per-station pending row until `block_size` have
+    arrived. The row is then encoded: timestamps as delta-of-deltas and
+    each field XORed with its previous value. Rows that fill on the same
+    tick are encoded together. Station i's first block is cut short by
+    i % block_size readings, so blocks fill a few stations per tick
+    instead of all stations on the same tick. Every
+    block records its time span and each field's min/max, so a scan
+    decodes only the blocks that can match. When the encoded blocks pass
+    max_bytes, the oldest blocks are dropped first.
+    """
+
+    def __init__(self, n_stations, fields=SERIES_FIELDS, block_size=BLOCK_SIZE, max_bytes=256 * 1024 * 1024):
+        self.fields = tuple(fields)
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.pending = {field: np.zeros((n_stations, block_size)) for field in ('timestamp',) + self.fields}
+        self.pending_count = np.zeros(n_stations, dtype=np.int64)
+        self.capacity = block_size - np.arange(n_stations) % block_size
+        self.blocks = [deque() for _ in range(n_stations)]
+        self.order = deque()  # station of every block, oldest first, for eviction
+        self.stats = {'blocks': 0, 'encoded_readings': 0, 'bytes': 0, 'evicted_blocks': 0}
+        self.lock = threading.Lock()
+
+    def append(self, indices, columns):
+        """Add readings given as {field: array} (including 'timestamp') aligned with indices; stations may repeat"""
+        batch = dict(columns, station=np.asarray(indices, dtype=np.int64))
+        with self.lock:
+            for part in split_by_occurrence(batch):
+                stations = part['station']
+                slots = self.pending_count[stations]
+                for field, pending in self.pending.items():
+                    pending[stations, slots] = part[field]
+                self.pending_count[stations] += 1
+                full = stations[self.pending_count[stations] >= self.capacity[stations]]
+                for count in np.unique(self.pending_count[full]).tolist():
+                    self._encode(full[self.pending_count[full] == count], count)
+
+    def _encode(self, stations, count):
+        rows = {field: pending[stations, :count] for field, pending in self.pending.items()}
+        encoded = {field: encode_floats(rows[field]) for field in self.fields}
+        lows = {field: rows[field].min(axis=1) for field in self.fields}
+        highs = {field: rows[field].max(axis=1) for field in self.fields}
+        micros = np.round(rows['timestamp'] * 1e6).astype(np.int64)
+        for k, i in enumerate(stations.tolist()):
+            block = Block(count, float(rows['timestamp'][k].min()), float(rows['timestamp'][k].max()),
+                          encode_timestamps(micros[k]), {field: encoded[field][k] for field in self.fields},
+                          {field: (float(lows[field][k]), float(highs[field][k])) for field in self.fields})
+            self.blocks[i].append(block)
+            self.order.append(i)
+            self.stats['blocks'] += 1
+            self.stats['encoded_readings'] += block.count
+            self.stats['bytes'] += block.nbytes
+        self.pending_count[stations] = 0
+        self.capacity[stations] = self.block_size
+
+        while self.stats['bytes'] > self.max_bytes and self.order:
+            block = self.blocks[self.order.popleft()].popleft()
+            self.stats['blocks'] -= 1
+            self.stats['encoded_readings'] -= block.count
+            self.stats['bytes'] -= block.nbytes
+            self.stats['evicted_blocks'] += 1
+
+    def _index_dtype(self):
+        fields = [('station', np.int64), ('count', np.int64), ('start', np.float64), ('end', np.float64),
+                  ('ts_first', np.int64), ('ts_delta', np.int64), ('ts_width', np.int64), ('ts_bytes', np.int64)]
+        for field in self.fields:
+            fields += [(f'{field}_bytes', np.int64), (f'{field}_min', np.float64), (f'{field}_max', np.float64)]
+        return np.dtype(fields)
+
+    def export_blocks(self):
+        """
+        Every block, oldest first, as (index, payload) for checkpoints.
+
+        index is a structured array with one row per block (station, span,
+        timestamp header, byte length and range of every field); payload
+        holds each block's timestamp bytes then its field bytes, in index order.
+        """
+        with self.lock:
+            cursors = {}
+            blocks = [(i, next(cursors.setdefault(i, iter(self.blocks[i])))) for i in self.order]
+
+        index = np.zeros(len(blocks), dtype=self._index_dtype())
+        pieces = []
+        for row, (i, block) in enumerate(blocks):
+            first, delta, width, payload = block.timestamps
+            values = [block.values[field] for field in self.fields]
+            index[row] = (i, block.count, block.start, block.end, first, delta, width, len(payload),
+                          *[x for field, data in zip(self.fields, values) for x in (len(data), *block.ranges[field])])
+            pieces += [payload] + values
+        return index, np.frombuffer(b''.join(pieces), dtype=np.uint8)
+
+    def load_blocks(self, index, payload):
+        """Replace every block with the ones export_blocks() returned, oldest first"""
+        lengths = np.column_stack([index['ts_bytes']] + [index[f'{field}_bytes'] for field in self.fields])
+        starts = (np.cumsum(lengths, axis=None) - lengths.ravel()).reshape(lengths.shape)
+        if len(index) and starts[-1, -1] + lengths[-1, -1] != len(payload):
+            raise ValueError("series payload does not match its block index")
+
+        def chunk(row, column):
+            return payload[starts[row, column]:starts[row, column] + lengths[row, column]].tobytes()
+
+        blocks = [deque() for _ in self.blocks]
+        order = deque()
+        for row, entry in enumerate(index.tolist()):
+            i, count, start, end, first, delta, width = entry[:7]
+            ranges = entry[8:]
+            blocks[i].append(Block(count, start, end, (first, delta, width, chunk(row, 0)),
+                                   {field: chunk(row, k + 1) for k, field in enumerate(self.fields)},
+                                   {field: (ranges[3 * k + 1], ranges[3 * k + 2]) for k, field in enumerate(self.fields)}))
+            order.append(i)
+        with self.lock:
+            self.blocks, self.order = blocks, order
+            self.stats.update(blocks=len(index), encoded_readings=int(index['count'].sum()),
+                              bytes=int(lengths.sum()))
+
+    def scan(self, i, start=None, end=None, fields=None, ranges=None):
+        """
+        Readings of station i with start <= timestamp < end, as {field: array} oldest first.
+
+        ranges maps a field to (low, high) and keeps only readings inside
+        it; blocks whose min/max cannot overlap are skipped undecoded.
+        Returns (columns, {'decoded': n, 'skipped': n}) counting blocks.
+        """
+        fields = tuple(fields or self.fields)
+        ranges = ranges or {}
+        needed = tuple(dict.fromkeys(fields + tuple(ranges)))
+        with self.lock:
+            blocks = list(self.blocks[i])
+            count = int(self.pending_count[i])
+            pending = {field: self.pending[field][i, :count].copy() for field in ('timestamp',) + needed}
+
+        parts, decoded, skipped = [], 0, 0
+        for block in blocks:
+            if (start is not None and block.end < start) or (end is not None and block.start >= end) or \
+                    any(block.ranges[f][1] < low or block.ranges[f][0] > high for f, (low, high) in ranges.items()):
+                skipped += 1
+                continue
+            parts.append(block.decode(needed))
+            decoded += 1
+        parts.append(pending)
+
+        columns = {field: np.concatenate([part[field] for part in parts]) for field in ('timestamp',) + needed}
+        mask = np.ones(len(columns['timestamp']), dtype=bool)
+        if start is not None:
+            mask &= columns['timestamp'] >= start
+        if end is not None:
+            mask &= columns['timestamp'] < end
+        for field, (low, high) in ranges.items():
+            mask &= (columns[field] >= low) & (columns[field] <= high)
+        return {field: columns[field][mask] for field in ('timestamp',) + fields}, {'decoded': decoded, 'skipped': skipped}
+
+    def summary(self):
+        with self.lock:
+            pending = int(self.pending_count.sum())
+            stats = dict(self.stats)
+        readings = stats['encoded_readings']
+        pending_bytes = sum(p.nbytes for p in self.pending.values())
+        return dict(stats, pending_readings=pending, pending_bytes=pending_bytes, max_bytes=self.max_bytes,
+                    bytes_per_reading=round(stats['bytes'] / readings, 2) if readings else None)
@@ -0,0 +1,216 @@
+import numpy as np
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+DEFAULT_SEGMENT_NAME = 'co2_dashboard_state'
+LAYOUT_MAGIC = 0xC02DA5B1
+
+# Header words (uint64): magic, seqlock counter, tick, stations, ring capacity, readings written in total,
+# and the epoch of the producer that created the segment (a new segment gets a new epoch)
+HEADER_FIELDS = ('magic', 'sequence', 'tick', 'n_stations', 'capacity', 'written', 'epoch')
+SEQUENCE, TICK, WRITTEN, EPOCH = (HEADER_FIELDS.index(name) for name in ('sequence', 'tick', 'written', 'epoch'))
+
+# Latest value per station
+LATEST_FIELDS = (
+    ('emission', np.float64),
+    ('co2_equivalent', np.float64),
+    ('so2', np.float64),
+    ('no2', np.float64),
+    ('co', np.float64),
+    ('timestamp', np.float64),
+    ('has_data', np.uint8),
+    ('alert_level', np.uint8),
+    ('anomaly_level', np.uint8),
+    ('anomaly_score', np.float64),
+    ('source', np.uint8)
+)
+
+# Recent readings of all stations, in arrival order
+RING_FIELDS = (
+    ('station', np.int32),
+    ('timestamp', np.float64),
+    ('emission', np.float64),
+    ('co2_equivalent', np.float64),
+    ('so2', np.float64),
+    ('no2', np.float64),
+    ('co', np.float64),
+    ('anomaly_level', np.uint8),
+    ('source', np.uint8)
+)
+
+# Reading sources stored as codes
+SOURCE_NAMES = ('simulator', 'gateway')
+
+def _layout(n_stations, capacity):
+    """Byte offsets of every array in the segment, 8-byte aligned"""
+    offsets = {}
+    position = len(HEADER_FIELDS) * 8
+    for prefix, fields, length in (('latest', LATEST_FIELDS, n_stations), ('ring', RING_FIELDS, capacity)):
+        for name, dtype in fields:
+            offsets[(prefix, name)] = (position, dtype, length)
+            position += -(-np.dtype(dtype).itemsize * length // 8) * 8
+    return offsets, position
+
+class SharedTickBuffer:
+    """
+    Latest per-station state and a ring of recent readings in one shared memory segment.
+    
+    A single producer process writes, any number of reader processes map
+    the same segment. Consistency uses a sequence lock: the writer makes the
+    counter odd before changing anything and even again afterwards, and a
+    reader retries whenever the counter was odd or moved while it read.
+    Readers therefore never block the writer. `latest` and `ring` are
+    zero-copy views of the segment; read() returns a validated copy.
+    """
+    
+    def __init__(self, segment, owner):
+        self.segment = segment
+        self.owner = owner
+        self.header = np.ndarray(len(HEADER_FIELDS), dtype=np.uint64, buffer=segment.buf)
+        self.n_stations = int(self.header[HEADER_FIELDS.index('n_stations')])
+        self.capacity = int(self.header[HEADER_FIELDS.index('capacity')])
+        
+        offsets, _ = _layout(self.n_stations, self.capacity)
+        self.latest = {}
+        self.ring = {}
+        for (prefix, name), (offset, dtype, length) in offsets.items():
+            view = np.ndarray(length, dtype=dtype, buffer=segment.buf, offset=offset)
+            (self.latest if prefix == 'latest' else self.ring)[name] = view
+    
+    @classmethod
+    def create(cls, n_stations, capacity, name=DEFAULT_SEGMENT_NAME):
+        """Producer side: (re)create the segment, replacing one left behind by a crashed producer"""
+        _, size = _layout(n_stations, capacity)
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(len(HEADER_FIELDS), dtype=np.uint64, buffer=segment.buf)
+        header[:] = 0
+        header[HEADER_FIELDS.index('magic')] = LAYOUT_MAGIC
+        header[HEADER_FIELDS.index('n_stations')] = n_stations
+        header[HEADER_FIELDS.index('capacity')] = capacity
+        header[EPOCH] = time.time_ns()
+        return cls(segment, owner=True)
+    
+    @classmethod
+    def attach(cls, name=DEFAULT_SEGMENT_NAME):
+        """Reader side: map an existing segment (raises FileNotFoundError until the producer has started)"""
+        segment = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the producer's segment when they exit
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        header = np.ndarray(len(HEADER_FIELDS), dtype=np.uint64, buffer=segment.buf)
+        if int(header[HEADER_FIELDS.index('magic')]) != LAYOUT_MAGIC:
+            segment.close()
+            raise ValueError(f"shared memory segment {name!r} has an unknown layout")
+        return cls(segment, owner=False)
+    
+    @staticmethod
+    def current_epoch(name=DEFAULT_SEGMENT_NAME):
+        """
+        Epoch of the segment now registered under `name`, None if there is none.
+        
+        A reader's mapping outlives the segment: when the producer restarts
+        and recreates it, the old mapping stays valid but is never written
+        again. Comparing this with the mapped epoch tells the reader to
+        reattach.
+        """
+        try:
+            segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        header = np.ndarray(len(HEADER_FIELDS), dtype=np.uint64, buffer=segment.buf)
+        epoch = int(header[EPOCH]) if int(header[HEADER_FIELDS.index('magic')]) == LAYOUT_MAGIC else None
+        del header
+        segment.close()
+        return epoch
+    
+    @property
+    def epoch(self):
+        return int(self.header[EPOCH])
+    
+    @property
+    def written(self):
+        return int(self.header[WRITTEN])
+    
+    def read_begin(self):
+        """Start a lock-free read: wait out a write in progress, returns the sequence to validate against"""
+        while True:
+            sequence = int(self.header[SEQUENCE])
+            if sequence % 2 == 0:
+                return sequence
+            time.sleep(0)
+    
+    def read_retry(self, sequence):
+        """True when a write happened since read_begin() returned `sequence`, i.e. the read must be repeated"""
+        return int(self.header[SEQUENCE]) != sequence
+    
+    def write(self, latest, ring, tick):
+        """
+        Producer: publish one tick.
+        
+        latest: {'indices': station indices, field: values...} for LATEST_FIELDS
+        ring: {field: values} for RING_FIELDS, the readings of this tick in order
+        """
+        header = self.header
+        header[SEQUENCE] += 1  # odd: write in progress
+        
+        indices = latest['indices']
+        for name, _ in LATEST_FIELDS:
+            if name in latest:
+                self.latest[name][indices] = latest[name]
+        
+        count = len(ring['station'])
+        if count:
+            # Keep only what fits, then write with wrap-around
+            skip = max(0, count - self.capacity)
+            start = (int(header[WRITTEN]) + skip) % self.capacity
+            slots = (start + np.arange(count - skip)) % self.capacity
+            for name, _ in RING_FIELDS:
+                self.ring[name][slots] = ring[name][skip:]
+            header[WRITTEN] += count
+        
+        header[TICK] = tick
+        header[SEQUENCE] += 1  # even: consistent again
+    
+    def read(self, since_written=0, max_retries=1000):
+        """
+        Reader: consistent copy of the latest arrays and of the ring readings written after `since_written`.
+        
+        Returns (snapshot, written) where snapshot holds 'latest', 'ring'
+        (oldest first), 'first' (how many readings were written before the
+        first ring entry), 'tick' and 'lapped' (True when readings were
+        overwritten before this reader saw them).
+        """
+        for attempt in range(max_retries):
+            sequence = self.read_begin()
+            written = self.written
+            tick = int(self.header[TICK])
+            first = max(since_written, written - self.capacity)
+            slots = np.arange(first, written) % self.capacity
+            snapshot = {
+                'latest': {name: view.copy() for name, view in self.latest.items()},
+                'ring': {name: view[slots] for name, view in self.ring.items()},
+                'first': first,
+                'tick': tick,
+                'lapped': first > since_written
+            }
+            
+            if not self.read_retry(sequence):
+                return snapshot, written
+        raise TimeoutError("shared state kept changing while being read")
+    
+    def close(self):
+        # Views into the buffer must go before the mapping can be closed
+        self.header = self.latest = self.ring = None
+        self.segment.close()
+        if self.owner:
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
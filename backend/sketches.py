@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+def _named_quantiles(values):
+    return {f'p{round(q * 100)}': round(float(v), 3) if np.isfinite(v) else None for q, v in zip(QUANTILES, values)}
+
+class QuantileSketches:
+    """
+    Mergeable emission quantile sketches per station, per group and overall, updated at ingest.
+
+    Each sketch is a row of counts over logarithmic buckets (the DDSketch
+    layout): bucket k > 0 holds values in (min_value * gamma^(k-1),
+    min_value * gamma^k] and bucket 0 everything up to min_value. With
+    gamma = (1 + alpha) / (1 - alpha), any quantile read back is within
+    relative error alpha of a true value. Sketches merge by adding counts,
+    so a group's sketch is the sum of its stations' sketches. Here group
+    sketches are kept up to date directly, with the same np.add.at as the
+    stations. Size is fixed by the bucket count, however many readings
+    were added. Display histograms are the same counts summed over
+    `display_group` adjacent buckets, so they need no separate pass.
+    """
+
+    def __init__(self, n_stations, groupings, alpha=0.02, min_value=0.1, max_value=1e6, display_group=8):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = np.log(self.gamma)
+        self.min_value = min_value
+        self.n_buckets = int(np.ceil(np.log(max_value / min_value) / self.log_gamma)) + 1
+        self.display_group = display_group
+
+        # uint32 keeps 50k stations x ~400 buckets at 80 MB
+        self.stations = np.zeros((n_stations, self.n_buckets), dtype=np.uint32)
+        self.total = np.zeros(self.n_buckets, dtype=np.int64)
+        self.groups = {}
+        for by, labels in groupings.items():
+            names, group = np.unique(np.asarray(labels).astype(str), return_inverse=True)
+            self.groups[by] = (names, group, np.zeros((len(names), self.n_buckets), dtype=np.int64))
+        self.lock = threading.Lock()
+
+    def buckets(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            keys = np.ceil(np.log(values / self.min_value) / self.log_gamma)
+        return np.clip(np.nan_to_num(keys, nan=0.0, neginf=0.0), 0, self.n_buckets - 1).astype(np.int64)
+
+    def update(self, indices, values):
+        """Add one value per entry of indices (stations may repeat)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return
+        keys = self.buckets(values)
+        with self.lock:
+            np.add.at(self.stations, (indices, keys), 1)
+            np.add.at(self.total, keys, 1)
+            for _, group, counts in self.groups.values():
+                np.add.at(counts, (group[indices], keys), 1)
+
+    def values(self, keys):
+        """Representative value of each bucket: the point with equal relative error to both bounds"""
+        keys = np.asarray(keys)
+        upper = self.min_value * self.gamma ** keys.astype(np.float64)
+        return np.where(keys > 0, upper * 2 / (self.gamma + 1), 0.0)
+
+    def quantiles(self, counts, qs=QUANTILES):
+        """(rows, len(qs)) quantile estimates for a (rows, buckets) count matrix, NaN for empty rows"""
+        counts = np.atleast_2d(counts)
+        cumulative = np.cumsum(counts, axis=1)
+        total = cumulative[:, -1]
+        result = np.full((len(counts), len(qs)), np.nan)
+        for j, q in enumerate(qs):
+            # First bucket whose cumulative count reaches rank q*(n-1), as DDSketch does
+            rank = q * np.maximum(total - 1, 0)
+            keys = (cumulative <= rank[:, None]).sum(axis=1)
+            result[:, j] = np.where(total > 0, self.values(np.minimum(keys, self.n_buckets - 1)), np.nan)
+        return result
+
+    def histogram(self, counts):
+        """Display histogram of one count row: {'edges', 'counts'}, trimmed to the occupied range"""
+        counts = np.asarray(counts)
+        starts = np.arange(1, self.n_buckets, self.display_group)
+        binned = np.concatenate([counts[:1], np.add.reduceat(counts[1:], starts - 1)])
+        edges = np.concatenate([[0.0], self.min_value * self.gamma ** (np.append(starts, self.n_buckets) - 1.0)])
+        occupied = np.flatnonzero(binned)
+        if not len(occupied):
+            return {'edges': [], 'counts': []}
+        first, last = occupied[0], occupied[-1]
+        return {
+            'edges': [float(f'{edge:.4g}') for edge in edges[first:last + 2]],
+            'counts': binned[first:last + 1].tolist()
+        }
+
+    def summary(self, counts, histogram=True):
+        """Count, p50/p90/p99 and (optionally) display histogram of one sketch"""
+        counts = np.asarray(counts)
+        result = {'count': int(counts.sum()), 'quantiles': _named_quantiles(self.quantiles(counts)[0])}
+        if histogram:
+            result['histogram'] = self.histogram(counts)
+        return result
+
+    def overall(self, histogram=True):
+        with self.lock:
+            counts = self.total.copy()
+        return self.summary(counts, histogram)
+
+    def station(self, i, histogram=True):
+        with self.lock:
+            counts = self.stations[i].copy()
+        return self.summary(counts, histogram)
+
+    def by_group(self, by, histogram=True):
+        """Summary of every group of one grouping, quantiles computed for all groups at once"""
+        names, _, counts = self.groups[by]
+        with self.lock:
+            counts = counts.copy()
+        quantiles = self.quantiles(counts)
+        return [{
+            'name': name,
+            'count': int(counts[k].sum()),
+            'quantiles': _named_quantiles(quantiles[k]),
+            **({'histogram': self.histogram(counts[k])} if histogram else {})
+        } for k, name in enumerate(names.tolist())]
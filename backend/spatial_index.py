@@ -0,0 +1,132 @@
+import numpy as np
+
+KM_PER_DEGREE = 111.32
+
+class SpatialIndex:
+    """
+    Uniform bucket grid over station coordinates for vectorized k-nearest queries.
+    
+    Coordinates are projected equirectangularly around the mean latitude, which
+    is accurate to well under a percent over an area the size of Rwanda.
+    Distances are returned in kilometres.
+    """
+    
+    MAX_CANDIDATES = 2000000  # bound on the query x candidate matrix built per step
+    
+    def __init__(self, lats, lons, bucket_size_km=None, target_per_bucket=4):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.n = len(self.lats)
+        self.lat0 = float(self.lats.mean()) if self.n else 0.0
+        self.cos_lat0 = np.cos(np.radians(self.lat0))
+        
+        self.x, self.y = self.project(self.lats, self.lons)
+        self.x_min = float(self.x.min()) if self.n else 0.0
+        self.y_min = float(self.y.min()) if self.n else 0.0
+        
+        if bucket_size_km is None:
+            # Size buckets so that an average bucket holds a handful of stations
+            area = max((np.ptp(self.x) if self.n else 1.0) * (np.ptp(self.y) if self.n else 1.0), 1.0)
+            bucket_size_km = np.sqrt(area * target_per_bucket / max(self.n, 1))
+        self.bucket_size = float(bucket_size_km)
+        
+        self.n_cols = int((np.ptp(self.x) if self.n else 0) // self.bucket_size) + 1
+        self.n_rows = int((np.ptp(self.y) if self.n else 0) // self.bucket_size) + 1
+        cols, rows = self._bucket_coords(self.x, self.y)
+        bucket_ids = rows * self.n_cols + cols
+        
+        # Padded member table: bucket -> station indices (-1 = empty slot)
+        counts = np.bincount(bucket_ids, minlength=self.n_rows * self.n_cols)
+        order = np.argsort(bucket_ids, kind='stable')
+        self.members = np.full((self.n_rows * self.n_cols, max(int(counts.max()) if self.n else 1, 1)), -1, dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        slot = np.arange(self.n) - starts[bucket_ids[order]]
+        self.members[bucket_ids[order], slot] = order
+    
+    def project(self, lats, lons):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return lons * KM_PER_DEGREE * self.cos_lat0, lats * KM_PER_DEGREE
+    
+    def _bucket_coords(self, x, y):
+        cols = np.clip(((x - self.x_min) // self.bucket_size).astype(np.int64), 0, self.n_cols - 1)
+        rows = np.clip(((y - self.y_min) // self.bucket_size).astype(np.int64), 0, self.n_rows - 1)
+        return cols, rows
+    
+    def _covered(self, qx, qy, qcols, qrows, radius):
+        """Distance from each query to the nearest edge of its searched window (inf past the grid edge)"""
+        left = np.where(qcols - radius <= 0, np.inf, qx - (self.x_min + (qcols - radius) * self.bucket_size))
+        right = np.where(qcols + radius >= self.n_cols - 1, np.inf,
+                         self.x_min + (qcols + radius + 1) * self.bucket_size - qx)
+        bottom = np.where(qrows - radius <= 0, np.inf, qy - (self.y_min + (qrows - radius) * self.bucket_size))
+        top = np.where(qrows + radius >= self.n_rows - 1, np.inf,
+                       self.y_min + (qrows + radius + 1) * self.bucket_size - qy)
+        return np.minimum(np.minimum(left, right), np.minimum(bottom, top))
+    
+    def query(self, lats, lons, k=8, exclude_self=False):
+        """
+        k nearest stations for each query point.
+        
+        Returns (distances_km, indices), both shaped (len(points), k) and sorted
+        by distance. With exclude_self the queries are the stations themselves
+        (same order) and each station is left out of its own neighbour list.
+        """
+        qx, qy = self.project(lats, lons)
+        n_queries = len(qx)
+        k_eff = min(k, self.n - (1 if exclude_self else 0))
+        distances = np.full((n_queries, k), np.inf)
+        indices = np.full((n_queries, k), -1, dtype=np.int64)
+        if n_queries == 0 or k_eff <= 0:
+            return distances, indices
+        
+        qcols, qrows = self._bucket_coords(qx, qy)
+        pending = np.arange(n_queries)
+        max_radius = max(self.n_rows, self.n_cols)
+        
+        # Search ring by ring (Chebyshev distance in buckets), merging into the running k best
+        for radius in range(max_radius + 1):
+            if not len(pending):
+                break
+            dr, dc = self._ring_offsets(radius)
+            chunk = max(1, self.MAX_CANDIDATES // (len(dr) * self.members.shape[1]))
+            
+            for start in range(0, len(pending), chunk):
+                q = pending[start:start + chunk]
+                rows = qrows[q, None] + dr
+                cols = qcols[q, None] + dc
+                inside = (rows >= 0) & (rows < self.n_rows) & (cols >= 0) & (cols < self.n_cols)
+                bucket = np.where(inside, rows * self.n_cols + cols, 0)
+                candidates = np.where(inside[:, :, None], self.members[bucket], -1).reshape(len(q), -1)
+                if exclude_self:
+                    candidates[candidates == q[:, None]] = -1
+                
+                valid = candidates >= 0
+                safe = np.where(valid, candidates, 0)
+                d = np.hypot(self.x[safe] - qx[q, None], self.y[safe] - qy[q, None])
+                d[~valid] = np.inf
+                
+                merged_d = np.concatenate([distances[q, :k_eff], d], axis=1)
+                merged_i = np.concatenate([indices[q, :k_eff], candidates], axis=1)
+                nearest = np.argpartition(merged_d, k_eff - 1, axis=1)[:, :k_eff]
+                nd = np.take_along_axis(merged_d, nearest, axis=1)
+                order = np.argsort(nd, axis=1)
+                nearest = np.take_along_axis(nearest, order, axis=1)
+                distances[q, :k_eff] = np.take_along_axis(merged_d, nearest, axis=1)
+                indices[q, :k_eff] = np.take_along_axis(merged_i, nearest, axis=1)
+            
+            # Exact once the k-th neighbour lies within the fully searched area around the query
+            done = distances[pending, k_eff - 1] <= self._covered(
+                qx[pending], qy[pending], qcols[pending], qrows[pending], radius)
+            pending = pending[~done]
+        
+        return distances, indices
+    
+    @staticmethod
+    def _ring_offsets(radius):
+        """Bucket offsets at exactly the given Chebyshev radius"""
+        if radius == 0:
+            return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        span = np.arange(-radius, radius + 1)
+        dr = np.concatenate([np.full(len(span), -radius), np.full(len(span), radius), span[1:-1], span[1:-1]])
+        dc = np.concatenate([span, span, np.full(len(span) - 2, -radius), np.full(len(span) - 2, radius)])
+        return dr, dc
@@ -0,0 +1,124 @@
+import numpy as np
+import threading
+from datetime import datetime
+
+class StationState:
+    """
+    Latest reading of every station held as parallel arrays.
+    
+    Station i is the i-th key of the locations dict. The generator publishes
+    each tick through update(); readers use the arrays (or latest records)
+    instead of scanning real_time_data for the newest point of each station.
+    """
+    
+    def __init__(self, locations):
+        self.names = list(locations.keys())
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        
+        self.lat = np.array([locations[name]['lat'] for name in self.names], dtype=np.float64)
+        self.lon = np.array([locations[name]['lon'] for name in self.names], dtype=np.float64)
+        self.types = np.array([locations[name].get('type', 'unknown') for name in self.names], dtype=object)
+        self.regions = np.array([locations[name].get('region', 'Unknown') for name in self.names], dtype=object)
+        
+        self.emission = np.zeros(n, dtype=np.float64)
+        self.co2_equivalent = np.zeros(n, dtype=np.float64)
+        self.so2 = np.zeros(n, dtype=np.float64)
+        self.no2 = np.zeros(n, dtype=np.float64)
+        self.co = np.zeros(n, dtype=np.float64)
+        self.timestamp = np.full(n, np.nan)  # epoch seconds
+        self.has_data = np.zeros(n, dtype=bool)
+        self.latest = [None] * n  # latest full record per station
+        
+        # Tick at which each station last changed, for incremental consumers
+        self.tick = 0
+        self.updated_tick = np.zeros(n, dtype=np.int64)
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def update(self, records):
+        """Apply one tick worth of records (dicts carrying 'location_name')"""
+        indices = []
+        for record in records:
+            i = self.index.get(record.get('location_name'))
+            if i is not None:
+                indices.append(i)
+        if not indices:
+            return np.array([], dtype=np.int64)
+        
+        valid = [r for r in records if r.get('location_name') in self.index]
+        idx = np.array(indices, dtype=np.int64)
+        
+        with self.lock:
+            self.tick += 1
+            self.emission[idx] = [r['emission'] for r in valid]
+            self.co2_equivalent[idx] = [r['co2_equivalent'] for r in valid]
+            self.so2[idx] = [r['gas_levels']['SO2'] for r in valid]
+            self.no2[idx] = [r['gas_levels']['NO2'] for r in valid]
+            self.co[idx] = [r['gas_levels']['CO'] for r in valid]
+            self.timestamp[idx] = [datetime.fromisoformat(r['timestamp']).timestamp() for r in valid]
+            self.has_data[idx] = True
+            for i, record in zip(indices, valid):
+                self.latest[i] = record
+            self.updated_tick[idx] = self.tick
+        return idx
+    
+    def update_arrays(self, indices, columns):
+        """
+        Like update() for readings already held as arrays: columns maps each
+        reading field (emission, co2_equivalent, so2, no2, co, timestamp) to
+        values aligned with indices. Latest records are left to the caller.
+        """
+        idx = np.asarray(indices, dtype=np.int64)
+        if not len(idx):
+            return idx
+        
+        with self.lock:
+            self.tick += 1
+            for field in ('emission', 'co2_equivalent', 'so2', 'no2', 'co', 'timestamp'):
+                getattr(self, field)[idx] = columns[field]
+            self.has_data[idx] = True
+            self.updated_tick[idx] = self.tick
+        return idx
+    
+    def changed_since(self, tick):
+        """Indices of stations updated after the given tick"""
+        return np.flatnonzero(self.updated_tick > tick)
+    
+    def get_latest(self, location_name):
+        i = self.index.get(location_name)
+        return self.latest[i] if i is not None else None
+
+class StationWindow:
+    """
+    Fixed-length ring buffer of recent readings per station, one (window, n) array per field.
+    
+    Stations advance their own write position, so they can report at
+    different rates. Unfilled slots hold NaN.
+    """
+    
+    def __init__(self, n_stations, window, fields):
+        self.window = window
+        self.fields = tuple(fields)
+        self.buffers = {field: np.full((window, n_stations), np.nan) for field in self.fields}
+        self.position = np.zeros(n_stations, dtype=np.int64)
+        self.count = np.zeros(n_stations, dtype=np.int64)
+    
+    def push(self, indices, values):
+        """Append one reading for each station in indices; values maps field -> array aligned with indices"""
+        slots = self.position[indices]
+        for field in self.fields:
+            self.buffers[field][slots, indices] = values[field]
+        self.position[indices] = (slots + 1) % self.window
+        self.count[indices] = np.minimum(self.count[indices] + 1, self.window)
+    
+    def history(self, field, indices):
+        """(len(indices), window) matrix of stored readings, NaN where not yet filled (slot order, not time order)"""
+        return self.buffers[field][:, indices].T
+    
+    def ordered(self, field, indices):
+        """Like history() but oldest-to-newest for each station"""
+        offsets = (self.position[indices, None] + np.arange(self.window)) % self.window
+        return self.buffers[field][offsets, indices[:, None]]
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other by plain name, as when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from station_state import StationState
+
+LOCATIONS = {
+    'Kigali': {'lat': -1.95, 'lon': 30.06, 'type': 'urban', 'region': 'Central Rwanda (Kigali Area)'},
+    'Musanze': {'lat': -1.50, 'lon': 29.63, 'type': 'industrial', 'region': 'Northern Province'},
+    'Rubavu': {'lat': -1.68, 'lon': 29.26, 'type': 'coastal', 'region': 'Western Province (Lake Kivu)'}
+}
+
+@pytest.fixture
+def station_state():
+    return StationState(LOCATIONS)
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+
+from alerts import AlertEngine, AlertNotifier
+
+class RecordingNotifier:
+    def __init__(self):
+        self.events = []
+    
+    def submit(self, event):
+        self.events.append(event)
+
+def make_engine(station_state, **rule):
+    return AlertEngine(station_state, {'default': dict({'medium': 50.0, 'high': 100.0}, **rule)},
+                       notifier=RecordingNotifier())
+
+def tick(engine, station_state, t, emission, i=0):
+    station_state.emission[i] = emission
+    station_state.timestamp[i] = t
+    return engine.evaluate(np.array([i]))
+
+def test_level_changes_only_after_min_duration(station_state):
+    engine = make_engine(station_state, min_duration_s=6.0)
+    assert tick(engine, station_state, 0, 120) == []
+    assert tick(engine, station_state, 3, 120) == []
+    assert engine.level[0] == 1
+    
+    events = tick(engine, station_state, 6, 120)
+    assert [(e['kind'], e['status'], e['previous_status']) for e in events] == [('raised', 'HIGH', 'LOW')]
+    assert engine.level[0] == 3
+
+def test_short_spike_is_not_confirmed(station_state):
+    engine = make_engine(station_state, min_duration_s=6.0)
+    tick(engine, station_state, 0, 120)
+    tick(engine, station_state, 3, 10)
+    tick(engine, station_state, 6, 10)
+    assert engine.level[0] == 1
+    assert list(engine.history) == []
+
+def test_hysteresis_holds_the_level_near_the_threshold(station_state):
+    engine = make_engine(station_state, min_duration_s=0.0, hysteresis=0.1)
+    tick(engine, station_state, 0, 120)
+    # 95 is below high (100) but not by the 10% margin
+    assert tick(engine, station_state, 3, 95) == []
+    assert engine.level[0] == 3
+    
+    events = tick(engine, station_state, 6, 85)
+    assert [(e['kind'], e['status']) for e in events] == [('deescalated', 'MEDIUM')]
+
+def test_deduplicated_transitions_stay_in_history(station_state):
+    engine = make_engine(station_state, min_duration_s=0.0, dedup_window_s=100.0)
+    tick(engine, station_state, 0, 120)
+    tick(engine, station_state, 10, 10)
+    tick(engine, station_state, 20, 120)
+    tick(engine, station_state, 200, 10)
+    tick(engine, station_state, 210, 120)
+    
+    assert [(e['kind'], e['notified']) for e in engine.history] == [
+        ('raised', True), ('resolved', True), ('raised', False), ('resolved', True), ('raised', True)]
+    assert [e['alert_id'] for e in engine.notifier.events] == [1, 2, 4, 5]
+    assert engine.level[0] == 3
+
+def test_rules_resolve_by_type_then_region(station_state):
+    config = {'default': {'high': 100.0}, 'by_type': {'industrial': {'high': 80.0}},
+              'by_region': {'Northern Province': {'high': 90.0}}}
+    engine = AlertEngine(station_state, config)
+    assert engine.high.tolist() == [100.0, 90.0, 100.0]
+
+def test_notifier_counts_retries_and_failures():
+    class FailingSink:
+        name = 'failing'
+        
+        def send(self, event):
+            raise IOError("unreachable")
+    
+    notifier = AlertNotifier([FailingSink()], max_retries=1, base_backoff=0.0)
+    notifier.submit({'alert_id': 1})
+    deadline = time.monotonic() + 5
+    while not notifier.stats()[0]['failed'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = notifier.stats()[0]
+    assert (stats['failed'], stats['retries'], stats['delivered']) == (1, 1, 0)
+
+def test_rate_limited_sink_throttles_beyond_its_burst():
+    class RecordingSink:
+        name = 'recording'
+        
+        def __init__(self):
+            self.sent = []
+        
+        def send(self, event):
+            self.sent.append(time.monotonic())
+    
+    sink = RecordingSink()
+    notifier = AlertNotifier([sink], rate_limits=[(20, 2)])
+    for alert_id in range(4):
+        notifier.submit({'alert_id': alert_id})
+    deadline = time.monotonic() + 5
+    while notifier.stats()[0]['delivered'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = notifier.stats()[0]
+    assert (stats['delivered'], stats['throttled']) == (4, 2)
+    # Two sends from the burst, then one token every 50 ms
+    assert sink.sent[-1] - sink.sent[0] >= 0.09
+
+def test_sink_rate_limits_come_from_the_sink_or_notifier_config():
+    notifier = AlertNotifier.from_config({
+        'sinks': [{'type': 'log', 'rate_per_s': 2, 'burst': 3}, {'type': 'log'}],
+        'notifier': {'rate_per_s': 0.5, 'queue_size': 10}
+    })
+    buckets = [channel['bucket'] for channel in notifier.channels]
+    assert [(bucket.rate, bucket.capacity) for bucket in buckets] == [(2.0, 3.0), (0.5, 10.0)]
+    assert AlertNotifier.from_config({'sinks': [{'type': 'log'}]}).channels[0]['bucket'] is None
@@ -0,0 +1,52 @@
+import threading
+
+import numpy as np
+import pytest
+
+from checkpoint import Checkpointer, read_checkpoint, write_checkpoint
+
+def test_round_trip_keeps_arrays_and_meta(tmp_path):
+    path = str(tmp_path / 'state.bin')
+    rows = np.zeros(3, dtype=[('station', '<i4'), ('timestamp', '<f8'), ('emission', '<f8')])
+    rows['station'] = [2, 0, 1]
+    rows['emission'] = [1.5, 2.5, 3.5]
+    arrays = {'emission': np.arange(5, dtype=np.float64), 'level': np.array([1, 3, 2], dtype=np.uint8),
+              'matrix': np.arange(12).reshape(3, 4), 'rows': rows, 'empty': np.zeros(0, dtype=np.int64)}
+    
+    size = write_checkpoint(path, arrays, {'tick': 7, 'names': ['a', 'b']})
+    meta, restored = read_checkpoint(path)
+    
+    assert size == (tmp_path / 'state.bin').stat().st_size
+    assert meta == {'tick': 7, 'names': ['a', 'b']}
+    assert set(restored) == set(arrays)
+    for name, array in arrays.items():
+        assert restored[name].dtype == array.dtype
+        np.testing.assert_array_equal(restored[name], array)
+
+def test_object_arrays_are_refused(tmp_path):
+    with pytest.raises(ValueError):
+        write_checkpoint(str(tmp_path / 'state.bin'), {'names': np.array(['a'], dtype=object)}, {})
+
+def test_other_files_are_not_read_as_checkpoints(tmp_path):
+    path = tmp_path / 'state.bin'
+    path.write_bytes(b'not a checkpoint at all')
+    with pytest.raises(ValueError):
+        read_checkpoint(str(path))
+
+def test_checkpointer_restores_what_it_saved(tmp_path):
+    live = {'emission': np.array([1.0, 2.0])}
+    checkpointer = Checkpointer(str(tmp_path / 'state.bin'), lambda: ({'emission': live['emission'].copy()}, {'tick': 3}),
+                                lock=threading.Lock())
+    checkpointer.save()
+    live['emission'][:] = 0
+    
+    meta = checkpointer.restore(lambda meta, arrays: np.copyto(live['emission'], arrays['emission']))
+    assert meta['tick'] == 3 and 'saved_at' in meta
+    assert live['emission'].tolist() == [1.0, 2.0]
+    assert checkpointer.stats['restored_tick'] == 3
+
+def test_missing_or_broken_checkpoint_restores_nothing(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path / 'state.bin'), None, lock=threading.Lock())
+    assert checkpointer.restore(lambda meta, arrays: None) is None
+    (tmp_path / 'state.bin').write_bytes(b'garbage')
+    assert checkpointer.restore(lambda meta, arrays: None) is None
@@ -0,0 +1,63 @@
+import threading
+
+from coalesce import SingleFlight
+
+def test_same_generation_is_computed_once():
+    flight = SingleFlight()
+    calls = []
+    for _ in range(3):
+        assert flight.run('a', 1, lambda: calls.append(1) or 'body') == 'body'
+    assert len(calls) == 1
+    assert flight.counts() == {('a', 'computed'): 1, ('a', 'memoized'): 2, ('a', 'shared'): 0}
+
+def test_concurrent_callers_share_one_computation():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'body'
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.run('a', 1, compute)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.run('a', 1, compute)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ['body', 'body'] and len(calls) == 1
+
+def test_a_newer_generation_drops_older_entries():
+    flight = SingleFlight(size=len)
+    for key in ('a', 'b', 'c'):
+        flight.run(key, 1, lambda: 'x' * 10)
+    flight.run('a', 2, lambda: 'y' * 10)
+    assert list(flight.memo) == ['a'] and flight.memo_bytes == 10
+    # A late result of an older generation is not memoized
+    flight.run('b', 1, lambda: 'x' * 10)
+    assert list(flight.memo) == ['a']
+
+def test_memo_is_bounded_by_total_bytes():
+    flight = SingleFlight(max_bytes=25, size=len)
+    for key in ('a', 'b', 'c'):
+        flight.run(key, 1, lambda: 'x' * 10)
+    flight.run('big', 1, lambda: 'x' * 30)
+    assert list(flight.memo) == ['b', 'c'] and flight.memo_bytes == 20
+
+def test_errors_are_not_memoized():
+    flight = SingleFlight()
+    
+    def fail():
+        raise ValueError("boom")
+    
+    for _ in range(2):
+        try:
+            flight.run('a', 1, fail)
+        except ValueError:
+            pass
+    assert flight.counts()[('a', 'computed')] == 2 and flight.memo == {}
@@ -0,0 +1,59 @@
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ingest import parse_ndjson
+
+def lines(*readings):
+    return '\n'.join(r if isinstance(r, str) else json.dumps(r) for r in readings)
+
+def test_valid_lines_become_a_batch(station_state):
+    hour_ago = float(int(time.time()) - 3600)
+    body = lines({'location_name': 'Musanze', 'so2': 1e-5, 'no2': 2e-5, 'co': 0.03, 'timestamp': hour_ago},
+                 '',
+                 {'location_name': 'Kigali', 'so2': 2e-5, 'no2': 3e-5, 'co': 0.04,
+                  'timestamp': datetime.fromtimestamp(hour_ago).isoformat()})
+    batch, errors = parse_ndjson(body, station_state)
+    assert errors == []
+    assert batch['station'].tolist() == [1, 0]
+    assert batch['timestamp'].tolist() == [hour_ago, hour_ago]
+    assert batch['co'].tolist() == [0.03, 0.04]
+    assert batch['source'].tolist() == ['gateway', 'gateway']
+
+def test_bad_lines_are_reported_per_line(station_state):
+    body = lines({'location_name': 'Kigali', 'so2': 1e-5, 'no2': 2e-5, 'co': 0.03},
+                 '[1, 2, 3]',
+                 '42',
+                 'not json',
+                 {'location_name': 'Nowhere', 'so2': 1e-5, 'no2': 2e-5, 'co': 0.03},
+                 {'location_name': 'Kigali', 'so2': 1e-5, 'no2': 2e-5},
+                 {'location_name': 'Kigali', 'so2': 1e-5, 'no2': 2e-5, 'co': 0.03, 'lat': 0.0})
+    batch, errors = parse_ndjson(body, station_state)
+    assert len(batch['station']) == 1
+    assert [e['line'] for e in errors] == [2, 3, 4, 5, 6, 7]
+    assert errors[0]['error'] == 'expected a JSON object, got list'
+    assert errors[1]['error'] == 'expected a JSON object, got int'
+    assert errors[4]['error'] == "missing field 'co'"
+
+def test_negative_and_non_finite_values_are_dropped(station_state):
+    body = lines('{"location_name": "Kigali", "so2": -1, "no2": 0, "co": 0}',
+                 '{"location_name": "Rubavu", "so2": NaN, "no2": 0, "co": 0}',
+                 '{"location_name": "Musanze", "so2": 0, "no2": 0, "co": 0}')
+    batch, errors = parse_ndjson(body, station_state)
+    assert batch['station'].tolist() == [1]
+    assert np.isfinite(batch['so2']).all()
+    assert errors == [{'error': '2 readings with negative or non-finite values dropped'}]
+
+def test_out_of_range_timestamps_are_dropped_with_the_valid_lines_kept(station_state):
+    reading = {'location_name': 'Kigali', 'so2': 1e-5, 'no2': 2e-5, 'co': 0.03}
+    body = lines(dict(reading, timestamp=1e20),
+                 dict(reading, location_name='Musanze'),
+                 dict(reading, timestamp=-1e15),
+                 dict(reading, timestamp=time.time() + 86400),
+                 dict(reading, timestamp=True))
+    batch, errors = parse_ndjson(body, station_state)
+    assert batch['station'].tolist() == [1]
+    assert errors[0] == {'line': 5, 'error': 'timestamp must be an ISO 8601 string or epoch seconds'}
+    assert errors[1]['error'].startswith('3 readings with timestamps more than 30 days old')
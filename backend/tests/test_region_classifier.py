@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from region_classifier import BOUNDARY, OUTSIDE, RegionClassifier, classify_by_thresholds
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'boundaries.geojson')
+
+def test_grid_lookup_matches_the_exact_polygon_test():
+    classifier = RegionClassifier(FIXTURE, cell_size=0.05)
+    assert classifier.polygon_mode
+    assert (classifier.grid == BOUNDARY).any() and (classifier.grid >= 0).any()
+    
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(-3.1, -0.9, 20000)
+    lons = rng.uniform(28.9, 30.8, 20000)
+    labels = classifier.lookup(lats, lons)
+    np.testing.assert_array_equal(labels, classifier._exact_labels(lats, lons))
+    
+    # Both the grid-resolved and the exact path were taken
+    rows = np.floor((lats - classifier.lat_min) / classifier.cell_size).astype(np.int64)
+    cols = np.floor((lons - classifier.lon_min) / classifier.cell_size).astype(np.int64)
+    in_grid = (rows >= 0) & (rows < classifier.grid.shape[0]) & (cols >= 0) & (cols < classifier.grid.shape[1])
+    cells = classifier.grid[rows[in_grid], cols[in_grid]]
+    assert (cells == BOUNDARY).sum() > 100 and (cells >= 0).sum() > 1000
+
+def test_polygons_holes_and_multipolygon_parts():
+    classifier = RegionClassifier(FIXTURE, cell_size=0.05)
+    regions, types = classifier.classify([-1.2, -1.5, -2.1, -2.4, -2.8], [29.2, 29.5, 29.2, 30.6, 29.9])
+    
+    assert regions[0] == 'North Test Province' and types[0] == 'industrial'
+    # Inside the hole and outside every polygon: threshold rules
+    fallback_regions, fallback_types = classify_by_thresholds([-1.5, -2.8], [29.5, 29.9])
+    assert (regions[1], types[1]) == (fallback_regions[0], fallback_types[0])
+    assert (regions[4], types[4]) == (fallback_regions[1], fallback_types[1])
+    # A feature without a type keeps the threshold type
+    assert regions[2] == regions[3] == 'South Test Province'
+    assert types[3] == classify_by_thresholds([-2.4], [30.6])[1][0]
+    assert classifier.lookup(np.array([-2.8]), np.array([29.9]))[0] == OUTSIDE
+
+def test_missing_or_unusable_file_falls_back_to_thresholds(tmp_path):
+    lats, lons = [-1.95, -1.5, -2.7], [30.06, 29.63, 29.3]
+    expected = classify_by_thresholds(lats, lons)
+    
+    broken = tmp_path / 'broken.geojson'
+    broken.write_text('{"type": "FeatureCollection", "features": []}')
+    for boundary_file in (str(tmp_path / 'missing.geojson'), str(broken)):
+        classifier = RegionClassifier(boundary_file)
+        assert not classifier.polygon_mode
+        regions, types = classifier.classify(lats, lons)
+        assert regions.tolist() == expected[0].tolist() and types.tolist() == expected[1].tolist()
@@ -0,0 +1,73 @@
+import numpy as np
+
+from series import CompressedSeries, decode_floats, decode_timestamps, encode_floats, encode_timestamps
+
+def test_floats_round_trip_bit_exact():
+    rng = np.random.default_rng(1)
+    matrix = np.stack([rng.normal(50, 5, 100), np.full(100, 42.0), np.r_[0.0, -0.0, np.inf, -np.inf, rng.random(96)]])
+    for row, data in zip(matrix, encode_floats(matrix)):
+        np.testing.assert_array_equal(decode_floats(data, len(row)).view(np.uint64), row.view(np.uint64))
+
+def test_repeated_values_compress_to_the_bitmap():
+    (data,) = encode_floats(np.full((1, 64), 3.25))
+    # 8 bitmap bytes, then the first value's 12-bit header and its 14 significant bits
+    assert len(data) == 8 + 4
+
+def test_timestamps_round_trip():
+    micros = (1_700_000_000_000_000 + np.cumsum(np.r_[0, np.full(50, 3_000_000) + np.arange(50) % 7 - 3])).astype(np.int64)
+    np.testing.assert_array_equal(decode_timestamps(*encode_timestamps(micros), len(micros)), micros)
+    for short in (micros[:1], micros[:2], micros[:3]):
+        np.testing.assert_array_equal(decode_timestamps(*encode_timestamps(short), len(short)), short)
+
+def append_ticks(series, ticks, n, start=0):
+    rng = np.random.default_rng(start)
+    for t in range(start, start + ticks):
+        stations = np.arange(n)
+        series.append(stations, {'timestamp': 1e9 + 3.0 * t + np.zeros(n), 'emission': 40 + t % 20 + stations,
+                                 'so2': rng.random(n), 'no2': rng.random(n), 'co': rng.random(n)})
+
+def test_scan_returns_blocks_and_pending_in_order():
+    series = CompressedSeries(3, block_size=8)
+    append_ticks(series, 30, 3)
+    columns, counts = series.scan(1)
+    np.testing.assert_array_equal(columns['timestamp'], 1e9 + 3.0 * np.arange(30))
+    np.testing.assert_array_equal(columns['emission'], 41 + np.arange(30) % 20)
+    assert counts['skipped'] == 0 and counts['decoded'] == len(series.blocks[1])
+
+def test_scan_skips_blocks_outside_the_time_span_and_ranges():
+    series = CompressedSeries(1, block_size=8)
+    append_ticks(series, 32, 1)
+    columns, counts = series.scan(0, start=1e9 + 3.0 * 24)
+    np.testing.assert_array_equal(columns['timestamp'], 1e9 + 3.0 * np.arange(24, 32))
+    assert counts == {'decoded': 1, 'skipped': 3}
+    
+    columns, counts = series.scan(0, ranges={'emission': (100, 200)})
+    assert len(columns['timestamp']) == 0 and counts['decoded'] == 0
+
+def test_oldest_blocks_are_evicted_past_max_bytes():
+    series = CompressedSeries(2, block_size=8, max_bytes=600)
+    append_ticks(series, 200, 2)
+    summary = series.summary()
+    assert summary['bytes'] <= 600 and summary['evicted_blocks'] > 0
+    columns, _ = series.scan(0)
+    # What is left is the most recent run of readings, without gaps
+    assert columns['timestamp'][-1] == 1e9 + 3.0 * 199
+    np.testing.assert_array_equal(np.diff(columns['timestamp']), 3.0)
+
+def test_exported_blocks_load_into_a_fresh_series():
+    series = CompressedSeries(4, block_size=8, max_bytes=2000)
+    append_ticks(series, 120, 4)
+    restored = CompressedSeries(4, block_size=8, max_bytes=2000)
+    restored.load_blocks(*series.export_blocks())
+    for field in ('pending_count', 'capacity'):
+        np.copyto(getattr(restored, field), getattr(series, field))
+    for field, pending in series.pending.items():
+        np.copyto(restored.pending[field], pending)
+    
+    for i in range(4):
+        before, after = series.scan(i)[0], restored.scan(i)[0]
+        for field in before:
+            np.testing.assert_array_equal(after[field], before[field])
+    assert list(restored.order) == list(series.order)
+    assert {k: restored.stats[k] for k in ('blocks', 'encoded_readings', 'bytes')} == \
+           {k: series.stats[k] for k in ('blocks', 'encoded_readings', 'bytes')}
@@ -795,9 +795,11 @@ const CO2EmissionsDashboard = () => {
               <Plot
                 data={[
                   {
-                    x: edaData.distribution_data || [],
-                    type: 'histogram',
-                    nbinsx: 30,
+                    // Pre-binned on the server: bar i spans edges[i]..edges[i+1]
+                    x: (edaData.distribution?.histogram?.counts || []).map((_, i) =>
+                      Math.sqrt(Math.max(edaData.distribution.histogram.edges[i], 1e-3) * edaData.distribution.histogram.edges[i + 1])),
+                    y: edaData.distribution?.histogram?.counts || [],
+                    type: 'bar',
                     marker: { 
                       color: '#38bdf8', 
                       opacity: 0.8,
@@ -810,6 +812,7 @@ const CO2EmissionsDashboard = () => {
                   height: 400,
                   xaxis: { 
                     title: 'CO₂ Emissions',
+                    type: 'log',
                     color: 'white',
                     gridcolor: '#374151',
                     linecolor: '#6b7280'